@@ -1,10 +1,12 @@
 from ghoshell.contracts.api import APIArgs, APIResp, APIError, APICaller, APIRepository
-from ghoshell.contracts.cache import Cache
+from ghoshell.contracts.cache import Cache, CachePipeline
+from ghoshell.contracts.codec import StateCodec
 
 # 返回全局可用的外部工具.
 
 __all__ = [
-    "Cache",
+    "Cache", "CachePipeline",
+    "StateCodec",
 
     "APIArgs", "APIResp", "APICaller", "APIError", "APIRepository"
 ]
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
+from typing import Dict, List, Callable, Tuple
+
+from ghoshell.utils.asyncs import to_thread
 
 
 class Cache(metaclass=ABCMeta):
@@ -9,19 +12,39 @@ class Cache(metaclass=ABCMeta):
     """
 
     @abstractmethod
-    def lock(self, key: str, overdue: int = 0) -> bool:
+    def lock(self, key: str, overdue: int = 0) -> int:
+        """
+        加锁. 成功时返回 fencing token, 同一个 key 的 token 单调递增; 失败返回 0.
+        """
+        pass
+
+    @abstractmethod
+    def unlock(self, key: str, token: int = 0) -> bool:
+        """
+        解锁. token 不为 0 时, 只有仍然持有这个 token 才能解锁, 避免释放了别人的锁.
+        """
+        pass
+
+    @abstractmethod
+    def renew(self, key: str, token: int, overdue: int) -> bool:
+        """
+        锁续约. 只有仍然持有这个 token 时才能成功.
+        """
         pass
 
     @abstractmethod
-    def unlock(self, key: str) -> bool:
+    def lock_token(self, key: str) -> int:
+        """
+        当前持有锁的 token, 没有上锁或者已经过期返回 0.
+        """
         pass
 
     @abstractmethod
-    def set(self, key: str, val: str, exp: int = 0) -> bool:
+    def set(self, key: str, val: str | bytes, exp: int = 0) -> bool:
         pass
 
     @abstractmethod
-    def get(self, key: str) -> str | None:
+    def get(self, key: str) -> str | bytes | None:
         pass
 
     @abstractmethod
@@ -29,11 +52,11 @@ class Cache(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def set_member(self, key: str, member: str, value: str) -> bool:
+    def set_member(self, key: str, member: str, value: str | bytes) -> bool:
         pass
 
     @abstractmethod
-    def get_member(self, key: str, member: str) -> str | None:
+    def get_member(self, key: str, member: str) -> str | bytes | None:
         pass
 
     def remove_member(self, key: str, *member: str) -> int:
@@ -42,3 +65,156 @@ class Cache(metaclass=ABCMeta):
     @abstractmethod
     def remove(self, *keys: str) -> int:
         pass
+
+    # ---- 批量操作 ---- #
+    # 默认实现是逐个调用, 远程的 cache 驱动 (比如 redis) 应该用一次请求实现.
+
+    def mget(self, *keys: str) -> List[str | bytes | None]:
+        """
+        批量读取, 返回值和 keys 一一对应.
+        """
+        return [self.get(key) for key in keys]
+
+    def mset(self, values: Dict[str, str | bytes], exp: int = 0) -> bool:
+        """
+        批量写入, 使用相同的过期时间.
+        """
+        ok = True
+        for key in values:
+            ok = self.set(key, values[key], exp) and ok
+        return ok
+
+    def get_members(self, key: str, *members: str) -> Dict[str, str | bytes | None]:
+        """
+        批量读取 hash 的成员, 不存在的成员值为 None.
+        """
+        return {member: self.get_member(key, member) for member in members}
+
+    def set_members(self, key: str, values: Dict[str, str | bytes]) -> bool:
+        """
+        批量写入 hash 的成员.
+        """
+        ok = True
+        for member in values:
+            ok = self.set_member(key, member, values[member]) and ok
+        return ok
+
+    # ---- 异步操作 ---- #
+    # 默认实现是在有界的线程池里调用同步方法. 原生支持 asyncio 的驱动应该重写.
+
+    async def lock_async(self, key: str, overdue: int = 0) -> int:
+        return await to_thread(self.lock, key, overdue)
+
+    async def unlock_async(self, key: str, token: int = 0) -> bool:
+        return await to_thread(self.unlock, key, token)
+
+    async def get_async(self, key: str) -> str | bytes | None:
+        return await to_thread(self.get, key)
+
+    async def set_async(self, key: str, val: str | bytes, exp: int = 0) -> bool:
+        return await to_thread(self.set, key, val, exp)
+
+    async def mget_async(self, *keys: str) -> List[str | bytes | None]:
+        return await to_thread(self.mget, *keys)
+
+    async def get_members_async(self, key: str, *members: str) -> Dict[str, str | bytes | None]:
+        return await to_thread(self.get_members, key, *members)
+
+    async def set_members_async(self, key: str, values: Dict[str, str | bytes]) -> bool:
+        return await to_thread(self.set_members, key, values)
+
+    def pipeline(self) -> "CachePipeline":
+        """
+        返回一个管道. 写操作先缓存在管道里, execute 时一次性提交.
+        支持原生 pipeline / transaction 的驱动应该重写这个方法.
+        """
+        return CachePipeline(self)
+
+
+class CachePipeline:
+    """
+    Cache 写操作的管道.
+    默认实现只是把命令缓存下来, execute 时按顺序对 cache 重放, 相邻的同类写操作会合并成批量操作.
+    fence 的检查和写入不是原子的, 支持事务的驱动 (比如 redis 的 WATCH / lua) 应该在一次请求里完成.
+    """
+
+    def __init__(self, cache: Cache):
+        self._cache = cache
+        self._commands: List[Callable[[], None]] = []
+        # 等待合并的批量写操作.
+        self._pending_key: str | None = None
+        self._pending_members: Dict[str, str | bytes] | None = None
+        # 提交前需要检查的锁: (key, token).
+        self._fences: List[Tuple[str, int]] = []
+
+    def fence(self, key: str, token: int) -> "CachePipeline":
+        """
+        只有锁 key 仍然被 token 持有时才提交, 否则放弃所有的命令.
+        """
+        self._fences.append((key, token))
+        return self
+
+    def set(self, key: str, val: str | bytes, exp: int = 0) -> "CachePipeline":
+        self._flush_pending()
+        self._commands.append(lambda: self._cache.set(key, val, exp))
+        return self
+
+    def mset(self, values: Dict[str, str | bytes], exp: int = 0) -> "CachePipeline":
+        self._flush_pending()
+        values = values.copy()
+        self._commands.append(lambda: self._cache.mset(values, exp))
+        return self
+
+    def set_member(self, key: str, member: str, value: str | bytes) -> "CachePipeline":
+        return self.set_members(key, {member: value})
+
+    def set_members(self, key: str, values: Dict[str, str | bytes]) -> "CachePipeline":
+        if self._pending_key != key:
+            self._flush_pending()
+            self._pending_key = key
+            self._pending_members = {}
+        self._pending_members.update(values)
+        return self
+
+    def remove_member(self, key: str, *members: str) -> "CachePipeline":
+        self._flush_pending()
+        self._commands.append(lambda: self._cache.remove_member(key, *members))
+        return self
+
+    def remove(self, *keys: str) -> "CachePipeline":
+        self._flush_pending()
+        self._commands.append(lambda: self._cache.remove(*keys))
+        return self
+
+    def expire(self, key: str, exp: int) -> "CachePipeline":
+        self._flush_pending()
+        self._commands.append(lambda: self._cache.expire(key, exp))
+        return self
+
+    def _flush_pending(self) -> None:
+        if self._pending_key is None:
+            return
+        key = self._pending_key
+        members = self._pending_members
+        self._commands.append(lambda: self._cache.set_members(key, members))
+        self._pending_key = None
+        self._pending_members = None
+
+    def __len__(self) -> int:
+        return len(self._commands) + (0 if self._pending_key is None else 1)
+
+    def execute(self) -> bool:
+        """
+        提交所有的命令, 并清空管道. fencing token 过期时放弃提交, 返回 False.
+        """
+        self._flush_pending()
+        commands = self._commands
+        fences = self._fences
+        self._commands = []
+        self._fences = []
+        for key, token in fences:
+            if self._cache.lock_token(key) != token:
+                return False
+        for command in commands:
+            command()
+        return True
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from abc import ABCMeta, abstractmethod
+from typing import Dict
+
+
+class StateCodec(metaclass=ABCMeta):
+    """
+    状态数据的编解码.
+    Session 保存的数据 (process, task 等) 都要先通过 codec 编码, 再写入 Cache.
+    """
+
+    @abstractmethod
+    def name(self) -> str:
+        """
+        codec 的名字.
+        """
+        pass
+
+    @abstractmethod
+    def encode(self, value: Dict) -> str | bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: str | bytes) -> Dict | None:
+        """
+        无法解码的数据返回 None, 相当于数据丢失.
+        """
+        pass
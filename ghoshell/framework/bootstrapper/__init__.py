@@ -1,9 +1,11 @@
 from ghoshell.framework.bootstrapper.focus import CommandFocusDriverBootstrapper, \
-    LLMToolsFocusDriverBootstrapper
+    LLMToolsFocusDriverBootstrapper, TextClassifierFocusDriverBootstrapper, KeywordFocusDriverBootstrapper
 from ghoshell.framework.bootstrapper.logger import FileLoggerBootstrapper
 
 __all__ = [
     "FileLoggerBootstrapper",
     "CommandFocusDriverBootstrapper",
+    "KeywordFocusDriverBootstrapper",
     "LLMToolsFocusDriverBootstrapper",
+    "TextClassifierFocusDriverBootstrapper",
 ]
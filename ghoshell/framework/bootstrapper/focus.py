@@ -1,10 +1,10 @@
 import yaml
 
 from ghoshell.framework.ghost import GhostBootstrapper
-from ghoshell.framework.intentions import CommandFocusDriver
+from ghoshell.framework.intentions import CommandFocusDriver, KeywordFocusDriver
 from ghoshell.framework.intentions import LLMToolsFocusDriver, LLMToolsFocusConfig
 from ghoshell.ghost import *
-from ghoshell.llms import LLMTextCompletion
+from ghoshell.llms import LLMTextCompletion, LLMTextEmbedding
 
 
 class CommandFocusDriverBootstrapper(GhostBootstrapper):
@@ -22,6 +22,17 @@ class CommandFocusDriverBootstrapper(GhostBootstrapper):
         focus.register(command_driver)
 
 
+class KeywordFocusDriverBootstrapper(GhostBootstrapper):
+    """
+    注册关键词和正则意图的驱动. 应该在基于大模型的驱动之前注册, 优先匹配.
+    """
+
+    def bootstrap(self, ghost: Ghost):
+        driver = KeywordFocusDriver()
+        ghost.container.set(KeywordFocusDriver, driver)
+        ghost.focus.register(driver)
+
+
 class LLMToolsFocusDriverBootstrapper(GhostBootstrapper):
 
     def __init__(self, relative_file_name: str = "nlu/llm_tools_config.yaml"):
@@ -37,8 +48,38 @@ class LLMToolsFocusDriverBootstrapper(GhostBootstrapper):
         config = self._load_config(ghost)
         focus = ghost.focus
         prompter = ghost.container.force_fetch(LLMTextCompletion)
+        embedder = None
+        if config.prefilter == "embedding":
+            embedder = ghost.container.force_fetch(LLMTextEmbedding)
         # register command driver
-        driver = LLMToolsFocusDriver(config, prompter)
+        driver = LLMToolsFocusDriver(config, prompter, embedder)
         ghost.container.set(LLMToolsFocusDriver, driver)
         # 注册一个单例.
         focus.register(driver)
+
+
+class TextClassifierFocusDriverBootstrapper(GhostBootstrapper):
+    """
+    注册基于 embedding 的文本分类驱动. 依赖 numpy.
+    """
+
+    def __init__(
+            self,
+            threshold: float = 0.85,
+            config_name: str = "",
+            relative_cache_file: str = "embeddings/text_classifier.npz",
+    ):
+        self.threshold = threshold
+        self.config_name = config_name
+        self.relative_cache_file = relative_cache_file
+
+    def bootstrap(self, ghost: Ghost):
+        # numpy 是可选依赖, 只在使用时导入.
+        from ghoshell.framework.intentions.text_classifier import TextClassifierFocusDriver, EmbeddingCache
+        cache_file = ""
+        if self.relative_cache_file:
+            cache_file = ghost.runtime_path.rstrip("/") + "/" + self.relative_cache_file.lstrip("/")
+        embedder = ghost.container.force_fetch(LLMTextEmbedding)
+        driver = TextClassifierFocusDriver(embedder, self.threshold, self.config_name, EmbeddingCache(cache_file))
+        ghost.container.set(TextClassifierFocusDriver, driver)
+        ghost.focus.register(driver)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Dict, List, Any, ClassVar, Tuple
+
+from ghoshell.contracts import StateCodec
+
+
+def _json_default(value: Any) -> Any:
+    # task.callbacks 等字段是 set.
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"type {type(value)} is not json serializable")
+
+
+class JSONStateCodec(StateCodec):
+    """
+    默认的 json 编码.
+    """
+
+    def name(self) -> str:
+        return "json"
+
+    def encode(self, value: Dict) -> str | bytes:
+        return json.dumps(value, default=_json_default)
+
+    def decode(self, data: str | bytes) -> Dict | None:
+        try:
+            loads = json.loads(data)
+        except ValueError:
+            return None
+        if isinstance(loads, Dict):
+            return loads
+        return None
+
+
+# ---- binary codec ---- #
+
+_T_NONE = 0
+_T_TRUE = 1
+_T_FALSE = 2
+_T_INT = 3
+_T_FLOAT = 4
+_T_STR = 5
+_T_LIST = 6
+_T_DICT = 7
+
+_FLOAT = struct.Struct("<d")
+
+
+class BinaryStateCodec(StateCodec):
+    """
+    紧凑的二进制编码.
+
+    格式: MAGIC + schema version + 字符串表 + 值.
+    - 所有的字符串 (think, stage, tid 等) 都放进字符串表, 值里只保存序号, 重复的字符串只存一次.
+    - dict 的 key 如果是 FIELDS 里的已知字段, 只保存字段的序号 (field tag), 否则引用字符串表.
+    - 整数用 zigzag varint.
+
+    FIELDS 只能在末尾追加. 修改或删除已有字段时必须升级 VERSION, 旧版本的数据会被视作丢失.
+    不是二进制格式的数据会尝试用 json 解码, 方便从 json codec 迁移.
+    """
+
+    MAGIC: ClassVar[bytes] = b"GS"
+    VERSION: ClassVar[int] = 1
+
+    # process / task / tasked / attention 等状态数据的已知字段.
+    FIELDS: ClassVar[Tuple[str, ...]] = (
+        # process
+        "pid", "sid", "root", "current", "round", "parent_id", "tasks", "quiting",
+        "tid_indexes", "status_list_indexes", "task_ids", "delta_saving",
+        # task
+        "tid", "url", "vars", "status", "level", "priority", "overdue", "forwards",
+        "callbacks", "attentions", "instanced",
+        # url
+        "think", "stage", "args",
+        # attention & intention
+        "to", "intentions", "reaction", "kind", "config", "params", "target",
+    )
+
+    def __init__(self):
+        self._field_tags: Dict[str, int] = {name: i for i, name in enumerate(self.FIELDS)}
+        self._json = JSONStateCodec()
+
+    def name(self) -> str:
+        return "binary"
+
+    # ---- encode ---- #
+
+    def encode(self, value: Dict) -> str | bytes:
+        strings: Dict[str, int] = {}
+        body = bytearray()
+        self._encode_value(value, body, strings)
+
+        head = bytearray(self.MAGIC)
+        head.append(self.VERSION)
+        self._write_varint(head, len(strings))
+        for string in strings:
+            encoded = string.encode()
+            self._write_varint(head, len(encoded))
+            head += encoded
+        head += body
+        return bytes(head)
+
+    def _encode_value(self, value: Any, buf: bytearray, strings: Dict[str, int]) -> None:
+        if value is None:
+            buf.append(_T_NONE)
+        elif value is True:
+            buf.append(_T_TRUE)
+        elif value is False:
+            buf.append(_T_FALSE)
+        elif isinstance(value, int):
+            buf.append(_T_INT)
+            self._write_varint(buf, (value << 1) if value >= 0 else ((-value << 1) - 1))
+        elif isinstance(value, float):
+            buf.append(_T_FLOAT)
+            buf += _FLOAT.pack(value)
+        elif isinstance(value, str):
+            buf.append(_T_STR)
+            self._write_varint(buf, self._intern(value, strings))
+        elif isinstance(value, Dict):
+            buf.append(_T_DICT)
+            self._write_varint(buf, len(value))
+            for key in value:
+                str_key = str(key)
+                tag = self._field_tags.get(str_key, None)
+                if tag is not None:
+                    self._write_varint(buf, tag << 1)
+                else:
+                    self._write_varint(buf, (self._intern(str_key, strings) << 1) | 1)
+                self._encode_value(value[key], buf, strings)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            buf.append(_T_LIST)
+            self._write_varint(buf, len(value))
+            for item in value:
+                self._encode_value(item, buf, strings)
+        else:
+            raise TypeError(f"type {type(value)} is not supported by {self.__class__.__name__}")
+
+    @classmethod
+    def _intern(cls, value: str, strings: Dict[str, int]) -> int:
+        idx = strings.get(value, None)
+        if idx is None:
+            idx = len(strings)
+            strings[value] = idx
+        return idx
+
+    @classmethod
+    def _write_varint(cls, buf: bytearray, value: int) -> None:
+        while value > 0x7f:
+            buf.append((value & 0x7f) | 0x80)
+            value >>= 7
+        buf.append(value)
+
+    # ---- decode ---- #
+
+    def decode(self, data: str | bytes) -> Dict | None:
+        if isinstance(data, str) or not data.startswith(self.MAGIC):
+            return self._json.decode(data)
+        if len(data) < 3 or data[2] != self.VERSION:
+            # 不兼容的 schema 版本.
+            return None
+        try:
+            pos = 3
+            count, pos = self._read_varint(data, pos)
+            strings: List[str] = []
+            for _ in range(count):
+                size, pos = self._read_varint(data, pos)
+                strings.append(data[pos:pos + size].decode())
+                pos += size
+            value, _ = self._decode_value(data, pos, strings)
+        except (IndexError, UnicodeDecodeError, struct.error):
+            return None
+        if isinstance(value, Dict):
+            return value
+        return None
+
+    def _decode_value(self, data: bytes, pos: int, strings: List[str]) -> Tuple[Any, int]:
+        tag = data[pos]
+        pos += 1
+        if tag == _T_STR:
+            idx, pos = self._read_varint(data, pos)
+            return strings[idx], pos
+        if tag == _T_DICT:
+            size, pos = self._read_varint(data, pos)
+            result = {}
+            fields = self.FIELDS
+            for _ in range(size):
+                key_tag, pos = self._read_varint(data, pos)
+                key = strings[key_tag >> 1] if key_tag & 1 else fields[key_tag >> 1]
+                result[key], pos = self._decode_value(data, pos, strings)
+            return result, pos
+        if tag == _T_LIST:
+            size, pos = self._read_varint(data, pos)
+            items = []
+            for _ in range(size):
+                item, pos = self._decode_value(data, pos, strings)
+                items.append(item)
+            return items, pos
+        if tag == _T_INT:
+            zigzag, pos = self._read_varint(data, pos)
+            return (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1), pos
+        if tag == _T_NONE:
+            return None, pos
+        if tag == _T_TRUE:
+            return True, pos
+        if tag == _T_FALSE:
+            return False, pos
+        if tag == _T_FLOAT:
+            return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+        raise IndexError(f"unknown value tag {tag}")
+
+    @classmethod
+    def _read_varint(cls, data: bytes, pos: int) -> Tuple[int, int]:
+        result = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result, pos
+            shift += 7
+
+
+def new_state_codec(name: str) -> StateCodec:
+    """
+    根据名字获取内置的 codec.
+    """
+    if name == "binary":
+        return BinaryStateCodec()
+    return JSONStateCodec()
@@ -14,7 +14,63 @@ class GhostConfig(BaseModel):
 
     exception_traceback_limit: int = 5
 
+    # respond_async 时, 同步驱动 (cache, LLM, 算子) 使用的线程池大小.
+    async_thread_pool_size: int = 16
+
+    # 运行异步输入 (子进程, 回调父进程) 的后台线程数量.
+    async_input_workers: int = 2
+    # 异步输入队列的最大长度, 超过的输入会被丢弃.
+    async_input_queue_size: int = 1000
+    # 异步输入 (比如子进程回调父进程) 总是排队等待 process 锁, 不会回复 on_busy. 等待的最长时间, 单位是秒.
+    async_input_lock_timeout: float = 60
+    # 等待超时后, 分发器重试的次数和首次重试的间隔 (秒), 间隔每次翻倍.
+    async_input_retries: int = 3
+    async_input_retry_backoff: float = 1
+
+    # 请求级别 span 追踪的采样率, 0 表示关闭, 1 表示全部采样.
+    trace_sample_rate: float = 0
+    # chrome trace 文件的目录, 相对 runtime_path. 为空不导出.
+    trace_chrome_dir: str = ""
+    # 滚动的 jsonl 追踪文件, 相对 runtime_path. 为空不导出.
+    trace_jsonl_file: str = ""
+    trace_jsonl_max_bytes: int = 10 * 1024 * 1024
+    trace_jsonl_backups: int = 5
+
+    # 并发匹配意图: 开销大的 FocusDriver (cost >= focus_expensive_cost) 提前在线程池里运行,
+    # 仍然按驱动的顺序取第一个命中的结果, 没有用到的结果被取消或者忽略.
+    focus_concurrent: bool = False
+    focus_expensive_cost: int = 10
+    focus_workers: int = 4
+
+    # 一个输入最多运行的算子步数, 超过时抛出 StackoverflowError.
+    operator_max_steps: int = 100
+
     session_overdue: int = 1800
 
     process_max_tasks: int = 20
     process_lock_overdue: int = 30
+    # 持有进程锁期间在后台续约, 长时间的 LLM 调用不会让锁过期.
+    process_lock_renewal: bool = True
+
+    # process 被锁时, 输入在信箱里排队等待, 而不是直接回复 on_busy.
+    process_mailbox: bool = False
+    # 排队等待锁的最长时间, 单位是秒. 超时仍然回复 on_busy.
+    process_mailbox_timeout: float = 10
+    # 每个 process 最多排队的输入数量. 超过的输入直接回复 on_busy.
+    process_mailbox_max_depth: int = 5
+    # 把排在后面的连续文本输入合并到一轮里处理, 只回复一次.
+    process_mailbox_coalesce: bool = True
+    # 增量保存 process, 每轮只写入变更过的 task. 打开后 process 改为 header 加单独的 task 的存储格式.
+    # 关闭时仍然可以读取增量格式, 下一次保存时写回完整的 process, 所以可以直接回滚.
+    process_delta_saving: bool = False
+    # 读取 process 时跳过 pydantic 校验. 只有 session 数据完全由 ghost 自己写入时才应该打开.
+    process_trusted_loading: bool = False
+    # 长期任务数据的预读策略: eager, lazy 或 attention. 参考 RuntimeImpl.
+    process_task_prefetch: str = "attention"
+
+    # task 的 attentions 只保存 (stage, reaction, level) 引用, 匹配时从 stage 的 reactions 还原 intentions.
+    # 要求 Reaction.intentions 的结果不依赖上下文.
+    attention_reference: bool = False
+
+    # session 状态数据的编码. json 或 binary.
+    session_codec: str = "json"
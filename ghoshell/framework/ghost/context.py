@@ -7,9 +7,11 @@ from ghoshell.container import Container
 from ghoshell.framework.ghost.config import GhostConfig
 from ghoshell.framework.ghost.mind import MindImpl
 from ghoshell.framework.ghost.sending import SendingImpl
+from ghoshell.framework.ghost.streaming import OutputStreamer
 from ghoshell.ghost import *
 from ghoshell.messages import *
 from ghoshell.utils import InstanceCount
+from ghoshell.utils.tracing import Tracer
 
 
 class ContextImpl(Context):
@@ -20,12 +22,14 @@ class ContextImpl(Context):
             clone: Clone,
             container: Container,
             config: GhostConfig,
+            tracer: Tracer | None = None,
             # session: Session,
             # runtime: Runtime,
     ):
         self._clone = clone
         self._container = container
         self._config = config
+        self._tracer = tracer
 
         self._session: Session | None = None
         self._runtime: Runtime | None = None
@@ -59,6 +63,10 @@ class ContextImpl(Context):
     def container(self) -> "Container":
         return self._container
 
+    @property
+    def tracer(self) -> Tracer | None:
+        return self._tracer
+
     def send_at(self, _with: Optional["Thought"]) -> Sender:
         if self._messenger is not None:
             self._messenger.destroy()
@@ -99,6 +107,14 @@ class ContextImpl(Context):
         # 用一个数组 buffer
         self._outputs_buffer.append(_output)
 
+    def stream_output(self, _output: "Output") -> bool:
+        streamer = self._container.get(OutputStreamer)
+        if streamer is None:
+            return False
+        if self._input.is_async:
+            _output.is_async = True
+        return streamer.stream(_output)
+
     def get_unsent_outputs(self) -> List["Output"]:
         return self._outputs_buffer
 
@@ -155,6 +171,8 @@ class ContextImpl(Context):
         if self._minder is not None:
             self._minder.destroy()
         self.runtime.finish()
+        # 请求级别的缓存 (比如 CtxMemo, 注意力索引) 到这里失效.
+        self._cache = {}
 
     def destroy(self) -> None:
         if self._container is not None:
@@ -178,6 +196,7 @@ class ContextImpl(Context):
         del self._cache
         del self._messenger
         del self._minder
+        del self._tracer
 
     def __del__(self):
         InstanceCount.rm(self.__class__.__name__)
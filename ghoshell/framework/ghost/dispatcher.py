@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, ClassVar, Dict, List, Optional
+
+from ghoshell.ghost import Ghost, BusyError
+from ghoshell.messages import Input, Output, ErrMsg
+from ghoshell.utils import StatsCounter
+
+# 接收异步输出的 shell 回调. 参数和 Shell.output 保持一致: (output, 触发它的异步输入).
+OutputHandler = Callable[[Output, Input], None]
+
+
+class AsyncInputDispatcher:
+    """
+    异步输入的分发器.
+
+    1. ghost 每轮结束后, 上下文里没有发送的异步输入 (ctx.get_unsent_async_inputs) 进入本地队列.
+    2. 后台的 worker 线程逐个调用 ghost.respond 运行它们.
+       异步输入的 trace 指向新的子进程或者父进程, 所以会在子进程里运行, 或者作为回调回到父进程.
+    3. 运行得到的异步输出, 按 trace.shell_kind 投递给注册过的 shell.
+    4. 子进程运行时又产生的异步输入 (比如结束时回调父进程) 会再次进入队列, 回调就这样一层层传播.
+    5. 目标 process 被锁时, 异步输入排队等待锁. 等待超时则按 backoff 重试, 重试耗尽才丢弃.
+    """
+
+    # 进程级别的计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter(
+        "dispatched", "done", "failed", "retried", "rejected", "delivered", "undelivered",
+    )
+
+    def __init__(
+            self,
+            ghost: Ghost,
+            workers: int = 2,
+            max_size: int = 1000,
+            logger: logging.Logger | None = None,
+            retries: int = 3,
+            backoff: float = 1,
+    ):
+        self._ghost = ghost
+        self._retries = retries
+        self._backoff = backoff
+        self._size = max(workers, 1)
+        self._queue: queue.Queue = queue.Queue(max_size)
+        self._handlers: Dict[str, OutputHandler] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._logger = logger if logger else logging.getLogger("ghoshell.dispatcher")
+
+    def register_shell(self, shell_kind: str, handler: OutputHandler) -> None:
+        """
+        注册 shell 接收异步输出的方法.
+        """
+        self._handlers[shell_kind] = handler
+
+    def dispatch(self, inputs: List[Input]) -> int:
+        """
+        把异步输入放进队列, 返回成功入队的数量. 队列满的时候丢弃, 不阻塞当前的请求.
+        """
+        if not inputs:
+            return 0
+        self._start()
+        dispatched = 0
+        for _input in inputs:
+            try:
+                self._queue.put_nowait(_input)
+                dispatched += 1
+            except queue.Full:
+                self._logger.warning(f"async input queue is full, drop input {_input.mid}")
+                self.counter.incr("rejected")
+        self.counter.incr("dispatched", dispatched)
+        return dispatched
+
+    def _start(self) -> None:
+        # 第一次分发时才启动 worker.
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self._size):
+                thread = threading.Thread(target=self._work, name=f"ghoshell-async-input-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            _input: Optional[Input] = self._queue.get()
+            try:
+                if _input is None:
+                    return
+                self._run(_input)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, _input: Input) -> None:
+        attempt = 0
+        while True:
+            try:
+                outputs = self._ghost.respond(_input)
+            except (Exception, SystemExit) as e:
+                # ghost.respond 在致命错误时会 exit, 不能让它结束 worker 线程.
+                self._logger.exception(e)
+                self.counter.incr("failed")
+                return
+            if not self._is_busy(outputs):
+                self.counter.incr("done")
+                break
+            if attempt >= self._retries:
+                self._logger.warning(f"process of async input {_input.mid} is busy, drop it after {attempt} retries")
+                self.counter.incr("failed")
+                return
+            # 在当前 worker 里等待后重试, 保证 join 能等到重试结束.
+            time.sleep(self._backoff * (2 ** attempt))
+            attempt += 1
+            self.counter.incr("retried")
+        if not outputs:
+            return
+        handler = self._handlers.get(_input.trace.shell_kind, None)
+        for _output in outputs:
+            if handler is None:
+                self.counter.incr("undelivered")
+                continue
+            try:
+                handler(_output, _input)
+                self.counter.incr("delivered")
+            except Exception as e:
+                self._logger.exception(e)
+                self.counter.incr("undelivered")
+
+    @staticmethod
+    def _is_busy(outputs: List[Output] | None) -> bool:
+        """
+        等待 process 锁超时的异步输入, 只返回一个 BusyError 的错误消息.
+        """
+        if not outputs or len(outputs) != 1:
+            return False
+        err = ErrMsg.read(outputs[0].payload)
+        return err is not None and err.errcode == BusyError.CODE
+
+    def join(self) -> None:
+        """
+        等待队列里所有的输入, 以及它们产生的新输入都运行完.
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for _ in self._threads:
+                self._queue.put(None)
+            threads = self._threads
+            self._threads = []
+        for thread in threads:
+            thread.join()
@@ -1,17 +1,48 @@
-from typing import Optional, List, Dict
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, ClassVar, Optional, List, Dict, Tuple
 
 from ghoshell.ghost import Focus, FocusDriver, Context, Intention
+from ghoshell.utils import StatsCounter
+from ghoshell.utils.tracing import span
+
+_Match = Callable[[], Optional[Intention]]
+# (kind, driver, 调用线程里的匹配方法, 返回不依赖 ctx 的匹配方法的 prepare)
+_Call = Tuple[str, FocusDriver, _Match, Callable[[], Optional[_Match]]]
 
 
 class FocusImpl(Focus):
     """
     一个最简单的实现.
+    驱动按注册的顺序决定优先级, 返回优先级最高的命中结果.
+
+    concurrent 模式下, cost >= expensive_cost 的驱动在开始匹配时就提交到线程池,
+    和前面的驱动同时运行. 前面的驱动命中后, 还没开始的任务被取消, 正在运行的结果被忽略.
+    提交到线程池的是 FocusDriver.prepare_match 返回的方法, 它在调用线程里读完 ctx, 线程池里不再访问 ctx.
+    不支持 prepare_match 的驱动仍然在调用线程里按顺序匹配.
+    线程池里的驱动按 FocusDriver.timeout 等待结果, 超时视为没有命中.
     """
 
-    def __init__(self, *drivers: FocusDriver):
+    counter: ClassVar[StatsCounter] = StatsCounter("speculative", "cancelled", "ignored", "timeout")
+
+    def __init__(
+            self,
+            *drivers: FocusDriver,
+            concurrent: bool = False,
+            expensive_cost: int = 10,
+            workers: int = 4,
+    ):
         self.driver_map: Dict[str, FocusDriver] = {}
         # 保证有序.
         self.driver_kinds: List[str] = []
+        self.concurrent = concurrent
+        self.expensive_cost = expensive_cost
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
         for driver in drivers:
             self.register(driver)
 
@@ -42,7 +73,25 @@ class FocusImpl(Focus):
             arr.append(meta)
         if len(arr) == 0:
             return None
-        return driver.match(ctx, *metas)
+        with span(f"focus.match:{kind}", "focus"):
+            return driver.match(ctx, *arr)
+
+    def match_grouped(self, ctx: Context, grouped: Dict[str, List[Intention]]) -> Optional[Intention]:
+        calls = []
+        for kind in self.driver_kinds:
+            if kind not in grouped:
+                continue
+            driver = self.driver_map[kind]
+            metas = [meta for meta in grouped[kind] if meta.kind == kind]
+            if not metas:
+                continue
+            calls.append((
+                kind,
+                driver,
+                functools.partial(self.match, ctx, kind, *metas),
+                functools.partial(driver.prepare_match, ctx, *metas),
+            ))
+        return self._evaluate(calls)
 
     def register_global_intentions(self, *metas: Intention) -> None:
         meta_group = {}
@@ -60,13 +109,90 @@ class FocusImpl(Focus):
             driver.register_global_intentions(*metas)
 
     def global_match(self, ctx: Context) -> Optional[Intention]:
+        calls = []
         for kind in self.driver_kinds:
             driver = self.driver_map[kind]
-            matched = driver.wildcard_match(ctx)
-            if matched is not None:
-                return matched
-        return None
+            calls.append((
+                kind,
+                driver,
+                functools.partial(self._wildcard_match, ctx, kind, driver),
+                functools.partial(driver.prepare_wildcard_match, ctx),
+            ))
+        return self._evaluate(calls)
+
+    @staticmethod
+    def _wildcard_match(ctx: Context, kind: str, driver: FocusDriver) -> Optional[Intention]:
+        with span(f"focus.wildcard_match:{kind}", "focus"):
+            return driver.wildcard_match(ctx)
+
+    def _evaluate(self, calls: List[_Call]) -> Optional[Intention]:
+        """
+        按优先级返回第一个命中的结果.
+        """
+        if not self.concurrent:
+            for _, _, call, _ in calls:
+                matched = call()
+                if matched is not None:
+                    return matched
+            return None
+
+        # 开销大的驱动提前运行. ctx 只在当前线程里读取.
+        futures: Dict[int, Tuple[Future, float]] = {}
+        for i, (kind, driver, _, prepare) in enumerate(calls):
+            if driver.cost() < self.expensive_cost:
+                continue
+            task = prepare()
+            if task is None:
+                continue
+            futures[i] = (self._submit(kind, task), time.monotonic())
+            self.counter.incr("speculative")
+        try:
+            for i, (_, driver, call, _) in enumerate(calls):
+                if i not in futures:
+                    matched = call()
+                else:
+                    future, started = futures.pop(i)
+                    matched = self._wait(driver, future, started)
+                if matched is not None:
+                    return matched
+            return None
+        finally:
+            # 优先级更高的驱动已经命中, 或者出现了异常.
+            for future, _ in futures.values():
+                if future.cancel():
+                    self.counter.incr("cancelled")
+                else:
+                    self.counter.incr("ignored")
+
+    def _submit(self, kind: str, task: _Match) -> Future:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._workers,
+                        thread_name_prefix="ghoshell-focus",
+                    )
+        def call() -> Optional[Intention]:
+            with span(f"focus.match:{kind}", "focus"):
+                return task()
+
+        # 线程里继承当前的 contextvars (比如 tracer).
+        return self._executor.submit(contextvars.copy_context().run, call)
+
+    def _wait(self, driver: FocusDriver, future: Future, started: float) -> Optional[Intention]:
+        timeout = driver.timeout()
+        if timeout <= 0:
+            return future.result()
+        try:
+            return future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+        except TimeoutError:
+            future.cancel()
+            self.counter.incr("timeout")
+            return None
 
     def destroy(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         del self.driver_map
         del self.driver_kinds
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from typing import List, ClassVar, Set
+
+from ghoshell.ghost import Process, Task, TaskStatus
+from ghoshell.utils import StatsCounter
+
+
+class ProcessGCResult:
+
+    def __init__(self):
+        # 按状态回收的任务.
+        self.collected: List[Task] = []
+        # 因为超过 max_tasks 被淘汰的任务.
+        self.evicted: List[Task] = []
+
+    @property
+    def archiving(self) -> List[Task]:
+        """
+        需要归档到长期记忆的任务.
+        """
+        return [task for task in self.collected + self.evicted if task.is_long_term]
+
+
+class ProcessGC:
+    """
+    Process 的垃圾回收.
+
+    1. 按状态回收: 已经完成, 取消, 失败或者可被遗忘的任务直接移除.
+    2. 按数量淘汰: 存活的任务超过 max_tasks 时, 按 LRU 淘汰.
+       process.tasks 每次 store_task 都会移到队首, 所以越靠后的任务越久没有使用.
+    root, current, 持有回调的任务以及回调的目标永远不会被回收.
+    被回收的长期任务需要归档到 session, 之后仍然可以通过 tid 找回.
+    """
+
+    # 进程级别的计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter("collected", "evicted", "archived")
+
+    def __init__(self, max_tasks: int):
+        # max_tasks <= 0 表示不限制.
+        self.max_tasks = max_tasks
+
+    def collect(self, process: Process) -> ProcessGCResult:
+        result = ProcessGCResult()
+        protected = self._protected_tids(process)
+        alive: List[Task] = []
+        for ptr in process.tasks:
+            status = ptr.status
+            # 必须要保存的状态.
+            if ptr.tid in protected:
+                alive.append(ptr)
+            elif TaskStatus.is_sleeping(status):
+                alive.append(ptr)
+            # 可以被遗忘的状态.
+            elif TaskStatus.is_able_to_gc(status):
+                result.collected.append(ptr)
+            elif ptr.is_forgettable:
+                # 可以被遗忘的任务. 直接从栈里拿掉.
+                result.collected.append(ptr)
+            else:
+                # 正常的节点.
+                alive.append(ptr)
+
+        if 0 < self.max_tasks < len(alive):
+            alive = self._evict(alive, protected, result)
+
+        if result.collected or result.evicted:
+            process.reset_tasks(alive)
+        self.counter.incr("collected", len(result.collected))
+        self.counter.incr("evicted", len(result.evicted))
+        return result
+
+    def _evict(self, alive: List[Task], protected: Set[str], result: ProcessGCResult) -> List[Task]:
+        overflow = len(alive) - self.max_tasks
+        # 从队尾 (最久没有使用) 开始淘汰.
+        evicting: Set[str] = set()
+        for ptr in reversed(alive):
+            if overflow <= 0:
+                break
+            if ptr.tid in protected:
+                continue
+            evicting.add(ptr.tid)
+            result.evicted.append(ptr)
+            overflow -= 1
+        return [ptr for ptr in alive if ptr.tid not in evicting]
+
+    @classmethod
+    def _protected_tids(cls, process: Process) -> Set[str]:
+        protected = {process.root, process.current}
+        for ptr in process.tasks:
+            if ptr.callbacks:
+                # 持有回调的任务, 以及等待回调的目标.
+                protected.add(ptr.tid)
+                protected.update(ptr.callbacks)
+        return protected
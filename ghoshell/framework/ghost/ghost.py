@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import os
+import random
 import traceback
 import uuid
 from abc import ABCMeta, abstractmethod
-from typing import Callable, List
+from typing import List
 
 from ghoshell.container import Container, Provider
 from ghoshell.contracts import Cache, APIRepository
@@ -12,13 +14,17 @@ from ghoshell.framework.ghost import providers
 from ghoshell.framework.ghost.clone import CloneImpl
 from ghoshell.framework.ghost.config import GhostConfig
 from ghoshell.framework.ghost.context import ContextImpl
+from ghoshell.framework.ghost.dispatcher import AsyncInputDispatcher
 from ghoshell.framework.ghost.middleware import CtxMiddleware, CtxPipe, CtxPipeline
+from ghoshell.framework.ghost.middleware import AsyncCtxPipe, AsyncCtxPipeline
 from ghoshell.framework.ghost.middleware import ExceptionHandlerMiddleware, ProcessLockerMiddleware
 from ghoshell.ghost import CloneError, BootstrapError, GhostError, ContextError
 from ghoshell.ghost import Ghost, Clone, Context, OperationKernel
 from ghoshell.ghost import Mindset, Focus, Memory
 from ghoshell.messages import Input, Output, ErrMsg
-from ghoshell.utils import create_pipeline
+from ghoshell.utils import create_pipeline, create_async_pipeline, to_thread, set_thread_pool_size
+from ghoshell.utils import timed_pipe, timed_async_pipe, PIPE_TIMER
+from ghoshell.utils import tracing
 
 
 class GhostBootstrapper(metaclass=ABCMeta):
@@ -47,12 +53,21 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
         self._memory: Memory | None = None
         self._config_path = config_path
         self._runtime_path = runtime_path
+        # 编译好的中间件管道. 启动时构建, 之后每个请求复用.
+        self._pipeline: CtxPipeline | None = None
+        self._async_pipeline: AsyncCtxPipeline | None = None
+        # 运行时追加的中间件, 排在 get_context_middleware 之后.
+        self._added_middleware: List[CtxMiddleware] = []
+        self._pipe_timer: PIPE_TIMER | None = None
+        self._trace_exporters: List[tracing.TraceExporter] = []
         container.set(Ghost, self)
         container.set(GhostConfig, config)
         # self._messenger: Messenger = messenger
 
     def boostrap(self) -> "Ghost":
+        set_thread_pool_size(self._config.async_thread_pool_size)
         self._init_container()
+        self._trace_exporters = self.get_trace_exporters()
         # bootstrapper
         for boot in self.get_bootstrapper():
             boot.bootstrap(self)
@@ -60,6 +75,7 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
         for depending in self.get_depending_contracts():
             if not self._container.bound(depending):
                 raise BootstrapError(f"ghost depending contract {depending} is not bound")
+        self.compile_pipelines()
         return self
 
     def _init_container(self):
@@ -89,6 +105,23 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
             ProcessLockerMiddleware(),
         ]
 
+    def get_trace_exporters(self) -> List[tracing.TraceExporter]:
+        """
+        导出请求追踪的方式. 默认根据配置导出 chrome trace 和 jsonl 文件.
+        """
+        exporters = []
+        if self._config.trace_chrome_dir:
+            directory = os.path.join(self._runtime_path, self._config.trace_chrome_dir)
+            exporters.append(tracing.ChromeTraceExporter(directory))
+        if self._config.trace_jsonl_file:
+            filename = os.path.join(self._runtime_path, self._config.trace_jsonl_file)
+            exporters.append(tracing.JSONLTraceExporter(
+                filename,
+                self._config.trace_jsonl_max_bytes,
+                self._config.trace_jsonl_backups,
+            ))
+        return exporters
+
     def get_depending_contracts(self) -> List:
         """
         用来检查容器里是否实现了绑定.
@@ -124,6 +157,9 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
             providers.MindsetProvider(),
             providers.FocusProvider(),
             providers.MemoryProvider(),
+            providers.StateCodecProvider(),
+            providers.AsyncInputDispatcherProvider(),
+            providers.OutputStreamerProvider(),
         ]
 
     # ---- abstract ---- #
@@ -143,7 +179,8 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
             inpt=inpt,
             clone=clone,
             container=ctx_container,
-            config=self._config
+            config=self._config,
+            tracer=tracing.current_tracer(),
         )
         for provider in self.get_context_providers():
             ctx_container.register(provider)
@@ -156,14 +193,53 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
         """
         核心方法: 处理输入 inpt
         """
+        tracer = self._new_tracer(inpt)
+        token = tracing.activate(tracer) if tracer is not None else None
+        try:
+            with tracing.span("respond", "ghost"):
+                ctx = self.new_context(inpt)
+                return self._react(ctx)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if tracer is not None:
+                tracing.deactivate(token)
+                self._export_trace(tracer)
+
+    async def respond_async(self, inpt: Input) -> List[Output] | None:
+        """
+        respond 的异步版本. 中间件的管道是异步的, 同步的 I/O 都在有界的线程池里运行.
+        """
+        tracer = self._new_tracer(inpt)
+        token = tracing.activate(tracer) if tracer is not None else None
         try:
-            ctx = self.new_context(inpt)
-            return self._react(ctx)
+            with tracing.span("respond_async", "ghost"):
+                ctx = await to_thread(self.new_context, inpt)
+                return await self._react_async(ctx)
         except Exception as e:
             self._fail(e)
         finally:
-            # todo: handle exception
-            pass
+            if tracer is not None:
+                tracing.deactivate(token)
+                await to_thread(self._export_trace, tracer)
+
+    def _new_tracer(self, inpt: Input) -> tracing.Tracer | None:
+        """
+        按采样率决定是否追踪这个请求.
+        """
+        rate = self._config.trace_sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return tracing.Tracer(
+            inpt.mid,
+            session_id=inpt.trace.session_id,
+            process_id=inpt.trace.process_id,
+            is_async=inpt.is_async,
+        )
+
+    def _export_trace(self, tracer: tracing.Tracer) -> None:
+        for exporter in self._trace_exporters:
+            exporter.export(tracer)
 
     def _fail(self, e: Exception) -> None:
         print("\n".join(traceback.format_exception(e)))
@@ -187,6 +263,32 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
 
         finally:
             ctx.finish()
+            self._dispatch_async_inputs(ctx)
+
+    async def _react_async(self, ctx: Context) -> List[Output]:
+        try:
+            pipeline = self._build_async_pipeline()
+            ctx = await pipeline(ctx)
+
+            return ctx.get_unsent_outputs()
+        except ContextError as e:
+            return [self._failure_message(_input=ctx.input, err=e)]
+        except CloneError as e:
+            ctx.on_fatal(e)
+            return [self._failure_message(_input=ctx.input, err=e)]
+
+        finally:
+            await to_thread(ctx.finish)
+            self._dispatch_async_inputs(ctx)
+
+    def _dispatch_async_inputs(self, ctx: Context) -> None:
+        """
+        本轮状态保存之后, 把异步输入交给分发器在后台运行.
+        """
+        inputs = ctx.get_unsent_async_inputs()
+        if inputs:
+            dispatcher = self._container.force_fetch(AsyncInputDispatcher)
+            dispatcher.dispatch(list(inputs))
 
     @classmethod
     def _failure_message(cls, _input: Input, err: GhostError) -> Output:
@@ -230,16 +332,62 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
             self._config,
         )
 
+    # ---- 中间件管道 ---- #
+
+    def compile_pipelines(self) -> None:
+        """
+        编译同步和异步的中间件管道.
+        """
+        middlewares = self._middlewares()
+        self._pipeline = self._compile_pipeline(middlewares)
+        self._async_pipeline = self._compile_async_pipeline(middlewares)
+
+    def invalidate_pipelines(self) -> None:
+        """
+        清空编译好的管道, 下一个请求会重新编译. 中间件或者它依赖的配置变更后调用.
+        """
+        self._pipeline = None
+        self._async_pipeline = None
+
+    def add_context_middleware(self, middleware: CtxMiddleware) -> None:
+        """
+        运行时追加中间件.
+        """
+        self._added_middleware.append(middleware)
+        self.invalidate_pipelines()
+
+    def set_pipe_timer(self, timer: PIPE_TIMER | None) -> None:
+        """
+        设置每个中间件的计时回调, 参数是中间件的名字和它自身的耗时. 传入 None 关闭计时.
+        """
+        self._pipe_timer = timer
+        self.invalidate_pipelines()
+
+    def _middlewares(self) -> List[CtxMiddleware]:
+        return self.get_context_middleware() + self._added_middleware
+
     # ---- 内部方法 ---- #
 
-    def _build_pipeline(self) -> Callable[[Context], Context]:
+    def _build_pipeline(self) -> CtxPipeline:
+        pipeline = self._pipeline
+        if pipeline is None:
+            pipeline = self._compile_pipeline(self._middlewares())
+            self._pipeline = pipeline
+        return pipeline
+
+    def _compile_pipeline(self, middlewares: List[CtxMiddleware]) -> CtxPipeline:
         """
         使用中间件实现一个管道
         """
         pipes: List[CtxPipe] = []
+        timer = self._pipe_timer
         # 用 run 方法组成 pipes
-        for m in self.get_context_middleware():
+        for m in middlewares:
             pipe = m.new(self)
+            if timer is not None:
+                pipe = timed_pipe(m.name(), pipe, timer)
+            if self._config.trace_sample_rate > 0:
+                pipe = tracing.traced_pipe(m.name(), pipe)
             pipes.append(pipe)
         # 返回 pipeline
         return create_pipeline(pipes, self._build_destination())
@@ -262,6 +410,36 @@ class GhostKernel(Ghost, metaclass=ABCMeta):
 
         return destination
 
+    def _build_async_pipeline(self) -> AsyncCtxPipeline:
+        pipeline = self._async_pipeline
+        if pipeline is None:
+            pipeline = self._compile_async_pipeline(self._middlewares())
+            self._async_pipeline = pipeline
+        return pipeline
+
+    def _compile_async_pipeline(self, middlewares: List[CtxMiddleware]) -> AsyncCtxPipeline:
+        pipes: List[AsyncCtxPipe] = []
+        timer = self._pipe_timer
+        for m in middlewares:
+            pipe = m.new_async(self)
+            if timer is not None:
+                pipe = timed_async_pipe(m.name(), pipe, timer)
+            if self._config.trace_sample_rate > 0:
+                pipe = tracing.traced_async_pipe(m.name(), pipe)
+            pipes.append(pipe)
+        return create_async_pipeline(pipes, self._build_async_destination())
+
+    def _build_async_destination(self) -> AsyncCtxPipeline:
+
+        async def destination(ctx: Context) -> Context:
+            kernel = self.new_operation_kernel()
+            op = kernel.init_operator()
+            await kernel.run_dominos_async(ctx, op)
+            kernel.destroy()
+            return ctx
+
+        return destination
+
     @property
     def config_path(self) -> str:
         return self._config_path
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import ClassVar, Dict, List, Optional
+
+from ghoshell.ghost import Session
+from ghoshell.utils import StatsCounter
+
+
+class Lease:
+    """
+    持有中的一把锁.
+    """
+
+    def __init__(self, session: Session, key: str, token: int, overdue: int):
+        self.session = session
+        self.key = key
+        self.token = token
+        self.overdue = overdue
+        self.acquired_at = time.monotonic()
+        # 在过期之前续约, 容忍一次续约失败.
+        self.interval = overdue / 3
+        self.renew_at = self.acquired_at + self.interval
+        # 续约失败, 锁可能已经被别人拿走.
+        self.lost: bool = False
+
+    def renew(self) -> bool:
+        if self.session.renew_lock(self.key, self.token, self.overdue):
+            self.renew_at = time.monotonic() + self.interval
+            return True
+        self.lost = True
+        return False
+
+
+class LeaseKeeper:
+    """
+    后台续约的守护线程. 所有 runtime 共用一个线程, 没有需要续约的锁时阻塞等待.
+    """
+
+    _leases: ClassVar[List[Lease]] = []
+    _condition: ClassVar[threading.Condition] = threading.Condition()
+    _thread: ClassVar[Optional[threading.Thread]] = None
+    _logger: ClassVar[logging.Logger] = logging.getLogger("ghoshell.locker")
+
+    @classmethod
+    def keep(cls, lease: Lease) -> None:
+        with cls._condition:
+            cls._leases.append(lease)
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._run, name="ghoshell-lease-keeper", daemon=True)
+                cls._thread.start()
+            cls._condition.notify_all()
+
+    @classmethod
+    def release(cls, lease: Lease) -> None:
+        with cls._condition:
+            if lease in cls._leases:
+                cls._leases.remove(lease)
+
+    @classmethod
+    def _run(cls) -> None:
+        while True:
+            with cls._condition:
+                while not cls._leases:
+                    cls._condition.wait()
+                now = time.monotonic()
+                due = [lease for lease in cls._leases if lease.renew_at <= now]
+                if not due:
+                    cls._condition.wait(min(lease.renew_at for lease in cls._leases) - now)
+                    continue
+            # 续约需要访问 cache, 不持有 condition.
+            for lease in due:
+                try:
+                    renewed = lease.renew()
+                except Exception as e:
+                    # 一个锁续约出错不能结束守护线程, 其它的锁还需要续约.
+                    cls._logger.exception(e)
+                    lease.lost = True
+                    renewed = False
+                if renewed:
+                    ProcessLocker.counter.incr("renewed")
+                else:
+                    ProcessLocker.counter.incr("lost")
+                    cls.release(lease)
+
+
+class ProcessLocker:
+    """
+    RuntimeImpl 的进程锁管理.
+
+    1. 加锁成功得到 fencing token, 保存时用 token 检查锁是否仍然有效, 过期的保存会被拒绝.
+    2. 持有锁期间后台自动续约, 避免长时间的 LLM 调用让锁过期, 导致两个 worker 同时写入.
+    3. 记录等锁和持有锁的时间.
+    """
+
+    _logger: ClassVar[logging.Logger] = logging.getLogger("ghoshell.locker")
+
+    # 进程级别的计数, 方便观察. 时间单位是毫秒.
+    counter: ClassVar[StatsCounter] = StatsCounter(
+        "acquired", "failed", "renewed", "lost", "rejected",
+        "wait_ms", "wait_max_ms", "hold_ms", "hold_max_ms",
+    )
+
+    def __init__(self, session: Session, overdue: int, renewal: bool = True):
+        self._session = session
+        self._overdue = overdue
+        self._renewal = renewal and overdue > 0
+        self._leases: Dict[str, Lease] = {}
+        # 第一次尝试加锁的时间, 用来统计等锁的时间.
+        self._first_try: Dict[str, float] = {}
+
+    def lock(self, key: str) -> bool:
+        if key in self._leases:
+            return True
+        now = time.monotonic()
+        first_try = self._first_try.setdefault(key, now)
+        token = self._session.lock(key, self._overdue)
+        if not token:
+            self.counter.incr("failed")
+            return False
+        waited = now - first_try
+        del self._first_try[key]
+        lease = Lease(self._session, key, token, self._overdue)
+        self._leases[key] = lease
+        if self._renewal:
+            LeaseKeeper.keep(lease)
+        self.counter.incr("acquired")
+        self.observe("wait", waited)
+        return True
+
+    def unlock(self, key: str) -> bool:
+        lease = self._leases.pop(key, None)
+        if lease is None:
+            return False
+        LeaseKeeper.release(lease)
+        self.observe("hold", time.monotonic() - lease.acquired_at)
+        return self._session.unlock(key, lease.token)
+
+    def fence(self) -> None:
+        """
+        session 本轮的写操作只有在所有的锁仍然有效时才提交.
+        """
+        for lease in self._leases.values():
+            self._session.fence(lease.key, lease.token)
+
+    def token(self, key: str) -> int:
+        lease = self._leases.get(key, None)
+        return lease.token if lease is not None else 0
+
+    def reject(self) -> str:
+        """
+        fence 之后 session 的提交被拒绝, 说明有锁已经失效. 记录日志, 返回持有的锁和 token.
+        """
+        self.counter.incr("rejected")
+        held = ", ".join(f"{key}#{lease.token}" for key, lease in self._leases.items())
+        self._logger.warning("session flush rejected by fencing, locks %s are lost", held)
+        return held
+
+    def release_all(self) -> None:
+        for key in list(self._leases.keys()):
+            self.unlock(key)
+
+    @classmethod
+    def observe(cls, name: str, seconds: float) -> None:
+        ms = seconds * 1000
+        cls.counter.incr(f"{name}_ms", ms)
+        cls.counter.maximum(f"{name}_max_ms", ms)
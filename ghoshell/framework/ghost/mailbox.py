@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import ClassVar, Deque, Dict, List, Optional
+
+from ghoshell.ghost import Context, BusyError
+from ghoshell.messages import Text
+from ghoshell.utils import StatsCounter, to_thread
+
+
+class Letter:
+    """
+    信箱里排队的一个输入.
+    """
+
+    __slots__ = ("ctx", "absorbed")
+
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        # 被排在前面的输入合并了, 不需要再处理.
+        self.absorbed: bool = False
+
+    def text(self) -> Optional[Text]:
+        inpt = self.ctx.input
+        if inpt.is_async or inpt.stateless:
+            return None
+        # 只合并纯文本的输入.
+        if len(inpt.payload.body) != 1:
+            return None
+        return self.ctx.read(Text)
+
+
+class Mailbox:
+    """
+    单个 process 的信箱.
+    抢不到 process 锁的输入按到达顺序排队, 只有队首会去重试加锁.
+    锁的持有者可能在别的进程里, 所以除了等待通知, 还要按 poll_interval 轮询.
+    """
+
+    # 所有的信箱, key 是 process id. 队列为空时移除.
+    _mailboxes: ClassVar[Dict[str, "Mailbox"]] = {}
+    _registry_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    # 进程级别的计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter("queued", "coalesced", "rejected", "timeout")
+
+    def __init__(self, process_id: str):
+        self.process_id = process_id
+        self.condition = threading.Condition()
+        self.queue: Deque[Letter] = deque()
+
+    @classmethod
+    def get(cls, process_id: str) -> "Mailbox":
+        with cls._registry_lock:
+            mailbox = cls._mailboxes.get(process_id, None)
+            if mailbox is None:
+                mailbox = Mailbox(process_id)
+                cls._mailboxes[process_id] = mailbox
+            return mailbox
+
+    @classmethod
+    def notify(cls, process_id: str) -> None:
+        """
+        锁释放之后通知排队的输入.
+        """
+        with cls._registry_lock:
+            mailbox = cls._mailboxes.get(process_id, None)
+        if mailbox is not None:
+            with mailbox.condition:
+                mailbox.condition.notify_all()
+
+    def wait(
+            self,
+            ctx: Context,
+            timeout: float,
+            max_depth: int,
+            coalesce: bool,
+            poll_interval: float = 0.05,
+    ) -> bool:
+        """
+        排队等待 process 锁.
+        返回 True 表示拿到了锁, False 表示输入被前面的输入合并了.
+        队列已满或者等待超时, 抛出 BusyError.
+        """
+        runtime = ctx.runtime
+        letter = Letter(ctx)
+        deadline = time.monotonic() + timeout
+        mailbox = self._enter(letter, max_depth)
+        if mailbox is not self:
+            return mailbox.wait(ctx, timeout, max_depth, coalesce, poll_interval)
+        with self.condition:
+            try:
+                while not letter.absorbed:
+                    if self.queue[0] is letter and runtime.lock_process(self.process_id):
+                        self.queue.popleft()
+                        if coalesce:
+                            self._coalesce(letter)
+                        return True
+                    remains = deadline - time.monotonic()
+                    if remains <= 0:
+                        self.counter.incr("timeout")
+                        raise BusyError(f"wait for process {self.process_id} timeout")
+                    self.condition.wait(min(remains, poll_interval))
+                return False
+            finally:
+                self._leave(letter)
+
+    async def wait_async(
+            self,
+            ctx: Context,
+            timeout: float,
+            max_depth: int,
+            coalesce: bool,
+            poll_interval: float = 0.05,
+    ) -> bool:
+        """
+        wait 的异步版本.
+        排队期间不占用线程, 按 poll_interval 轮询. 只有队首加锁时才用到线程池,
+        避免排队的输入占满线程池, 让锁的持有者无法保存和释放锁.
+        """
+        runtime = ctx.runtime
+        letter = Letter(ctx)
+        deadline = time.monotonic() + timeout
+        mailbox = self._enter(letter, max_depth)
+        if mailbox is not self:
+            return await mailbox.wait_async(ctx, timeout, max_depth, coalesce, poll_interval)
+        try:
+            while True:
+                with self.condition:
+                    if letter.absorbed:
+                        return False
+                    is_head = self.queue[0] is letter
+                # 只有队首会出队, 加锁期间 letter 仍然是队首.
+                if is_head and await to_thread(runtime.lock_process, self.process_id):
+                    with self.condition:
+                        self.queue.popleft()
+                        if coalesce:
+                            self._coalesce(letter)
+                    return True
+                remains = deadline - time.monotonic()
+                if remains <= 0:
+                    self.counter.incr("timeout")
+                    raise BusyError(f"wait for process {self.process_id} timeout")
+                await asyncio.sleep(min(remains, poll_interval))
+        finally:
+            with self.condition:
+                self._leave(letter)
+
+    def _enter(self, letter: Letter, max_depth: int) -> "Mailbox":
+        """
+        把输入放进信箱, 返回实际排队的信箱.
+        get 和 wait 之间, 信箱可能因为清空被注销, 甚至已经有了新的信箱.
+        持有 condition 检查注册 (_release 也要持有 condition), 被注销的信箱重新注册;
+        已经有新的信箱时不入队, 调用方改到新的信箱里排队. 保证每个 process 只有一个队列.
+        """
+        with self.condition:
+            with self._registry_lock:
+                current = self._mailboxes.setdefault(self.process_id, self)
+            if current is not self:
+                return current
+            if len(self.queue) >= max_depth:
+                self.counter.incr("rejected")
+                self._release()
+                raise BusyError(f"mailbox of process {self.process_id} is full")
+            self.queue.append(letter)
+            self.counter.incr("queued")
+            return self
+
+    def _leave(self, letter: Letter) -> None:
+        if letter in self.queue:
+            self.queue.remove(letter)
+        # 队首变化了, 通知其它的输入.
+        self.condition.notify_all()
+        self._release()
+
+    def _coalesce(self, head: Letter) -> None:
+        """
+        把紧跟在后面的连续文本输入合并到队首的输入里.
+        """
+        text = head.text()
+        if text is None:
+            return
+        contents: List[str] = [text.content]
+        while self.queue:
+            following = self.queue[0].text()
+            if following is None:
+                break
+            contents.append(following.content)
+            self.queue.popleft().absorbed = True
+        if len(contents) == 1:
+            return
+        self.counter.incr("coalesced", len(contents) - 1)
+        inpt = head.ctx.input.model_copy(deep=True)
+        inpt.payload.body = {}
+        Text(content="\n".join(contents), markdown=text.markdown).join(inpt.payload)
+        head.ctx.reset_input(inpt)
+
+    def _release(self) -> None:
+        """
+        队列清空后注销信箱. 调用方需要持有 condition, 参考 _enter.
+        """
+        if self.queue:
+            return
+        with self._registry_lock:
+            if not self.queue and self._mailboxes.get(self.process_id, None) is self:
+                del self._mailboxes[self.process_id]
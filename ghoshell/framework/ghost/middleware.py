@@ -1,50 +1,141 @@
+import sys
 from abc import ABCMeta, abstractmethod
-from typing import Callable
+from typing import Callable, Awaitable, Dict
 
 from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.mailbox import Mailbox
 from ghoshell.ghost import Context, Ghost
 from ghoshell.ghost import ContextError, BusyError, UnexpectedError
+from ghoshell.utils import to_thread, adapt_sync_pipe
 
 CtxPipeline = Callable[[Context], Context]
 CtxPipe = Callable[[Context, CtxPipeline], Context]
+AsyncCtxPipeline = Callable[[Context], Awaitable[Context]]
+AsyncCtxPipe = Callable[[Context, AsyncCtxPipeline], Awaitable[Context]]
 
 
 class CtxMiddleware(metaclass=ABCMeta):
     """
     ctx 运行时的中间件.
+    new 返回的 pipe 会在 ghost 启动时编译进管道并复用, 所以 pipe 本身不能保存请求级别的状态.
     """
 
+    def name(self) -> str:
+        return self.__class__.__name__
+
     @abstractmethod
     def new(self, ghost: Ghost) -> CtxPipe:
         pass
 
+    def new_async(self, ghost: Ghost) -> AsyncCtxPipe:
+        """
+        异步管道使用的中间件. 默认把同步的 pipe 放到线程里运行.
+        有 I/O 的中间件应该实现原生的版本.
+        """
+        return adapt_sync_pipe(self.new(ghost))
+
 
 def mock_pipe(_input: Context, after: CtxPipeline) -> Context:
     return after(_input)
 
 
 class ProcessLockerMiddleware(CtxMiddleware):
+    """
+    处理输入之前锁住 process.
+    开启 process_mailbox 时, 抢不到锁的输入在信箱里排队, 参考 Mailbox.
+    """
 
     def new(self, ghost: Ghost) -> CtxPipe:
         config = ghost.container.force_fetch(GhostConfig)
 
         def pipe(ctx: Context, after: CtxPipeline) -> Context:
-            runtime = ctx.runtime
-            process_id = runtime.current_process_id
-            locked = False
+            process_id = ctx.runtime.current_process_id
+            if not self._lock(ctx, process_id, config):
+                # 已经合并到前面的输入里处理了.
+                return ctx
             try:
-                locked = runtime.lock_process(process_id)
-                # lock failed
-                if not locked:
-                    raise BusyError(f"lock process {process_id} failed")
+                ctx = after(ctx)
+                # 先保存再释放锁, 保证等待的输入能读到最新的状态.
+                ctx.runtime.finish()
+                return ctx
+            finally:
+                self._unlock(ctx, process_id, config)
 
-                return after(ctx)
+        return pipe
+
+    def new_async(self, ghost: Ghost) -> AsyncCtxPipe:
+        config = ghost.container.force_fetch(GhostConfig)
+
+        async def pipe(ctx: Context, after: AsyncCtxPipeline) -> Context:
+            # 读取 runtime 和加锁都有 I/O, 放到线程池里.
+            process_id = await to_thread(lambda: ctx.runtime.current_process_id)
+            if not await to_thread(ctx.runtime.lock_process, process_id):
+                # 排队可能要等很久, 异步等待, 不占用线程池.
+                options = self._wait_options(ctx, process_id, config)
+                if not await Mailbox.get(process_id).wait_async(ctx, **options):
+                    return ctx
+                await to_thread(self._reload, ctx, process_id, config)
+            try:
+                ctx = await after(ctx)
+                await to_thread(ctx.runtime.finish)
+                return ctx
             finally:
-                if locked:
-                    runtime.unlock_process(process_id)
+                await to_thread(self._unlock, ctx, process_id, config)
 
         return pipe
 
+    @staticmethod
+    def _lock(ctx: Context, process_id: str, config: GhostConfig) -> bool:
+        """
+        锁住 process. 返回 False 表示输入被合并了, 不需要再处理.
+        """
+        if ctx.runtime.lock_process(process_id):
+            return True
+        # lock failed
+        options = ProcessLockerMiddleware._wait_options(ctx, process_id, config)
+        locked = Mailbox.get(process_id).wait(ctx, **options)
+        if locked:
+            ProcessLockerMiddleware._reload(ctx, process_id, config)
+        return locked
+
+    @staticmethod
+    def _wait_options(ctx: Context, process_id: str, config: GhostConfig) -> Dict:
+        """
+        抢不到锁时在信箱里排队的参数. 不能排队时抛出 BusyError.
+        """
+        if ctx.input.is_async:
+            # 异步输入回复 on_busy 会丢失它的结果 (比如子进程的回调), 所以总是排队等待.
+            # 等待超时的 BusyError 交给 AsyncInputDispatcher 重试.
+            return dict(
+                timeout=config.async_input_lock_timeout,
+                max_depth=sys.maxsize,
+                coalesce=False,
+            )
+        if not config.process_mailbox:
+            raise BusyError(f"lock process {process_id} failed")
+        return dict(
+            timeout=config.process_mailbox_timeout,
+            max_depth=config.process_mailbox_max_depth,
+            coalesce=config.process_mailbox_coalesce,
+        )
+
+    @staticmethod
+    def _reload(ctx: Context, process_id: str, config: GhostConfig) -> None:
+        """
+        排队拿到锁之后, 重新读取等待期间锁的持有者修改过的 process.
+        """
+        try:
+            ctx.runtime.reload()
+        except Exception:
+            ProcessLockerMiddleware._unlock(ctx, process_id, config)
+            raise
+
+    @staticmethod
+    def _unlock(ctx: Context, process_id: str, config: GhostConfig) -> None:
+        ctx.runtime.unlock_process(process_id)
+        # 没有开启信箱时, 也可能有异步输入在排队.
+        Mailbox.notify(process_id)
+
 
 class ExceptionHandlerMiddleware(CtxMiddleware):
     """
@@ -59,18 +150,33 @@ class ExceptionHandlerMiddleware(CtxMiddleware):
         def pipe(ctx: Context, after: CtxPipeline) -> Context:
             try:
                 return after(ctx)
+            except ContextError as e:
+                return self._on_error(ctx, e, config)
 
-            except BusyError as e:
-                ctx.logger.info(e)
-                ctx.send_at(None).text(config.on_busy)
-                return ctx
-            except UnexpectedError as e:
-                ctx.logger.info(e)
-                ctx.send_at(None).err(config.on_unexpected)
+        return pipe
+
+    def new_async(self, ghost: Ghost) -> AsyncCtxPipe:
+        config = ghost.container.force_fetch(GhostConfig)
+
+        async def pipe(ctx: Context, after: AsyncCtxPipeline) -> Context:
+            try:
+                return await after(ctx)
             except ContextError as e:
-                ctx.logger.info(e)
-                ctx.send_at(None).err(e.message, e.CODE)
-                return ctx
-            # todo: 建立更好的 context 处理原则.
+                return self._on_error(ctx, e, config)
 
         return pipe
+
+    @staticmethod
+    def _on_error(ctx: Context, e: ContextError, config: GhostConfig) -> Context:
+        # todo: 建立更好的 context 处理原则.
+        ctx.logger.info(e)
+        if isinstance(e, BusyError) and ctx.input.is_async:
+            # 异步输入不回复 on_busy, 由 AsyncInputDispatcher 重试.
+            raise e
+        if isinstance(e, BusyError):
+            ctx.send_at(None).text(config.on_busy)
+        elif isinstance(e, UnexpectedError):
+            ctx.send_at(None).err(config.on_unexpected)
+        else:
+            ctx.send_at(None).err(e.message, e.CODE)
+        return ctx
@@ -7,22 +7,32 @@ from typing import Optional, Iterator, Dict
 import yaml
 
 from ghoshell.framework.contracts import ThinkMetaStorage  # ThinkMetaDriverProvider
-from ghoshell.ghost import Mindset, ThinkDriver
-from ghoshell.meta import Meta
+from ghoshell.ghost import Mindset, ThinkDriver, Think
+from ghoshell.meta import Meta, MetaInstanceCache
 
 
 class MindsetImpl(Mindset):
 
-    def __init__(self, storage: ThinkMetaStorage, clone_id: str | None):
+    def __init__(
+            self,
+            storage: ThinkMetaStorage,
+            clone_id: str | None,
+            thinks_cache: MetaInstanceCache[Think] | None = None,
+    ):
         self._think_metas_storage = storage.clone(clone_id)  # 这个 driver 专门用于保存 ThinkMeta. 用于动态存储.
         self._think_meta_drivers = {}
         self._clone_id = clone_id
+        # think 实例的缓存. clone 与 ghost 共享同一个缓存, 以 meta 内容 hash 做区分.
+        self._thinks_cache = thinks_cache if thinks_cache is not None else MetaInstanceCache()
 
     def clone(self, clone_id: str) -> Mindset:
-        mindset = MindsetImpl(self._think_metas_storage, clone_id)
+        mindset = MindsetImpl(self._think_metas_storage, clone_id, self._thinks_cache)
         mindset._think_meta_drivers = self._think_meta_drivers.copy()
         return mindset
 
+    def meta_instance_cache(self) -> MetaInstanceCache[Think] | None:
+        return self._thinks_cache
+
     def fetch_meta(self, thinking: str) -> Optional[Meta]:
         meta = self._think_metas_storage.fetch_meta(thinking, self._clone_id)
         if meta is not None:
@@ -31,6 +41,11 @@ class MindsetImpl(Mindset):
 
     def register_meta_driver(self, driver: ThinkDriver) -> None:
         self._think_meta_drivers[driver.meta_kind()] = driver
+        if self._clone_id is not None:
+            # clone 有了自己的 driver, 不再和 ghost 共享缓存.
+            self._thinks_cache = MetaInstanceCache()
+        else:
+            self._thinks_cache.clear()
         for meta in driver.preload_metas():
             self.register_meta(meta)
 
@@ -48,12 +63,14 @@ class MindsetImpl(Mindset):
         或者合并多个 Mindset.
         """
         self._think_metas_storage.register_meta(meta, self._clone_id)
+        self._thinks_cache.forget(meta.id)
 
     def destroy(self) -> None:
         if self._clone_id is not None:
             del self._clone_id
             del self._think_metas_storage
             del self._think_meta_drivers
+            del self._thinks_cache
 
 
 class LocalFileThinkMetaStorage(ThinkMetaStorage):
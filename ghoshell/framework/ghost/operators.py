@@ -3,12 +3,13 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from typing import Optional, List, ClassVar, Type, Dict
 
+from ghoshell.framework.ghost.config import GhostConfig
 from ghoshell.ghost import Attention, Intention
 from ghoshell.ghost import Context
 from ghoshell.ghost import CtxTool
 from ghoshell.ghost import OnReceived, OnActivating, OnPreempted, OnCallback
 from ghoshell.ghost import OnWithdrawing, OnCanceling, OnFailing, OnQuiting
-from ghoshell.ghost import Operator
+from ghoshell.ghost import Operator, ChainOperator
 from ghoshell.ghost import RuntimeTool
 from ghoshell.ghost import Task, TaskStatus, TaskLevel
 from ghoshell.ghost import UnexpectedError
@@ -75,40 +76,6 @@ class AbsOperator(Operator, metaclass=ABCMeta):
         return "\n".join(lines)
 
 
-class ChainOperator(Operator):
-    """
-    链式 operator
-    """
-
-    def __init__(self, chain: List[Operator] = None):
-        if chain is None:
-            chain = []
-        self.chain = chain
-
-    def run(self, ctx: "Context") -> Optional["Operator"]:
-        chain = self.chain
-        if len(chain) == 0:
-            return None
-        op = chain[0]
-        chain = chain[1:]
-        after = op.run(ctx)
-        if after is None:
-            return ChainOperator(chain)
-        if len(chain) == 0:
-            return after
-        chain.insert(0, after)
-        return ChainOperator(chain)
-
-    def destroy(self) -> None:
-        del self.chain
-
-    def __repr__(self):
-        result = [f"{self.__class__.__name__}:"]
-        for op in self.chain:
-            result.append(str(op))
-        return "\n".join(result)
-
-
 class ReceiveInputOperator(AbsOperator):
     """
     接受到一个 Input
@@ -161,18 +128,9 @@ class ReceiveInputOperator(AbsOperator):
 
         awaiting_task = RuntimeTool.fetch_current_task(ctx)
 
-        # 目前认为需要分批匹配意图. 第一批是前序意图, 决定重定向方向.
-        attentions = CtxTool.context_attentions(ctx)
-        matched = CtxTool.match_attentions(ctx, attentions)
-
-        if matched is not None:
-            return IntendingOperator(matched)
-
-        # 第二批是后续意图, 用来激活后续任务
-        attentions = CtxTool.context_attentions(ctx)
-        matched = CtxTool.match_attentions(ctx, attentions)
+        # 匹配上下文的意图, 决定重定向方向. 索引每轮只构建一次.
+        matched = CtxTool.match_context_attentions(ctx)
         if matched is not None:
-            # 允许定义拦截逻辑.
             return IntendingOperator(matched)
 
         # 都没有匹配, 就尝试模糊匹配.
@@ -447,19 +405,30 @@ class AwaitOperator(AbsOperator):
         elif self.exclude is not None:
             reaction_names = reaction_names - set(self.exclude)
 
+        config = ctx.container.get(GhostConfig)
+        referred = config is not None and config.attention_reference
         attentions = []
         for reaction_name in reaction_names:
             reaction = reactions.get(reaction_name, None)
             if reaction is None:
                 continue
-            intentions = reaction.intentions(ctx)
             url_dict = task.url.model_dump()
-            attention = Attention(
-                to=url_dict,
-                intentions=[intention.model_dump() for intention in intentions],
-                reaction=reaction_name,
-                level=reaction.level(),
-            )
+            if referred:
+                # 引用模式只保存 stage 和 reaction 名, 匹配时再还原 intentions.
+                attention = Attention(
+                    to=url_dict,
+                    reaction=reaction_name,
+                    level=reaction.level(),
+                    referred=True,
+                )
+            else:
+                intentions = reaction.intentions(ctx)
+                attention = Attention(
+                    to=url_dict,
+                    intentions=[intention.model_dump() for intention in intentions],
+                    reaction=reaction_name,
+                    level=reaction.level(),
+                )
             attentions.append(attention)
         task.await_at(self.stage, attentions)
         # 变更 process 的 awaiting
@@ -650,7 +619,7 @@ class WithdrawOperator(AbsOperator, metaclass=ABCMeta):
         callback_tasks = RuntimeTool.fetch_process_tasks_by_ids(ctx, list(callbacks))
         for task in callback_tasks:
             task.status = self.status
-        RuntimeTool.store_task(*callback_tasks)
+        RuntimeTool.store_task(ctx, *callback_tasks)
         # 正常情况才走 schedule
         p = ctx.runtime.current_process()
         p.reset_indexes()
@@ -5,14 +5,17 @@ from logging import LoggerAdapter
 from typing import Dict, Type
 
 from ghoshell.container import Provider, Container, Contract
-from ghoshell.contracts import Cache
+from ghoshell.contracts import Cache, StateCodec
 from ghoshell.framework.contracts.think_meta_storage import ThinkMetaStorage
+from ghoshell.framework.ghost.codec import new_state_codec
 from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.dispatcher import AsyncInputDispatcher
 from ghoshell.framework.ghost.focus import FocusImpl
 from ghoshell.framework.ghost.memory import Memory, MemoryImpl
 from ghoshell.framework.ghost.mindset import MindsetImpl, LocalFileThinkMetaStorage
 from ghoshell.framework.ghost.runtime import RuntimeImpl
 from ghoshell.framework.ghost.session import SessionImpl
+from ghoshell.framework.ghost.streaming import OutputStreamer
 from ghoshell.ghost import Context, BootstrapError
 from ghoshell.ghost import Mindset, Focus, Ghost, Session, Runtime
 
@@ -48,6 +51,38 @@ class MindsetProvider(Provider):
         return MindsetImpl(driver, None)
 
 
+class AsyncInputDispatcherProvider(Provider):
+
+    def singleton(self) -> bool:
+        return True
+
+    def contract(self) -> Type[Contract]:
+        return AsyncInputDispatcher
+
+    def factory(self, con: Container, params: Dict | None = None) -> Contract | None:
+        ghost = con.force_fetch(Ghost)
+        config = con.force_fetch(GhostConfig)
+        return AsyncInputDispatcher(
+            ghost,
+            config.async_input_workers,
+            config.async_input_queue_size,
+            retries=config.async_input_retries,
+            backoff=config.async_input_retry_backoff,
+        )
+
+
+class OutputStreamerProvider(Provider):
+
+    def singleton(self) -> bool:
+        return True
+
+    def contract(self) -> Type[Contract]:
+        return OutputStreamer
+
+    def factory(self, con: Container, params: Dict | None = None) -> Contract | None:
+        return OutputStreamer()
+
+
 class MemoryProvider(Provider):
 
     def singleton(self) -> bool:
@@ -89,7 +124,12 @@ class FocusProvider(Provider):
         return Focus
 
     def factory(self, con: Container, params: Dict | None = None) -> Contract | None:
-        return FocusImpl()
+        config = con.force_fetch(GhostConfig)
+        return FocusImpl(
+            concurrent=config.focus_concurrent,
+            expensive_cost=config.focus_expensive_cost,
+            workers=config.focus_workers,
+        )
 
 
 class SimpleAPIProvider(Provider):
@@ -104,6 +144,22 @@ class SimpleAPIProvider(Provider):
         pass
 
 
+class StateCodecProvider(Provider):
+    """
+    根据 GhostConfig.session_codec 选择状态数据的编码.
+    """
+
+    def singleton(self) -> bool:
+        return True
+
+    def contract(self) -> Type[Contract]:
+        return StateCodec
+
+    def factory(self, con: Container, params: Dict | None = None) -> Contract | None:
+        config = con.force_fetch(GhostConfig)
+        return new_state_codec(config.session_codec)
+
+
 class SessionProvider(Provider):
 
     def singleton(self) -> bool:
@@ -116,11 +172,13 @@ class SessionProvider(Provider):
         cache = con.force_fetch(Cache)
         config = con.force_fetch(GhostConfig)
         context = con.force_fetch(Context)
+        codec = con.fetch(StateCodec)
         session = SessionImpl(
             cache,
             clone_id=context.clone.clone_id,
             session_id=context.input.trace.session_id,
             expire=config.session_overdue,
+            codec=codec,
         )
         return session
 
@@ -143,5 +201,11 @@ class RuntimeProvider(Provider):
             context.input.stateless,
             config.process_max_tasks,
             config.process_lock_overdue,
+            config.process_delta_saving,
+            config.process_trusted_loading,
+            config.process_task_prefetch,
+            config.process_lock_renewal,
+            context.input.trace.process_id,
+            context.input.trace.parent_process_id,
         )
         return runtime
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, ClassVar
 
+from ghoshell.framework.ghost.gc import ProcessGC, ProcessGCResult
+from ghoshell.framework.ghost.locker import ProcessLocker
 from ghoshell.ghost import *
 from ghoshell.messages import Tasked
 from ghoshell.utils import InstanceCount
 
 
 class RuntimeImpl(Runtime):
+    # 长期任务数据的预读策略.
+    # eager: 读取 process 时, 一次性读取所有长期任务的数据.
+    # lazy: 第一次 instance_task 时才读取.
+    # attention: 只预读注意力路径上 (root, current, waiting) 的长期任务.
+    TASK_PREFETCH_EAGER: ClassVar[str] = "eager"
+    TASK_PREFETCH_LAZY: ClassVar[str] = "lazy"
+    TASK_PREFETCH_ATTENTION: ClassVar[str] = "attention"
 
     def __init__(
             self,
@@ -17,12 +26,28 @@ class RuntimeImpl(Runtime):
             stateless: bool,
             process_max_tasks: int,
             process_lock_overdue: int,
+            # 是否只保存变更过的 task.
+            process_delta_saving: bool = False,
+            # 读取 process 时是否跳过校验. 只有存储数据可信时才应该打开.
+            process_trusted_loading: bool = False,
+            task_prefetch: str = TASK_PREFETCH_LAZY,
+            # 持有进程锁期间是否在后台续约.
+            process_lock_renewal: bool = True,
+            # 指定运行的进程, 为空时使用 session 的当前进程. 异步输入会指定子进程或者父进程.
+            process_id: str = "",
+            # 新建进程时记录的父进程 id.
+            parent_process_id: str = "",
     ):
         self._stateless = stateless
+        self._process_delta_saving = process_delta_saving
+        self._process_trusted_loading = process_trusted_loading
+        self._task_prefetch = task_prefetch
         self._session: Session = session
         self._session_id: str = session.session_id
         self._process_lock_overdue = process_lock_overdue
         self._process_max_tasks = process_max_tasks
+        self._process_gc = ProcessGC(process_max_tasks)
+        self._locker = ProcessLocker(session, process_lock_overdue, process_lock_renewal)
 
         # init root
         self._root_url = root_url
@@ -31,9 +56,14 @@ class RuntimeImpl(Runtime):
         self._cached_tasks: Dict[str, Dict[str, Task]] = {}
         self._cached_processes: Dict[str, Process | None] = {}
         self._stored_processes: Dict[str, Process | None] = {}
+        # 增量保存时, 记录读取时每个 task 的存储数据, 用来判断 task 是否变更.
+        self._stored_tasks_data: Dict[str, Dict[str, Dict]] = {}
+        # 本次请求已经读取过的长期任务数据. 值为 None 表示没有存储数据.
+        self._tasked_data: Dict[str, Tasked | None] = {}
         self._locked: Dict[str, bool] = {}
         self._finished: bool = False
-        self._current_process_id = session.current_process_id()
+        self._current_process_id = process_id or session.current_process_id()
+        self._parent_process_id = parent_process_id or None
 
         # 初始化 process.
         self._init_process()
@@ -53,7 +83,11 @@ class RuntimeImpl(Runtime):
         """
         生成新的 process.
         """
-        process = Process.new_process(self._session_id, self._current_process_id, parent_id=None)
+        process = Process.new_process(
+            self._session_id,
+            self._current_process_id,
+            parent_id=self._parent_process_id,
+        )
         self.store_process(process)
 
     def get_process(self, pid: str | None = None) -> Process | None:
@@ -72,28 +106,96 @@ class RuntimeImpl(Runtime):
         else:
             process = process_data.new_round()
             self._cached_processes[pid] = process
+            self._prefetch_tasks(process)
+
+    def _prefetch_tasks(self, process: Process) -> None:
+        """
+        按预读策略, 用一次批量读取长期任务的数据.
+        """
+        if self._task_prefetch == self.TASK_PREFETCH_LAZY:
+            return
+        if self._task_prefetch == self.TASK_PREFETCH_ATTENTION:
+            # 和 CtxTool.context_attentions 的范围一致.
+            tasks = [
+                task for task in process.tasks
+                if task.tid == process.root or task.tid == process.current or task.status == TaskStatus.WAITING
+            ]
+        else:
+            tasks = process.tasks
+
+        prefetching = []
+        for task in tasks:
+            if task is None or task.instanced or not task.is_long_term:
+                continue
+            if task.tid in self._tasked_data or task.tid in prefetching:
+                continue
+            prefetching.append(task.tid)
+        if not prefetching:
+            return
+        data = self._session.get_many_task_data(*prefetching)
+        for tid in prefetching:
+            self._tasked_data[tid] = self._new_tasked(data.get(tid, None))
+
+    @classmethod
+    def _new_tasked(cls, data: Dict | None) -> Tasked | None:
+        return Tasked(**data) if data is not None else None
 
     def _get_stored_process(self, pid: str) -> Process | None:
         if pid not in self._stored_processes:
-            key = self._get_process_key(self._current_process_id)
+            key = self._get_process_key(pid)
             process_data = self._session.get(key)
-            if process_data is not None:
-                self._stored_processes[pid] = Process(**process_data)
-            else:
+            if process_data is None:
                 self._stored_processes[pid] = None
+            elif process_data.get("delta_saving", False):
+                self._stored_processes[pid] = self._load_delta_process(pid, process_data)
+            else:
+                self._stored_processes[pid] = self._load_process(process_data)
         return self._stored_processes[pid]
 
+    def _load_process(self, process_data: Dict) -> Process:
+        if self._process_trusted_loading:
+            return Process.load_trusted(process_data)
+        return Process(**process_data)
+
+    def _load_delta_process(self, pid: str, header: Dict) -> Process:
+        """
+        读取增量保存的 process. header 里只有 task 的顺序, task 的数据分别保存.
+        """
+        stored_tasks: Dict[str, Dict] = {}
+        tasks: List[Dict] = []
+        task_ids = header.get("task_ids", [])
+        # 一次读取所有的 task.
+        tasks_data = self._session.get_many(*[self._get_process_task_key(pid, tid) for tid in task_ids])
+        for tid in task_ids:
+            task_data = tasks_data.get(self._get_process_task_key(pid, tid), None)
+            # 丢失的 task 当作被遗忘了.
+            if task_data is None:
+                continue
+            stored_tasks[tid] = task_data
+            tasks.append(task_data)
+        self._stored_tasks_data[pid] = stored_tasks
+        process_data = {key: header[key] for key in header if key not in {"task_ids", "delta_saving"}}
+        process_data["tasks"] = tasks
+        return self._load_process(process_data)
+
     def _get_process_key(self, process_id: str) -> str:
         return f"process:{process_id}"
 
+    def _get_process_task_key(self, process_id: str, tid: str) -> str:
+        return f"process:{process_id}:task:{tid}"
+
     def remove_process(self, pid: str) -> None:
         """
         删除一个 process.
         """
         del self._cached_processes[pid]
         del self._stored_processes[pid]
-        key = self._get_process_key(self._current_process_id)
-        self._session.remove(key)
+        keys = [self._get_process_key(pid)]
+        stored_tasks = self._stored_tasks_data.pop(pid, None)
+        if stored_tasks:
+            for tid in stored_tasks:
+                keys.append(self._get_process_task_key(pid, tid))
+        self._session.remove(*keys)
 
     def fetch_task(self, tid: str) -> Optional[Task]:
         process = self.current_process()
@@ -110,23 +212,24 @@ class RuntimeImpl(Runtime):
 
         tid = ptr.tid
         if ptr.is_long_term:
-            data = self._session.get_task_data(tid)
-            if data is not None:
-                tasked = Tasked(**data)
-                ptr.merge_tasked(tasked)
+            if tid not in self._tasked_data:
+                self._tasked_data[tid] = self._new_tasked(self._session.get_task_data(tid))
+            tasked = self._tasked_data[tid]
+            if tasked is not None:
+                # rewind 之后可能再次实例化, 不能共享 vars.
+                ptr.merge_tasked(tasked.model_copy(deep=True))
                 ptr.instanced = True
         return ptr
 
     def lock_process(self, process_id: str | None = None) -> bool:
         if process_id is None:
             process_id = self._current_process_id
-        # 一个 runtime 只锁一次, 避免重复调用方法时死锁.
-        if process_id in self._locked:
-            return self._locked.get(process_id, False)
+        # 一个 runtime 只锁一次, 避免重复调用方法时死锁. 加锁失败的可以重试.
+        if self._locked.get(process_id, False):
+            return True
 
         lock_key = self._get_process_locker_key(process_id)
-        lock_overdue = self._process_lock_overdue
-        locked = self._session.lock(lock_key, lock_overdue)
+        locked = self._locker.lock(lock_key)
         self._locked[process_id] = locked
         return locked
 
@@ -146,7 +249,7 @@ class RuntimeImpl(Runtime):
 
         del self._locked[process_id]
         lock_key = self._get_process_locker_key(process_id)
-        return self._session.unlock(lock_key)
+        return self._locker.unlock(lock_key)
 
     @property
     def session_id(self) -> str:
@@ -164,6 +267,14 @@ class RuntimeImpl(Runtime):
             pid = self._current_process_id
         self._init_cached_process(pid)
 
+    def reload(self) -> None:
+        self._cached_tasks = {}
+        self._cached_processes = {}
+        self._stored_processes = {}
+        self._stored_tasks_data = {}
+        self._tasked_data = {}
+        self._init_process()
+
     def _save_all(self) -> None:
         if len(self._cached_processes) == 0:
             return
@@ -171,48 +282,16 @@ class RuntimeImpl(Runtime):
             process = self._cached_processes[pid]
             if process is None:
                 continue
+            # 加锁失败的 process 由锁的持有者保存, 否则会覆盖对方的结果.
+            if self._locked.get(pid, True) is False:
+                continue
             self._save_process(process)
 
-    def _gc_process(self, process: Process) -> List[Task]:
+    def _gc_process(self, process: Process) -> ProcessGCResult:
         """
-        垃圾回收.
-        需要反复进化的复杂逻辑.
+        垃圾回收, 并且按 process_max_tasks 淘汰最久没有使用的任务.
         """
-        gc: List[Task] = []
-        alive: List[Task] = []
-
-        root_id = process.root
-        awaiting_id = process.current
-        # callbacks = process.callbacks
-        max_task = self._process_max_tasks
-
-        # 检查基本状态.
-        count = 0
-        for ptr in process.tasks:
-            tid = ptr.tid
-            status = ptr.status
-            count += 1
-            # 必须要保存的状态.
-            if tid == root_id or tid == awaiting_id:
-                alive.append(ptr)
-            elif ptr.callbacks:
-                alive.append(ptr)
-            elif TaskStatus.is_sleeping(status):
-                alive.append(ptr)
-            # 可以被遗忘的状态.
-            elif TaskStatus.is_able_to_gc(status):
-                gc.append(ptr)
-            elif ptr.is_forgettable:
-                # 可以被遗忘的任务. 直接从栈里拿掉.
-                gc.append(ptr)
-            else:
-                # 正常的节点.
-                alive.append(ptr)
-
-        process.reset_tasks(alive)
-        # 重置 process.
-        # process.store_task(*reversed(alive))
-        return gc
+        return self._process_gc.collect(process)
 
     def _save_process(self, process: Process) -> None:
         # 无状态请求不需要保存状态.
@@ -223,25 +302,76 @@ class RuntimeImpl(Runtime):
         if process.quiting:
             self.remove_process(process.pid)
             return
-        gc_tasks = self._gc_process(process)
-        # todo: gc 的 tasks 要干什么?
+        gc_result = self._gc_process(process)
         saving: Dict[str, Tasked] = {}
         for task in process.tasks:
             # 拥有长期记忆的 task 要通过长期记忆来读取.
             if task.is_long_term and task.vars is not None:
+                # 通过 get_task 取出, 不能修改和快照共享的 task.
+                task = process.get_task(task.tid)
                 saving[task.tid] = task.to_tasked()
                 task.instanced = False
                 task.vars = None
 
+        # 被回收的长期任务归档到长期记忆, 之后仍然可以通过 tid 找回.
+        archived = 0
+        for task in gc_result.archiving:
+            if task.vars is None and not task.instanced:
+                # 没有实例化过, 长期记忆里的数据就是最新的.
+                continue
+            saving[task.tid] = task.to_tasked()
+            archived += 1
+        ProcessGC.counter.incr("archived", archived)
+
         # 删除 process 记忆. 保留长程任务.
         for key in saving:
             tasked = saving[key]
             self._session.set_task_data(tasked.tid, tasked.model_dump(), tasked.overdue)
 
+        if self._process_delta_saving:
+            self._save_process_delta(process)
+            return
         process_key = self._get_process_key(process.pid)
         process_data = self._dump_process(process)
         self._session.set(process_key, process_data)
 
+    def _save_process_delta(self, process: Process) -> None:
+        """
+        增量保存 process: header 只记录 task 的顺序, 只重写本轮变更过的 task.
+        没有可比对的存储数据, 或者 root 变更了 (比如 reset), 就完整重写.
+        """
+        pid = process.pid
+        stored_process = self._stored_processes.get(pid, None)
+        stored_tasks = self._stored_tasks_data.get(pid, None)
+        rewrite = stored_tasks is None or stored_process is None or stored_process.root != process.root
+        if stored_tasks is None:
+            stored_tasks = {}
+
+        saving_tasks: Dict[str, Dict] = {}
+        for task in process.tasks:
+            task_data = self._dump_task(task)
+            saving_tasks[task.tid] = task_data
+            if rewrite or stored_tasks.get(task.tid, None) != task_data:
+                self._session.set(self._get_process_task_key(pid, task.tid), task_data)
+
+        # 删除已经不在 process 里的 task.
+        removing = [self._get_process_task_key(pid, tid) for tid in stored_tasks if tid not in saving_tasks]
+        if removing:
+            self._session.remove(*removing)
+
+        header = process.model_dump(include={"pid", "sid", "root", "current", "round", "parent_id"})
+        header["task_ids"] = list(saving_tasks.keys())
+        header["delta_saving"] = True
+        self._session.set(self._get_process_key(pid), header)
+        self._stored_tasks_data[pid] = saving_tasks
+
+    @classmethod
+    def _dump_task(cls, task: Task) -> Dict:
+        """
+        用 json 模式 dump, 才能和存储读出来的数据做比对.
+        """
+        return task.model_dump(mode="json")
+
     def _dump_process(self, process: Process) -> Dict:
         """
         定义 process dump 逻辑, 可以在这里做适当的压缩.
@@ -252,16 +382,27 @@ class RuntimeImpl(Runtime):
         if self._finished:
             return
         self._save_all()
+        # 本轮所有的写操作一次性提交. 锁已经过期 (被别的 worker 拿走) 时拒绝提交.
+        self._locker.fence()
+        flushed = self._session.flush()
         self._finished = True
+        if not flushed:
+            held = self._locker.reject()
+            raise LockLostError(f"process locks {held} are lost, state changes of this round are dropped")
 
     def destroy(self) -> None:
         del self._session
         del self._cached_processes
         del self._cached_tasks
         del self._stored_processes
+        del self._stored_tasks_data
+        del self._tasked_data
         del self._session_id
         del self._current_process_id
         del self._locked
+        self._locker.release_all()
+        del self._locker
+        del self._process_gc
         del self._finished
 
     def __del__(self):
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Iterable
 
 from ghoshell.ghost import *
 from ghoshell.messages import *
@@ -25,6 +25,42 @@ class SendingImpl(Sender):
                 message.join(self._output_buffer.payload)
         return self
 
+    def stream_text(self, chunks: Iterable[str], markdown: bool = False) -> str:
+        """
+        每个增量以 TextDelta 立刻交给 shell, 结束后完整的文本以带 stream_id 的 Text 输出.
+        shell 不支持流式时, 只输出完整的文本.
+        生成过程中出现异常时, 发送一个 aborted 的结束增量让 shell 清理, 然后抛出异常.
+        """
+        stream_id = self.ctx.session.new_message_id()
+        parts = []
+        streaming = True
+        index = 0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                parts.append(chunk)
+                if streaming:
+                    delta = TextDelta(stream_id=stream_id, index=index, delta=chunk, markdown=markdown)
+                    streaming = self._stream(delta)
+                    index += 1
+        except Exception:
+            if index > 0 and streaming:
+                self._stream(TextDelta(stream_id=stream_id, index=index, markdown=markdown, done=True, aborted=True))
+            raise
+        content = "".join(parts)
+        if index > 0 and streaming:
+            self._stream(TextDelta(stream_id=stream_id, index=index, markdown=markdown, done=True))
+        if content:
+            self.output(Text(content=content, markdown=markdown, stream_id=stream_id if index > 0 else ""))
+        return content
+
+    def _stream(self, delta: TextDelta) -> bool:
+        mid = self.ctx.session.new_message_id()
+        _output = Output.new(mid, self.ctx.input, None, self.tid)
+        delta.join(_output.payload)
+        return self.ctx.stream_output(_output)
+
     def _deliver_sync_output(self) -> None:
         if self._output_buffer is None:
             return
@@ -45,8 +81,11 @@ class SendingImpl(Sender):
             tid: str | None = None,
     ) -> Sender:
         self_id = self.ctx.clone.clone_id
+        parent_process_id = ""
         if process_id is None:
+            # 新的子进程, 父进程是当前进程.
             process_id = self.ctx.session.new_process_id()
+            parent_process_id = self.ctx.runtime.current_process_id
         if tid is None:
             tid = ""
         if trace is None:
@@ -58,6 +97,7 @@ class SendingImpl(Sender):
                 shell_kind=inpt.trace.shell_kind,
                 session_id=inpt.trace.session_id,
                 process_id=process_id,
+                parent_process_id=parent_process_id,
                 subject_id=inpt.trace.subject_id,
             )
         else:
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-import json
 import uuid
 from typing import Dict, ClassVar
 
-from ghoshell.contracts import Cache
+from ghoshell.contracts import Cache, CachePipeline, StateCodec
+from ghoshell.framework.ghost.codec import JSONStateCodec
 from ghoshell.ghost import Session
+from ghoshell.utils.tracing import traced
 
 
 class SessionImpl(Session):
@@ -17,12 +18,19 @@ class SessionImpl(Session):
             clone_id: str,
             session_id: str,
             expire: int,
+            codec: StateCodec | None = None,
     ):
+        self._codec = codec if codec is not None else JSONStateCodec()
         self._clone_id = clone_id
         self._cache = cache
         self._session_id = session_id
         self._expire = expire
         self._clear: bool = False
+        # 写操作都先放进 pipeline, flush 时一次性提交.
+        self._pipeline: CachePipeline | None = None
+        # 尚未提交的 session 成员, 值为 None 表示已删除. 保证本轮能读到自己的写入.
+        self._pending_members: Dict[str, str | bytes | None] = {}
+        self._pending_tasks: Dict[str, str | bytes] = {}
 
     @property
     def clone_id(self) -> str:
@@ -36,82 +44,147 @@ class SessionImpl(Session):
         return uuid.uuid4().hex
 
     def current_process_id(self) -> str:
-        session_key = self._session_cache_key()
-        process_id = self._cache.get_member(session_key, self.current_process_id_key)
+        process_id = self._get_member(self.current_process_id_key)
         if process_id is None:
             process_id = self.new_process_id()
-            self._cache.set_member(session_key, self.current_process_id_key, process_id)
+            self._set_member(self.current_process_id_key, process_id)
         return process_id
 
     def new_message_id(self) -> str:
         return uuid.uuid4().hex
 
     def clear_all(self) -> None:
+        # 未提交的写操作一并丢弃.
+        self._pipeline = None
+        self._pending_members = {}
+        self._pending_tasks = {}
         session_key = self._session_cache_key()
         self._cache.remove(session_key)
         self._clear = True
 
     def set(self, key: str, value: Dict) -> bool:
-        cache_key = self._session_cache_key()
-        return self._cache.set_member(cache_key, key, json.dumps(value))
+        self._set_member(key, self._codec.encode(value))
+        return True
 
+    @traced("session")
     def get(self, key: str) -> Dict | None:
-        cache_key = self._session_cache_key()
-        value = self._cache.get_member(cache_key, key)
+        value = self._get_member(key)
         if value is None:
             return None
-        try:
-            loads = json.loads(value, object_hook=dict)
-            if isinstance(loads, Dict):
-                return loads
-        except AttributeError:
-            pass
-        return None
+        return self._codec.decode(value)
+
+    @traced("session")
+    def get_many(self, *keys: str) -> Dict[str, Dict | None]:
+        result: Dict[str, Dict | None] = {}
+        fetching = []
+        for key in keys:
+            if key in self._pending_members:
+                value = self._pending_members[key]
+                result[key] = None if value is None else self._codec.decode(value)
+            else:
+                fetching.append(key)
+        if fetching:
+            values = self._cache.get_members(self._session_cache_key(), *fetching)
+            for key in fetching:
+                value = values.get(key, None)
+                result[key] = None if value is None else self._codec.decode(value)
+        return result
 
     def remove(self, *key: str) -> None:
-        cache_key = self._session_cache_key()
-        self._cache.remove_member(cache_key, *key)
-
-    def lock(self, key: str, overdue: int = -1) -> bool:
+        for k in key:
+            self._pending_members[k] = None
+        self._get_pipeline().remove_member(self._session_cache_key(), *key)
+
+    def _get_member(self, key: str) -> str | bytes | None:
+        if key in self._pending_members:
+            return self._pending_members[key]
+        return self._cache.get_member(self._session_cache_key(), key)
+
+    def _set_member(self, key: str, value: str | bytes) -> None:
+        self._pending_members[key] = value
+        self._get_pipeline().set_member(self._session_cache_key(), key, value)
+
+    def _get_pipeline(self) -> CachePipeline:
+        if self._pipeline is None:
+            self._pipeline = self._cache.pipeline()
+        return self._pipeline
+
+    @traced("session")
+    def flush(self) -> bool:
+        if self._pipeline is None:
+            return True
+        pipeline = self._pipeline
+        self._pipeline = None
+        self._pending_members = {}
+        self._pending_tasks = {}
+        return pipeline.execute()
+
+    @traced("session")
+    def lock(self, key: str, overdue: int = -1) -> int:
         locker_key = self._session_locker_key(key)
         return self._cache.lock(locker_key, overdue)
 
+    @traced("session")
+    def renew_lock(self, key: str, token: int, overdue: int) -> bool:
+        locker_key = self._session_locker_key(key)
+        return self._cache.renew(locker_key, token, overdue)
+
+    def fence(self, key: str, token: int) -> None:
+        self._get_pipeline().fence(self._session_locker_key(key), token)
+
     def _session_locker_key(self, key: str) -> str:
         return f"ghoshell:session:{self._session_id}:locker:{key}"
 
-    def unlock(self, key: str) -> bool:
+    @traced("session")
+    def unlock(self, key: str, token: int = 0) -> bool:
         locker_key = self._session_locker_key(key)
-        return self._cache.unlock(locker_key)
+        return self._cache.unlock(locker_key, token)
 
     def _task_cache_key(self, tid: str):
         # 暂时定义为 session 级别的.
         return f"ghoshell:clone:{self._clone_id}:task:{tid}"
 
+    @traced("session")
     def get_task_data(self, tid: str) -> Dict | None:
-        key = self._task_cache_key(tid)
-        val = self._cache.get(key)
-        if val is not None:
-            try:
-                loads = json.loads(val)
-                return loads
-            except AttributeError:
-                return None
-        return None
+        val = self._pending_tasks.get(tid, None)
+        if val is None:
+            val = self._cache.get(self._task_cache_key(tid))
+        if val is None:
+            return None
+        return self._codec.decode(val)
+
+    @traced("session")
+    def get_many_task_data(self, *tids: str) -> Dict[str, Dict | None]:
+        result: Dict[str, Dict | None] = {}
+        fetching = [tid for tid in tids if tid not in self._pending_tasks]
+        values = self._cache.mget(*[self._task_cache_key(tid) for tid in fetching]) if fetching else []
+        fetched = dict(zip(fetching, values))
+        for tid in tids:
+            val = self._pending_tasks[tid] if tid in self._pending_tasks else fetched.get(tid, None)
+            result[tid] = None if val is None else self._codec.decode(val)
+        return result
 
     def set_task_data(self, tid: str, value: Dict, overdue: int) -> None:
         key = self._task_cache_key(tid)
-        val = json.dumps(value)
-        self._cache.set(key, val, overdue)
+        val = self._codec.encode(value)
+        self._pending_tasks[tid] = val
+        self._get_pipeline().set(key, val, overdue)
 
     def _session_cache_key(self) -> str:
         return f"ghost:clone:{self._clone_id}:session:{self._session_id}"
 
+    @traced("session")
     def destroy(self) -> None:
         if not self._clear:
             session_key = self._session_cache_key()
-            # 重置过期时间.
-            self._cache.expire(session_key, self._expire)
+            # 重置过期时间, 和剩余的写操作一起提交.
+            self._get_pipeline().expire(session_key, self._expire)
+        self.flush()
         # del
         del self._cache
+        del self._codec
+        del self._pipeline
+        del self._pending_members
+        del self._pending_tasks
         del self._session_id
         del self._clone_id
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, ClassVar, Dict
+
+from ghoshell.messages import Output
+from ghoshell.utils import StatsCounter
+
+STREAM_HANDLER = Callable[[Output], None]
+
+
+class OutputStreamer:
+    """
+    把 ghost 处理过程中产生的流式输出 (比如 TextDelta) 立刻交给 shell.
+    shell 按 shell_kind 注册回调, 没有注册的 shell 不会收到增量, 只收到最后完整的输出.
+    回调在 ghost 处理输入的线程里执行, 应该尽快返回.
+    """
+
+    counter: ClassVar[StatsCounter] = StatsCounter()
+
+    def __init__(self):
+        self._handlers: Dict[str, STREAM_HANDLER] = {}
+        self._lock = threading.Lock()
+
+    def register_shell(self, shell_kind: str, handler: STREAM_HANDLER) -> None:
+        with self._lock:
+            self._handlers[shell_kind] = handler
+
+    def unregister_shell(self, shell_kind: str) -> None:
+        with self._lock:
+            self._handlers.pop(shell_kind, None)
+
+    def is_streaming(self, shell_kind: str) -> bool:
+        return shell_kind in self._handlers
+
+    def stream(self, _output: Output) -> bool:
+        handler = self._handlers.get(_output.trace.shell_kind, None)
+        if handler is None:
+            self.counter.incr("unhandled")
+            return False
+        handler(_output)
+        self.counter.incr("streamed")
+        return True
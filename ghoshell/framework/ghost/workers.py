@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, ClassVar, Dict, List, Optional, Tuple
+
+from ghoshell.ghost import Ghost
+from ghoshell.messages import Input, Output
+from ghoshell.utils import StatsCounter
+
+# 在 worker 进程里构建并启动 ghost 的方法.
+# 使用 spawn 启动 worker 时, 必须是可以 pickle 的模块级函数 (或者它的 functools.partial).
+GhostFactory = Callable[[], Ghost]
+
+# 请求的序号从 1 开始. worker 构建好 ghost 之后发送 (_READY, (worker 的序号, 进程号), None).
+_READY = 0
+
+
+class HashRing:
+    """
+    一致性哈希. worker 重启或者数量变化时, 只有少量的 session 会换到别的 worker.
+    """
+
+    def __init__(self, nodes: List[int], replicas: int = 64):
+        self._points: List[int] = []
+        self._nodes: Dict[int, int] = {}
+        for node in nodes:
+            for i in range(replicas):
+                point = self._hash(f"{node}:{i}")
+                self._nodes[point] = node
+                self._points.append(point)
+        self._points.sort()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def get(self, key: str) -> int:
+        point = self._hash(key)
+        idx = bisect.bisect(self._points, point) % len(self._points)
+        return self._nodes[self._points[idx]]
+
+
+def _serve(factory: GhostFactory, worker: int, inbox, outbox, concurrency: int) -> None:
+    """
+    worker 进程的入口.
+    """
+    ghost = factory()
+    outbox.put((_READY, (worker, os.getpid()), None))
+    asyncio.run(_serve_async(ghost, inbox, outbox, concurrency))
+
+
+async def _serve_async(ghost: Ghost, inbox, outbox, concurrency: int) -> None:
+    loop = asyncio.get_running_loop()
+    # 同一个 worker 里同时处理的输入数量. 等待 LLM 的时候可以处理别的会话.
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def handle(request_id: int, data: Dict) -> None:
+        try:
+            outputs = await ghost.respond_async(Input(**data))
+            dumped = None if outputs is None else [o.model_dump() for o in outputs]
+            outbox.put((request_id, dumped, None))
+        except (Exception, SystemExit) as e:
+            # GhostKernel._fail 用 exit 结束进程. 在 worker 里只让这一个请求失败, 不影响其它会话的请求.
+            outbox.put((request_id, None, repr(e)))
+        finally:
+            semaphore.release()
+
+    while True:
+        item = await loop.run_in_executor(None, inbox.get)
+        if item is None:
+            break
+        await semaphore.acquire()
+        task = loop.create_task(handle(*item))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    if running:
+        await asyncio.gather(*running)
+
+
+class WorkerError(Exception):
+    """
+    worker 处理失败或者异常退出.
+    """
+    pass
+
+
+class GhostWorkerPool:
+    """
+    多进程的 ghost worker 池.
+
+    1. 每个 worker 是独立的进程, 启动时用 factory 构建自己的 ghost.
+    2. 输入按 trace.session_id 的一致性哈希路由到固定的 worker. 同一个会话的锁竞争都在 worker 内部,
+       配合 mailbox 可以排队, 进程内的 cache (比如 MockCache) 也能保持一致.
+    3. 输入和结果通过 multiprocessing.Queue 传递, 结果由后台线程分发到 Future.
+    4. worker 异常退出时自动重启, 它没有完成的请求以 WorkerError 失败.
+    5. 构建 ghost 时就退出的 worker 按指数退避重启, 连续失败超过上限后不再重启, 路由到它的请求直接失败.
+    """
+
+    # 检查 worker 是否存活的间隔, 单位是秒.
+    CHECK_INTERVAL: ClassVar[float] = 0.5
+    # 启动失败后第一次重启的等待时间, 单位是秒. 之后每次翻倍.
+    RESTART_BACKOFF: ClassVar[float] = 1
+    # 连续启动失败的次数上限.
+    MAX_BOOTSTRAP_FAILURES: ClassVar[int] = 5
+
+    # 进程级别的计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter("submitted", "done", "failed", "restarted", "bootstrap_failed")
+
+    def __init__(
+            self,
+            factory: GhostFactory,
+            workers: int = 0,
+            concurrency: int = 8,
+            replicas: int = 64,
+            start_method: str = "spawn",
+    ):
+        self._factory = factory
+        self._size = workers if workers > 0 else multiprocessing.cpu_count()
+        self._concurrency = concurrency
+        self._ring = HashRing(list(range(self._size)), replicas)
+        self._mp = multiprocessing.get_context(start_method)
+        self._outbox = self._mp.Queue()
+        self._inboxes: List = [None] * self._size
+        self._processes: List = [None] * self._size
+        # worker 是否已经构建好 ghost.
+        self._ready: List[bool] = [False] * self._size
+        # 连续启动失败的次数.
+        self._bootstrap_failures: List[int] = [0] * self._size
+        # 退出的 worker 计划重启的时间, 0 表示还没有发现退出.
+        self._restart_at: List[float] = [0] * self._size
+        # request_id => (worker, future)
+        self._pending: Dict[int, Tuple[int, Future]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._collector: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def start(self) -> "GhostWorkerPool":
+        self._running = True
+        for i in range(self._size):
+            self._start_worker(i)
+        self._collector = threading.Thread(target=self._collect, name="ghoshell-pool-collector", daemon=True)
+        self._collector.start()
+        return self
+
+    def _start_worker(self, i: int) -> None:
+        inbox = self._mp.Queue()
+        process = self._mp.Process(
+            target=_serve,
+            args=(self._factory, i, inbox, self._outbox, self._concurrency),
+            name=f"ghoshell-worker-{i}",
+            daemon=True,
+        )
+        process.start()
+        self._inboxes[i] = inbox
+        self._processes[i] = process
+        self._ready[i] = False
+        self._restart_at[i] = 0
+
+    def route(self, _input: Input) -> int:
+        key = _input.trace.session_id or _input.trace.process_id
+        return self._ring.get(key)
+
+    def submit(self, _input: Input) -> Future:
+        """
+        提交一个输入, 返回的 Future 结果是 List[Output] | None.
+        """
+        future = Future()
+        worker = self.route(_input)
+        with self._lock:
+            if self._is_abandoned(worker):
+                future.set_exception(WorkerError(f"worker {worker} failed to bootstrap"))
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = (worker, future)
+            inbox = self._inboxes[worker]
+        self.counter.incr("submitted")
+        inbox.put((request_id, _input.model_dump()))
+        return future
+
+    def respond(self, _input: Input, timeout: float | None = None) -> List[Output] | None:
+        return self.submit(_input).result(timeout)
+
+    async def respond_async(self, _input: Input) -> List[Output] | None:
+        return await asyncio.wrap_future(self.submit(_input))
+
+    def _collect(self) -> None:
+        checked_at = time.monotonic()
+        while self._running:
+            if time.monotonic() - checked_at > self.CHECK_INTERVAL:
+                self._check_workers()
+                checked_at = time.monotonic()
+            try:
+                request_id, outputs, err = self._outbox.get(timeout=self.CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if request_id == _READY:
+                worker, pid = outputs
+                with self._lock:
+                    # 忽略已经被重启替换掉的进程.
+                    if self._processes[worker].pid == pid:
+                        self._ready[worker] = True
+                        self._bootstrap_failures[worker] = 0
+                continue
+            with self._lock:
+                pending = self._pending.pop(request_id, None)
+            if pending is None:
+                continue
+            _, future = pending
+            if err is not None:
+                self.counter.incr("failed")
+                future.set_exception(WorkerError(err))
+            else:
+                self.counter.incr("done")
+                future.set_result(None if outputs is None else [Output(**o) for o in outputs])
+
+    def _check_workers(self) -> None:
+        """
+        重启已经退出的 worker. 没有构建好 ghost 就退出的 worker 按指数退避重启.
+        """
+        now = time.monotonic()
+        for i, process in enumerate(self._processes):
+            if not self._running or process is None or process.is_alive():
+                continue
+            restarted = False
+            with self._lock:
+                failed = [rid for rid, (worker, _) in self._pending.items() if worker == i]
+                futures = [self._pending.pop(rid)[1] for rid in failed]
+                if not self._restart_at[i]:
+                    # 刚发现退出.
+                    delay = 0
+                    if not self._ready[i]:
+                        self._bootstrap_failures[i] += 1
+                        self.counter.incr("bootstrap_failed")
+                        delay = self.RESTART_BACKOFF * 2 ** (self._bootstrap_failures[i] - 1)
+                    self._restart_at[i] = now + delay
+                if not self._is_abandoned(i) and now >= self._restart_at[i]:
+                    self._start_worker(i)
+                    restarted = True
+            # 等待重启期间提交的请求也直接失败.
+            for future in futures:
+                future.set_exception(WorkerError(f"worker {i} exited with code {process.exitcode}"))
+            self.counter.incr("failed", len(futures))
+            if restarted:
+                self.counter.incr("restarted")
+
+    def _is_abandoned(self, i: int) -> bool:
+        return self._bootstrap_failures[i] >= self.MAX_BOOTSTRAP_FAILURES
+
+    def stop(self, timeout: float = 5) -> None:
+        self._running = False
+        for inbox in self._inboxes:
+            if inbox is not None:
+                inbox.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout)
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending = {}
+        for _, future in pending:
+            future.set_exception(WorkerError("worker pool stopped"))
@@ -5,10 +5,17 @@ from ghoshell.framework.intentions.command_intention import CommandIntention, Co
 from ghoshell.framework.intentions.llm_tools_intention import LLMToolIntention, LLMToolsFocusConfig, \
     LLMToolsFocusDriver, LLMToolIntentionResult
 
+from ghoshell.framework.intentions.keyword_intention import KeywordIntention, KeywordIntentionConfig, \
+    KeywordIntentionResult, KeywordFocusDriver, KEYWORD_INTENTION_KIND
+
 __all__ = [
     # 命令相关.
     "Command", "CommandOutput", "CommandIntention", "CommandFocusDriver", "CommandIntentionKind",
 
     # tool
     "LLMToolIntention", "LLMToolsFocusConfig", "LLMToolsFocusDriver", "LLMToolIntentionResult",
+
+    # 关键词和正则
+    "KeywordIntention", "KeywordIntentionConfig", "KeywordIntentionResult", "KeywordFocusDriver",
+    "KEYWORD_INTENTION_KIND",
 ]
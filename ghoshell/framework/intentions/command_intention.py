@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from argparse import ArgumentParser
+import hashlib
+from argparse import ArgumentParser, ArgumentError
 from typing import Dict, List, Any, Optional, ClassVar
 
 from pydantic import BaseModel, Field
@@ -8,6 +9,7 @@ from pydantic import BaseModel, Field
 from ghoshell.ghost import Intention, Context, FocusDriver
 from ghoshell.ghost import Operator, CtxTool
 from ghoshell.messages import Text
+from ghoshell.utils import StatsCounter
 
 CommandIntentionKind = "command_line"
 
@@ -74,24 +76,144 @@ class CommandIntention(Intention):
         return None
 
 
+class _ParserExit(Exception):
+    """
+    argparse 想要退出时抛出, 携带提示信息.
+    """
+
+    def __init__(self, message: str, error: bool):
+        self.message = message
+        self.error = error
+        super().__init__(message)
+
+
 class _ArgumentParserWrapper(ArgumentParser):
     """
     对 argparse 库的兼容.
+    编译好的 parser 会被多个请求复用, 所以解析的状态不保存在实例上, 而是通过异常返回.
     """
-    error_occur: bool = False
-    message: str = ""
 
     def error(self, message: str) -> None:
-        self.error_occur = True
-        self.exit(message=message)
+        raise _ParserExit(message, True)
 
     def print_help(self, file=None):
-        self.message = self.format_help()
+        raise _ParserExit(self.format_help(), False)
 
     def exit(self, status=0, message=None):
-        if message:
-            self.message = message
-        pass
+        raise _ParserExit(message or "", status != 0)
+
+
+class CommandTrie:
+    """
+    命令名的前缀树.
+    """
+
+    _END: ClassVar[str] = ""
+
+    def __init__(self):
+        self._root: Dict[str, Dict] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, name: str, value: Any) -> None:
+        node = self._root
+        for char in name:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            self._size += 1
+        # 后插入的命令覆盖前面的.
+        node[self._END] = value
+
+    def get(self, name: str) -> Any | None:
+        node = self._root
+        for char in name:
+            node = node.get(char, None)
+            if node is None:
+                return None
+        return node.get(self._END, None)
+
+    def prefixed(self, prefix: str) -> List[str]:
+        """
+        所有以 prefix 开头的命令名, 按字典序排列.
+        """
+        node = self._root
+        for char in prefix:
+            node = node.get(char, None)
+            if node is None:
+                return []
+        result = []
+        stack = [(prefix, node)]
+        while stack:
+            name, node = stack.pop()
+            for char in sorted(node.keys(), reverse=True):
+                if char == self._END:
+                    result.append(name)
+                else:
+                    stack.append((name + char, node[char]))
+        return sorted(result)
+
+
+class CompiledCommand:
+    """
+    编译好的命令行 parser, 按命令配置的哈希缓存.
+    """
+
+    # 进程级别的缓存. 超过上限时整体清空.
+    __cache: ClassVar[Dict[str, "CompiledCommand"]] = {}
+    max_cache_size: ClassVar[int] = 4096
+
+    # 进程级别的计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter("compiled", "hit")
+
+    def __init__(self, config: Command):
+        parser = _ArgumentParserWrapper(
+            description=config.desc,
+            epilog=config.epilog,
+            add_help=True,
+            exit_on_error=False,
+        )
+        parser.prog = config.name
+
+        if config.arg is not None:
+            argument = config.arg
+            fn_args = CommandFocusDriver.parse_argument_args(argument, False)
+            fn_kwargs = CommandFocusDriver.parse_argument_kwargs(argument)
+            parser.add_argument(*fn_args, **fn_kwargs)
+        for option in config.opts:
+            fn_args = CommandFocusDriver.parse_argument_args(option, True)
+            fn_kwargs = CommandFocusDriver.parse_argument_kwargs(option)
+            parser.add_argument(*fn_args, **fn_kwargs)
+        self.parser = parser
+
+    @classmethod
+    def get(cls, config: Command) -> "CompiledCommand":
+        key = hashlib.md5(config.model_dump_json().encode()).hexdigest()
+        compiled = cls.__cache.get(key, None)
+        if compiled is not None:
+            cls.counter.incr("hit")
+            return compiled
+        if len(cls.__cache) >= cls.max_cache_size:
+            cls.__cache.clear()
+        compiled = cls(config)
+        cls.__cache[key] = compiled
+        cls.counter.incr("compiled")
+        return compiled
+
+    def parse(self, arguments: str) -> CommandOutput:
+        args = arguments.split()
+        try:
+            namespace, _ = self.parser.parse_known_args(args)
+        except _ParserExit as e:
+            return CommandOutput(error=e.error, message=e.message)
+        except ArgumentError as e:
+            return CommandOutput(error=True, message=str(e))
+        return CommandOutput(error=False, params=namespace.__dict__)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.__cache.clear()
 
 
 class HelpCommand(CommandIntention):
@@ -133,6 +255,9 @@ class CommandFocusDriver(FocusDriver):
                 HelpCommand()
             ]
         self.default_commands: List[CommandIntention] = default_commands
+        # 默认命令的前缀树, 以及默认命令 + 全局命令的前缀树. 注册全局命令时重建.
+        self._default_trie = self._build_trie(self.default_commands)
+        self._global_trie: CommandTrie | None = None
 
     def kind(self) -> str:
         return CommandIntentionKind
@@ -148,42 +273,41 @@ show current commands. use -h option on command to see details:
             body_lines.append(f"- {cls.prefix}{cmd.name}: {cmd.desc}")
         return "\n".join(body_lines)
 
+    @staticmethod
+    def _build_trie(commands) -> CommandTrie:
+        trie = CommandTrie()
+        for command in commands:
+            trie.insert(command.config.name, command)
+        return trie
+
     def match(self, ctx: Context, *metas: Intention) -> Optional[Intention]:
         text = ctx.read(Text)
         if text is None:
             return None
-        if len(text.content) == 0:
-            return None
-        command_lines = self.default_commands.copy()
-        for meta in metas:
-            if isinstance(meta, CommandIntention):
-                command_lines.append(meta)
-            else:
-                # 二次包装.
-                line = CommandIntention(**meta.model_dump())
-                command_lines.append(line)
-        return self.match_raw_text(text.content, *command_lines)
+        return self._match_text(text.content, metas, self._default_trie)
 
-    def match_raw_text(self, text: str, *metas: CommandIntention) -> Optional[CommandIntention]:
+    def match_raw_text(self, text: str, *metas: Intention) -> Optional[CommandIntention]:
         """
-        匹配单个命令.
+        匹配单个命令. 后面的命令覆盖前面的命令, 上下文的命令覆盖默认命令.
         """
-        prefix = text[0]
-        if prefix != self.prefix:
-            return None
-
-        commands = {}
-        for meta in metas:
-            if isinstance(meta, CommandIntention):
-                # 顺序优先, 后面的命令覆盖前面的命令.
-                commands[meta.config.name] = meta
+        return self._match_text(text, metas, self._default_trie)
 
+    def _match_text(self, text: str, metas, trie: CommandTrie) -> Optional[CommandIntention]:
+        # 大部分输入都不是命令, 在任何分配之前先排除掉.
+        if not text.startswith(self.prefix):
+            return None
         command_line = text[len(self.prefix):]
-        seps = command_line.split(' ', 2)
+        seps = command_line.split(' ', 1)
         command_name = seps[0]
-        if command_name not in commands:
+        if not command_name:
+            return None
+
+        matched_meta = self._find_meta(command_name, metas)
+        if matched_meta is None:
+            matched_meta = trie.get(command_name)
+        if matched_meta is None:
             return None
-        matched_meta = commands[command_name]
+
         arguments = "" if len(seps) < 2 else seps[1].strip()
         result = self._parse_command(matched_meta, arguments)
         if result is None:
@@ -192,37 +316,28 @@ show current commands. use -h option on command to see details:
         matched.params = result
         return matched
 
-    def _parse_command(self, command: CommandIntention, arguments: str) -> CommandOutput | None:
-        # todo
-        config = command.config
-        parser = _ArgumentParserWrapper(
-            description=config.desc,
-            epilog=config.epilog,
-            add_help=True,
-            exit_on_error=False,
-        )
-        parser.prog = command.config.name
-
-        if config.arg is not None:
-            argument = config.arg
-            fn_args = self.parse_argument_args(argument, False)
-            fn_kwargs = self.parse_argument_kwargs(argument)
-            parser.add_argument(*fn_args, **fn_kwargs)
-        for option in config.opts:
-            fn_args = self.parse_argument_args(option, True)
-            fn_kwargs = self.parse_argument_kwargs(option)
-            parser.add_argument(*fn_args, **fn_kwargs)
+    @staticmethod
+    def _find_meta(name: str, metas) -> Optional[CommandIntention]:
+        """
+        只有命中的 meta 才会包装成 CommandIntention.
+        """
+        for meta in reversed(metas):
+            if isinstance(meta, CommandIntention):
+                if meta.config.name == name:
+                    return meta
+            elif meta.kind == CommandIntentionKind and meta.config.get("name", "") == name:
+                # 二次包装.
+                return CommandIntention(**meta.model_dump())
+        return None
 
-        args = [i for i in filter(lambda i: i, arguments.split(' '))]
-        namespace, _ = parser.parse_known_args(args)
-        params = namespace.__dict__
+    def _parse_command(self, command: CommandIntention, arguments: str) -> CommandOutput | None:
+        return CompiledCommand.get(command.config).parse(arguments)
 
-        result = CommandOutput(
-            error=parser.error_occur,
-            message=parser.message,
-            params=params,
-        )
-        return result
+    def complete(self, prefix: str) -> List[str]:
+        """
+        补全默认命令和全局命令的名字.
+        """
+        return self._get_global_trie().prefixed(prefix)
 
     @classmethod
     def parse_argument_args(cls, arg: Argument, is_option: bool) -> List:
@@ -265,6 +380,17 @@ show current commands. use -h option on command to see details:
         for intention in intentions:
             if isinstance(intention, CommandIntention):
                 self.global_commands[intention.config.name] = intention
+        self._global_trie = None
+
+    def _get_global_trie(self) -> CommandTrie:
+        trie = self._global_trie
+        if trie is None:
+            trie = self._build_trie(self.default_commands + list(self.global_commands.values()))
+            self._global_trie = trie
+        return trie
 
     def wildcard_match(self, ctx: Context) -> Optional[Intention]:
-        return self.match(ctx, *self.global_commands.values())
+        text = ctx.read(Text)
+        if text is None:
+            return None
+        return self._match_text(text.content, (), self._get_global_trie())
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import deque
+from typing import ClassVar, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from ghoshell.ghost import Intention, Context, FocusDriver
+from ghoshell.messages import Text
+from ghoshell.utils import LRUCache, StatsCounter
+from ghoshell.utils.lru import MISSING
+
+KEYWORD_INTENTION_KIND = "keyword"
+
+
+class KeywordIntentionConfig(BaseModel):
+    """
+    关键词和正则意图的配置. 关键词不区分大小写.
+    """
+    keywords: List[str] = Field(default_factory=lambda: [])
+    regex: List[str] = Field(default_factory=lambda: [])
+
+
+class KeywordIntentionResult(BaseModel):
+    # 命中的关键词, 或者命中的正则.
+    matched: str
+    is_regex: bool = False
+    start: int = 0
+    end: int = 0
+    # 正则的命名分组.
+    groups: Dict[str, str] = {}
+
+
+class KeywordIntention(Intention):
+    """
+    输入包含某个关键词, 或者匹配某个正则时命中.
+    """
+    kind: str = KEYWORD_INTENTION_KIND
+    config: KeywordIntentionConfig
+    params: KeywordIntentionResult | None = None
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick 自动机. 构建后不可修改.
+    每个节点预先算好命中的最优关键词 (最长, 其次是最早加入的), 匹配的开销只和输入长度有关.
+    """
+
+    def __init__(self, words: List[Tuple[str, int]]):
+        """
+        :param words: (关键词, 序号). 序号越小越优先.
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # 每个节点命中的最优关键词: (长度, 序号), 没有则是 None.
+        self.best: List[Optional[Tuple[int, int]]] = [None]
+        self.size = len(words)
+        for word, seq in words:
+            self._insert(word, seq)
+        self._link()
+
+    def _insert(self, word: str, seq: int) -> None:
+        if not word:
+            return
+        node = 0
+        for char in word:
+            nxt = self.goto[node].get(char, None)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.best.append(None)
+                self.goto[node][char] = nxt
+            node = nxt
+        current = self.best[node]
+        if current is None or seq < current[1]:
+            self.best[node] = (len(word), seq)
+
+    def _link(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                fail = self.goto[state].get(char, 0)
+                self.fail[child] = fail
+                self.best[child] = _better(self.best[child], self.best[fail])
+
+    def search(self, text: str) -> Optional[Tuple[int, int, int]]:
+        """
+        返回最优的命中: (序号, 起点, 终点).
+        """
+        goto = self.goto
+        fail = self.fail
+        best = self.best
+        state = 0
+        found = None
+        end = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            candidate = best[state]
+            if candidate is not None and _better(found, candidate) is candidate:
+                found = candidate
+                end = i + 1
+        if found is None:
+            return None
+        length, seq = found
+        return seq, end - length, end
+
+
+def _better(a: Optional[Tuple[int, int]], b: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    更长的关键词更优先, 长度相同时序号小的优先.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if b[0] > a[0] or (b[0] == a[0] and b[1] < a[1]):
+        return b
+    return a
+
+
+class KeywordMatcher:
+    """
+    一组关键词意图编译出的匹配器.
+    1. 关键词编译成 Aho–Corasick 自动机. 新增的关键词进入一个小的增量自动机,
+       增量超过主自动机的 1/4 时才合并重建, 注册的开销和新增的数量成正比.
+    2. 所有正则合并成一个正则, 关键词没有命中时才匹配.
+    """
+
+    min_delta: ClassVar[int] = 64
+
+    def __init__(self, intentions: List[KeywordIntention] | None = None):
+        self.intentions: List[KeywordIntention] = []
+        # 关键词序号 => (意图序号, 关键词).
+        self.words: List[Tuple[int, str]] = []
+        self._main = AhoCorasick([])
+        self._delta = AhoCorasick([])
+        self._delta_start = 0
+        # 正则序号 => (意图序号, 正则).
+        self.patterns: List[Tuple[int, re.Pattern]] = []
+        self._regex: Optional[re.Pattern] = None
+        if intentions:
+            self.add(*intentions)
+
+    def add(self, *intentions: KeywordIntention) -> None:
+        patterns = len(self.patterns)
+        for intention in intentions:
+            index = len(self.intentions)
+            self.intentions.append(intention)
+            for keyword in intention.config.keywords:
+                keyword = keyword.lower()
+                if keyword:
+                    self.words.append((index, keyword))
+            for pattern in intention.config.regex:
+                self.patterns.append((index, re.compile(pattern, re.IGNORECASE)))
+
+        delta = len(self.words) - self._delta_start
+        if delta > max(self.min_delta, self._main.size // 4):
+            self._main = AhoCorasick(self._entries(0, len(self.words)))
+            self._delta_start = len(self.words)
+            self._delta = AhoCorasick([])
+        elif delta != self._delta.size:
+            self._delta = AhoCorasick(self._entries(self._delta_start, len(self.words)))
+        if len(self.patterns) != patterns:
+            self._regex = self._compile_regex()
+
+    def _entries(self, start: int, end: int) -> List[Tuple[str, int]]:
+        return [(self.words[seq][1], seq) for seq in range(start, end)]
+
+    def _compile_regex(self) -> Optional[re.Pattern]:
+        if not self.patterns:
+            return None
+        joined = "|".join(f"(?P<_r{i}>{p.pattern})" for i, (_, p) in enumerate(self.patterns))
+        try:
+            return re.compile(joined, re.IGNORECASE)
+        except re.error:
+            # 正则之间的命名分组冲突时, 逐个匹配.
+            return None
+
+    def match(self, text: str) -> Optional[KeywordIntention]:
+        matched = self.match_index(text)
+        if matched is None:
+            return None
+        index, result = matched
+        intention = self.intentions[index].model_copy()
+        intention.params = result
+        return intention
+
+    def match_index(self, text: str) -> Optional[Tuple[int, KeywordIntentionResult]]:
+        """
+        返回命中的意图序号和结果.
+        """
+        found = None
+        best = None
+        lowered = text.lower()
+        for automaton in (self._main, self._delta):
+            if automaton.size == 0:
+                continue
+            matched = automaton.search(lowered)
+            if matched is None:
+                continue
+            seq, start, end = matched
+            candidate = (end - start, seq)
+            if _better(best, candidate) is candidate:
+                best = candidate
+                found = matched
+        if found is not None:
+            seq, start, end = found
+            index, keyword = self.words[seq]
+            return index, KeywordIntentionResult(matched=keyword, start=start, end=end)
+        return self._match_regex(text)
+
+    def _match_regex(self, text: str) -> Optional[Tuple[int, KeywordIntentionResult]]:
+        if not self.patterns:
+            return None
+        if self._regex is not None:
+            matched = self._regex.search(text)
+            if matched is None:
+                return None
+            i = int(matched.lastgroup[2:])
+            index, pattern = self.patterns[i]
+            matched = pattern.match(text, matched.start())
+        else:
+            matched = None
+            for index, pattern in self.patterns:
+                matched = pattern.search(text)
+                if matched is not None:
+                    break
+        if matched is None:
+            return None
+        result = KeywordIntentionResult(
+            matched=pattern.pattern,
+            is_regex=True,
+            start=matched.start(),
+            end=matched.end(),
+            groups={k: v for k, v in matched.groupdict().items() if v is not None},
+        )
+        return index, result
+
+
+class KeywordFocusDriver(FocusDriver):
+    """
+    关键词和正则意图的驱动.
+    全局意图编译成一个匹配器, 注册新的全局意图时增量更新.
+    上下文的意图按关键词和正则缓存编译好的匹配器, 命中后返回传入的意图的副本.
+    """
+
+    counter: ClassVar[StatsCounter] = StatsCounter("compiled", "cache_hit")
+
+    def __init__(self, cache_size: int = 256):
+        self.global_matcher = KeywordMatcher()
+        self._matchers = LRUCache(cache_size)
+        self._lock = threading.Lock()
+
+    def kind(self) -> str:
+        return KEYWORD_INTENTION_KIND
+
+    def match(self, ctx: Context, *metas: Intention) -> Optional[Intention]:
+        text = ctx.read(Text)
+        if text is None or text.is_empty():
+            return None
+        return self.match_text(text.content, *metas)
+
+    def match_text(self, text: str, *metas: Intention) -> Optional[KeywordIntention]:
+        """
+        不依赖上下文的匹配.
+        """
+        wrapped = [self._wrap(meta) for meta in metas]
+        matched = self._get_matcher(wrapped).match_index(text)
+        if matched is None:
+            return None
+        index, result = matched
+        intention = wrapped[index].model_copy()
+        intention.params = result
+        return intention
+
+    def register_global_intentions(self, *intentions: Intention) -> None:
+        wrapped = [self._wrap(intention) for intention in intentions]
+        with self._lock:
+            self.global_matcher.add(*wrapped)
+
+    def wildcard_match(self, ctx: Context) -> Optional[Intention]:
+        if not self.global_matcher.intentions:
+            return None
+        text = ctx.read(Text)
+        if text is None or text.is_empty():
+            return None
+        return self.global_matcher.match(text.content)
+
+    @staticmethod
+    def _wrap(meta: Intention) -> KeywordIntention:
+        if isinstance(meta, KeywordIntention):
+            return meta
+        return KeywordIntention(**meta.model_dump())
+
+    def _get_matcher(self, intentions: List[KeywordIntention]) -> KeywordMatcher:
+        key = tuple((tuple(i.config.keywords), tuple(i.config.regex)) for i in intentions)
+        matcher = self._matchers.get(key)
+        if matcher is not MISSING:
+            self.counter.incr("cache_hit")
+            return matcher
+        matcher = KeywordMatcher(intentions)
+        self._matchers.set(key, matcher)
+        self.counter.incr("compiled")
+        return matcher
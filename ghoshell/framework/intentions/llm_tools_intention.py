@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import functools
+import hashlib
+import math
+import re
+from abc import ABCMeta, abstractmethod
+from typing import Callable, ClassVar, Dict, List, Optional, Set, Tuple
 
 from pydantic import BaseModel
 
-from ghoshell.ghost import Intention, Context, FocusDriver, CtxTool
-from ghoshell.llms import LLMTextCompletion
+from ghoshell.ghost import Intention, Context, FocusDriver, CtxTool, RuntimeTool
+from ghoshell.llms import LLMTextCompletion, LLMTextEmbedding
 from ghoshell.messages import Text
+from ghoshell.utils import LRUCache, StatsCounter
+from ghoshell.utils.lru import MISSING
 
 LLM_TOOL_INTENTION_KIND = "llm_tools"
 
@@ -67,78 +74,307 @@ class LLMToolsFocusConfig(BaseModel):
 
     invalid_mark: str = "no"
 
+    # 预筛选工具的方式: none, keyword, embedding.
+    # 只把和输入最相关的 top k 个工具放进 prompt.
+    prefilter: str = "none"
+    prefilter_top_k: int = 5
+    # 最相关的工具得分低于阈值时不请求大模型, 直接认为没有匹配.
+    prefilter_threshold: float = 0.0
+    # 预筛选使用的 embedding 配置.
+    embedding_config: str = ""
+
+    # 匹配结果的缓存, key 是 (规范化的输入, 工具集合的 hash, 当前 stage).
+    cache_size: int = 1024
+    # 秒. 小于等于 0 表示不过期.
+    cache_ttl: float = 600
+
+    # 并发匹配时等待大模型的最长时间, 单位是秒. 0 表示不限制.
+    timeout: float = 0
+
+
+def normalize_message(content: str) -> str:
+    return " ".join(content.lower().split())
+
+
+_WORD = re.compile(r"[a-z0-9_]+")
+_CJK = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def tokenize(content: str) -> Set[str]:
+    """
+    英文按单词, 中文按相邻两个字切分.
+    """
+    content = content.lower()
+    tokens = set(_WORD.findall(content))
+    for seg in _CJK.findall(content):
+        if len(seg) == 1:
+            tokens.add(seg)
+        for i in range(len(seg) - 1):
+            tokens.add(seg[i:i + 2])
+    return tokens
+
+
+class ToolPrefilter(metaclass=ABCMeta):
+    """
+    工具的预筛选. 给每个工具打分, 分数越高越相关.
+    """
+
+    @abstractmethod
+    def scores(self, content: str, tools: List[LLMToolIntention]) -> List[float]:
+        pass
+
+    def shortlist(
+            self,
+            content: str,
+            tools: List[LLMToolIntention],
+            top_k: int,
+            threshold: float,
+    ) -> List[LLMToolIntention]:
+        """
+        返回得分最高的 top_k 个工具, 保持原来的顺序. 最高分低于阈值时返回空.
+        """
+        scores = self.scores(content, tools)
+        if not scores or max(scores) < threshold:
+            return []
+        if len(tools) <= top_k:
+            return tools
+        ranked = sorted(range(len(tools)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [tools[i] for i in sorted(ranked)]
+
+
+class KeywordToolPrefilter(ToolPrefilter):
+    """
+    按输入和工具的 name, desc 的词重叠比例打分.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[Tuple[str, str], Set[str]] = {}
+
+    def scores(self, content: str, tools: List[LLMToolIntention]) -> List[float]:
+        words = tokenize(content)
+        result = []
+        for tool in tools:
+            key = (tool.config.name, tool.config.desc)
+            tokens = self._tokens.get(key, None)
+            if tokens is None:
+                tokens = tokenize(tool.config.name.replace("_", " ") + " " + tool.config.desc)
+                self._tokens[key] = tokens
+            if not words or not tokens:
+                result.append(0.0)
+                continue
+            result.append(len(words & tokens) / len(words))
+        return result
+
+
+class EmbeddingToolPrefilter(ToolPrefilter):
+    """
+    按输入和工具描述的 embedding 余弦相似度打分. 工具的向量只计算一次.
+    """
+
+    def __init__(self, embedder: LLMTextEmbedding, config_name: str = ""):
+        self.embedder = embedder
+        self.config_name = config_name
+        self._vectors: Dict[str, List[float]] = {}
+
+    def scores(self, content: str, tools: List[LLMToolIntention]) -> List[float]:
+        texts = [f"{tool.config.name}: {tool.config.desc}" for tool in tools]
+        missing = list(dict.fromkeys(text for text in texts if text not in self._vectors))
+        if missing:
+            embedded = self.embedder.text_embeddings(missing, self.config_name)
+            for text, vector in zip(missing, embedded):
+                self._vectors[text] = _unit(vector)
+        query = _unit(self.embedder.text_embedding(content, self.config_name))
+        return [sum(a * b for a, b in zip(query, self._vectors[text])) for text in texts]
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        return list(vector)
+    return [v / norm for v in vector]
+
 
 class LLMToolsFocusDriver(FocusDriver):
+    """
+    用大模型判断输入是否对应某个工具.
+    1. 可选的预筛选只把最相关的几个工具放进 prompt, 得分过低时不请求大模型.
+    2. 匹配结果按 (输入, 工具集合, stage) 缓存, 没有命中的结果也会缓存.
+    """
+
+    counter: ClassVar[StatsCounter] = StatsCounter("match", "cache_hit", "prefilter_skip", "completion")
 
-    def __init__(self, config: LLMToolsFocusConfig, prompter: LLMTextCompletion):
+    def __init__(
+            self,
+            config: LLMToolsFocusConfig,
+            prompter: LLMTextCompletion,
+            embedder: LLMTextEmbedding | None = None,
+    ):
         self.global_tools: List[LLMToolIntention] = []
         self.prompter = prompter
         self.config = config
+        self.prefilter = self._new_prefilter(config, embedder)
+        self.cache = LRUCache(config.cache_size, config.cache_ttl)
+
+    @staticmethod
+    def _new_prefilter(config: LLMToolsFocusConfig, embedder: LLMTextEmbedding | None) -> Optional[ToolPrefilter]:
+        if config.prefilter == "keyword":
+            return KeywordToolPrefilter()
+        if config.prefilter == "embedding":
+            if embedder is None:
+                raise ValueError("embedding prefilter of llm tools driver requires LLMTextEmbedding")
+            return EmbeddingToolPrefilter(embedder, config.embedding_config)
+        return None
 
     def kind(self) -> str:
         return LLM_TOOL_INTENTION_KIND
 
+    def cost(self) -> int:
+        return 100
+
+    def timeout(self) -> float:
+        return self.config.timeout
+
     def match(self, ctx: Context, *metas: Intention) -> Optional[LLMToolIntention]:
-        wrapped = [LLMToolIntention(**meta.model_dump()) for meta in metas]
+        wrapped = [self._wrap(meta) for meta in metas]
+        return self._match_ctx(ctx, wrapped)
+
+    def prepare_match(self, ctx: Context, *metas: Intention) -> Optional[Callable[[], Optional[Intention]]]:
+        return self._prepare(ctx, [self._wrap(meta) for meta in metas])
+
+    def prepare_wildcard_match(self, ctx: Context) -> Optional[Callable[[], Optional[Intention]]]:
+        return self._prepare(ctx, self.global_tools)
+
+    def _prepare(self, ctx: Context, tools: List[LLMToolIntention]) -> Optional[Callable[[], Optional[Intention]]]:
+        read = self._read_ctx(ctx) if tools else None
+        if read is None:
+            return None
+        content, stage_key = read
+        # 返回的方法在线程池里运行, stage 的描述只能在这里读取.
+        desc = CtxTool.current_think_stage(ctx).desc()
+        return functools.partial(self.match_tools, content, stage_key, lambda: desc, *tools)
+
+    def _match_ctx(self, ctx: Context, tools: List[LLMToolIntention]) -> Optional[LLMToolIntention]:
+        read = self._read_ctx(ctx)
+        if read is None:
+            return None
+        content, stage_key = read
+        return self.match_tools(
+            content,
+            stage_key,
+            lambda: CtxTool.current_think_stage(ctx).desc(),
+            *tools,
+        )
+
+    @staticmethod
+    def _read_ctx(ctx: Context) -> Optional[Tuple[str, str]]:
+        """
+        返回输入的文本和当前 stage 的 key.
+        """
         text = Text.read(ctx.input.payload)
         if text is None:
             return None
         if text.is_empty():
             return None
-        return self._match_content(ctx, text.content, *wrapped)
-
-    def _match_content(self, ctx: Context, content: str, *metas: LLMToolIntention) -> Optional[LLMToolIntention]:
-        tool_list = []
-        tool_map = {}
-        tools = []
-        for meta in metas:
-            for name in meta.config:
-                if name in tool_map:
-                    # 不重复
-                    continue
-                tool_list.append(name)
-                tool_map[name] = meta
-                tool_desc = self.config.tool_temp.format(name=name, desc=meta.config.desc)
-                # 添加所有的 tools
-                tools.append(tool_desc)
-
-        tools_str = "\n".join(tools)
-        stage = CtxTool.current_think_stage(ctx)
-        context_str = stage.desc()
+        task = RuntimeTool.fetch_current_task(ctx)
+        return text.content, f"{task.url.think}::{task.url.stage}"
+
+    def match_tools(
+            self,
+            content: str,
+            stage_key: str,
+            context: Callable[[], str],
+            *tools: LLMToolIntention,
+    ) -> Optional[LLMToolIntention]:
+        """
+        不依赖上下文的匹配. context 只在需要请求大模型时调用.
+        缓存按预筛选之前的完整工具集合查找, 命中时不再预筛选 (embedding 预筛选本身也要请求模型).
+        """
+        self.counter.incr("match")
+        tools = self._unique(tools)
+        if not tools:
+            return None
+        tool_map = {tool.config.name: tool for tool in tools}
+        key = (normalize_message(content), self._tools_hash(tools), stage_key)
+        result = self.cache.get(key)
+        if result is not MISSING:
+            self.counter.incr("cache_hit")
+        else:
+            result = self._prefilter_complete(content, context, tools)
+            self.cache.set(key, result)
+        if result is None or result.name not in tool_map:
+            return None
+        matched = tool_map[result.name].model_copy()
+        matched.params = result.model_copy()
+        return matched
+
+    def _prefilter_complete(
+            self,
+            content: str,
+            context: Callable[[], str],
+            tools: List[LLMToolIntention],
+    ) -> Optional[LLMToolIntentionResult]:
+        if self.prefilter is not None:
+            tools = self.prefilter.shortlist(
+                content,
+                tools,
+                self.config.prefilter_top_k,
+                self.config.prefilter_threshold,
+            )
+        if not tools:
+            self.counter.incr("prefilter_skip")
+            return None
+        return self._complete(content, context(), tools)
+
+    def _complete(self, content: str, context: str, tools: List[LLMToolIntention]) -> Optional[LLMToolIntentionResult]:
+        tools_str = "\n".join(
+            self.config.tool_temp.format(name=tool.config.name, desc=tool.config.desc) for tool in tools
+        )
         prompt = self.config.instruction.format(
-            context=context_str,
+            context=context,
             tools=tools_str,
             message=content,
             invalid=self.config.invalid_mark,
         )
-
-        prompter = ctx.container.force_fetch(LLMTextCompletion)
-        resp = prompter.text_completion(prompt)
+        self.counter.incr("completion")
+        resp = self.prompter.text_completion(prompt).strip()
         # 没有任何匹配.
-        if resp == self.config.invalid_mark:
+        if not resp or resp == self.config.invalid_mark:
             return None
 
-        index = resp.strip().find(':')
+        index = resp.find(':')
         if index > 0:
             name = resp[:index].strip()
             desc = resp[index + 1:].strip()
         else:
             name = resp
             desc = ""
-
-        if name not in tool_map:
-            return None
-
-        matched = tool_map[name]
-        matched.params = LLMToolIntention.Result(name=name, context=desc)
-        return matched
+        return LLMToolIntentionResult(name=name, context=desc)
+
+    @staticmethod
+    def _wrap(meta: Intention) -> LLMToolIntention:
+        if isinstance(meta, LLMToolIntention):
+            return meta
+        return LLMToolIntention(**meta.model_dump())
+
+    @staticmethod
+    def _unique(tools: Tuple[LLMToolIntention, ...]) -> List[LLMToolIntention]:
+        # 同名的工具只保留第一个.
+        result = {}
+        for tool in tools:
+            if tool.config.name not in result:
+                result[tool.config.name] = tool
+        return list(result.values())
+
+    @staticmethod
+    def _tools_hash(tools: List[LLMToolIntention]) -> str:
+        lines = "\n".join(f"{tool.config.name}\t{tool.config.desc}" for tool in tools)
+        return hashlib.md5(lines.encode()).hexdigest()
 
     def register_global_intentions(self, *intentions: Intention) -> None:
         for i in intentions:
-            wrapped = LLMToolIntention(**i.model_dump())
-            self.global_tools.append(wrapped)
+            self.global_tools.append(self._wrap(i))
 
     def wildcard_match(self, ctx: Context) -> Optional[Intention]:
         if len(self.global_tools) > 0:
-            return self.match(ctx, *self.global_tools)
+            return self._match_ctx(ctx, self.global_tools)
         return None
@@ -1,24 +1,278 @@
-from typing import List
+from __future__ import annotations
 
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, ClassVar
+
+import numpy as np
 from pydantic import BaseModel
 
-from ghoshell.ghost import Intention
+from ghoshell.ghost import Intention, Context, FocusDriver
+from ghoshell.llms import LLMTextEmbedding
+from ghoshell.messages import Text
+
+TEXT_CLASSIFIER_KIND = "text_classifier"
+
+
+class TextClassifierConfig(BaseModel):
+    description: str = ""
+    examples: List[str] = []
+    # 输入和任意一个 example 的余弦相似度达到阈值才算命中. 为 None 时使用 driver 的默认值.
+    threshold: float | None = None
+
+
+class TextClassifierResult(BaseModel):
+    prop: float
+    # 最相似的 example.
+    example: str = ""
 
 
 class TextClassifier(Intention):
     """
     文本分类.
     """
-    kind = "text_classifier"
+    kind: str = TEXT_CLASSIFIER_KIND
+
+    config: TextClassifierConfig
+    params: TextClassifierResult | None = None
+
+
+class EmbeddingCache:
+    """
+    example 的 embedding 缓存, 按 (embedding 配置, 文本) 保存.
+    指定文件时持久化成 npz, 重启后不需要重新请求 embedding.
+    """
+
+    def __init__(self, filename: str = ""):
+        self._filename = filename
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        if filename and os.path.exists(filename):
+            self._load()
+
+    @staticmethod
+    def _key(config_name: str, text: str) -> str:
+        return f"{config_name}\n{text}"
+
+    def _load(self) -> None:
+        with np.load(self._filename, allow_pickle=False) as data:
+            for key, vector in zip(data["keys"], data["vectors"]):
+                self._vectors[str(key)] = vector
+
+    def get_many(self, config_name: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        result = {}
+        for text in texts:
+            vector = self._vectors.get(self._key(config_name, text), None)
+            if vector is not None:
+                result[text] = vector
+        return result
+
+    def set_many(self, config_name: str, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for text, vector in vectors.items():
+                self._vectors[self._key(config_name, text)] = vector
+            self._save()
+
+    def _save(self) -> None:
+        if not self._filename or not self._vectors:
+            return
+        dirname = os.path.dirname(self._filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        keys = list(self._vectors.keys())
+        # 先写临时文件再替换, 避免写到一半的文件被读取.
+        tmp = self._filename + ".tmp.npz"
+        np.savez(tmp, keys=np.array(keys), vectors=np.stack([self._vectors[k] for k in keys]))
+        os.replace(tmp, self._filename)
+
+
+class ExampleIndex:
+    """
+    一组分类意图的 example 向量. 所有 example 归一化后存成连续的 float32 矩阵,
+    一次矩阵乘法得到输入和所有 example 的余弦相似度.
+    """
+
+    def __init__(self, classifiers: List[TextClassifier], vectors: Dict[str, np.ndarray], threshold: float):
+        rows = []
+        owners = []
+        thresholds = []
+        examples = []
+        for i, classifier in enumerate(classifiers):
+            limit = classifier.config.threshold if classifier.config.threshold is not None else threshold
+            for example in classifier.config.examples:
+                rows.append(vectors[example])
+                owners.append(i)
+                thresholds.append(limit)
+                examples.append(example)
+        self.classifiers = classifiers
+        self.examples = examples
+        self.owners = np.array(owners, dtype=np.int32)
+        self.thresholds = np.array(thresholds, dtype=np.float32)
+        if rows:
+            self.matrix = normalize(np.stack(rows))
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def match(self, vector: np.ndarray) -> Optional[Tuple[TextClassifier, float, str]]:
+        """
+        返回相似度最高, 且超过自身阈值的分类.
+        """
+        if len(self.examples) == 0:
+            return None
+        scores = self.matrix @ vector
+        passed = scores >= self.thresholds
+        if not passed.any():
+            return None
+        idx = int(np.argmax(np.where(passed, scores, -np.inf)))
+        return self.classifiers[self.owners[idx]], float(scores[idx]), self.examples[idx]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class TextClassifierFocusDriver(FocusDriver):
+    """
+    基于 embedding 相似度的文本分类.
+    example 只在第一次出现时请求 embedding, 之后每个输入只需要一次 embedding 和一次矩阵乘法.
+    """
+
+    # 缓存的 index 和输入向量的数量上限.
+    max_indexes: ClassVar[int] = 128
+    max_queries: ClassVar[int] = 1024
+
+    def __init__(
+            self,
+            embedder: LLMTextEmbedding,
+            threshold: float = 0.85,
+            config_name: str = "",
+            cache: EmbeddingCache | None = None,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.config_name = config_name
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.global_classifiers: List[TextClassifier] = []
+        self._global_index: ExampleIndex | None = None
+        self._indexes: OrderedDict[Tuple, ExampleIndex] = OrderedDict()
+        self._queries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def kind(self) -> str:
+        return TEXT_CLASSIFIER_KIND
+
+    def cost(self) -> int:
+        # 新的输入需要请求一次 embedding.
+        return 10
+
+    def match(self, ctx: Context, *metas: Intention) -> Optional[Intention]:
+        task = self.prepare_match(ctx, *metas)
+        return task() if task is not None else None
+
+    def prepare_match(self, ctx: Context, *metas: Intention) -> Optional[Callable[[], Optional[Intention]]]:
+        text = ctx.read(Text)
+        if text is None or not text.content:
+            return None
+        classifiers = [self._wrap(meta) for meta in metas]
+        content = text.content
+        return lambda: self._match_text(content, self._get_index(classifiers))
+
+    def classify(self, text: str, *classifiers: TextClassifier) -> Optional[TextClassifier]:
+        """
+        不依赖上下文的分类.
+        """
+        if not text:
+            return None
+        return self._match_text(text, self._get_index(list(classifiers)))
+
+    def register_global_intentions(self, *intentions: Intention) -> None:
+        for intention in intentions:
+            self.global_classifiers.append(self._wrap(intention))
+        self._global_index = None
+
+    def wildcard_match(self, ctx: Context) -> Optional[Intention]:
+        task = self.prepare_wildcard_match(ctx)
+        return task() if task is not None else None
+
+    def prepare_wildcard_match(self, ctx: Context) -> Optional[Callable[[], Optional[Intention]]]:
+        if not self.global_classifiers:
+            return None
+        text = ctx.read(Text)
+        if text is None or not text.content:
+            return None
+        content = text.content
+        return lambda: self._match_text(content, self._get_global_index())
+
+    def _get_global_index(self) -> ExampleIndex:
+        index = self._global_index
+        if index is None:
+            index = self._build_index(self.global_classifiers)
+            self._global_index = index
+        return index
+
+    @staticmethod
+    def _wrap(meta: Intention) -> TextClassifier:
+        if isinstance(meta, TextClassifier):
+            return meta
+        return TextClassifier(**meta.model_dump())
+
+    def _match_text(self, text: str, index: ExampleIndex) -> Optional[TextClassifier]:
+        if len(index.examples) == 0:
+            return None
+        matched = index.match(self._embed_query(text))
+        if matched is None:
+            return None
+        classifier, score, example = matched
+        result = classifier.model_copy()
+        result.params = TextClassifierResult(prop=score, example=example)
+        return result
+
+    def _get_index(self, classifiers: List[TextClassifier]) -> ExampleIndex:
+        key = tuple(
+            (c.config.description, tuple(c.config.examples), c.config.threshold) for c in classifiers
+        )
+        with self._lock:
+            index = self._indexes.get(key, None)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = self._build_index(classifiers)
+        with self._lock:
+            self._indexes[key] = index
+            if len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return index
 
-    # TODO[pydantic]: The `Config` class inherits from another class, please create the `model_config` manually.
-    # Check https://docs.pydantic.dev/dev-v2/migration/#changes-to-config for more information.
-    class Config(BaseModel):
-        description: str = ""
-        examples: List[str] = []
+    def _build_index(self, classifiers: List[TextClassifier]) -> ExampleIndex:
+        examples = []
+        for classifier in classifiers:
+            examples.extend(classifier.config.examples)
+        vectors = self._embed_examples(list(dict.fromkeys(examples)))
+        return ExampleIndex(classifiers, vectors, self.threshold)
 
-    class Result(BaseModel):
-        prop: float
+    def _embed_examples(self, examples: List[str]) -> Dict[str, np.ndarray]:
+        vectors = self.cache.get_many(self.config_name, examples)
+        missing = [example for example in examples if example not in vectors]
+        if missing:
+            embedded = self.embedder.text_embeddings(missing, self.config_name)
+            fetched = dict(zip(missing, normalize(np.array(embedded))))
+            self.cache.set_many(self.config_name, fetched)
+            vectors.update(fetched)
+        return vectors
 
-    config: Config
-    params: Result | None = None
+    def _embed_query(self, text: str) -> np.ndarray:
+        with self._lock:
+            vector = self._queries.get(text, None)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                return vector
+        vector = normalize(np.array(self.embedder.text_embedding(text, self.config_name)))
+        with self._lock:
+            self._queries[text] = vector
+            if len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return vector
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 from abc import ABCMeta, abstractmethod
 from typing import Optional, Callable, List, Any, ClassVar
 
 from ghoshell.container import Container, Provider
-from ghoshell.messages import Input, Batch
+from ghoshell.messages import Input, Output, Batch
 from ghoshell.shell import Shell
-from ghoshell.utils import create_pipeline
+from ghoshell.utils import create_pipeline, to_thread, timed_pipe, PIPE_TIMER
 
 # input 处理管道
 InputPipeline = Callable[
@@ -87,6 +88,11 @@ class ShellKernel(Shell, metaclass=ABCMeta):
         self._container.set(Shell, self)
         self._config_path = config_path
         self._runtime_path = runtime_path
+        # 编译好的输入输出管道, 启动时构建, 之后每个事件复用.
+        self._input_pipes: List[InputPipe] | None = None
+        self._input_pipeline: InputPipeline | None = None
+        self._output_pipeline: OutputPipeline | None = None
+        self._pipe_timer: PIPE_TIMER | None = None
 
     @property
     def kind(self) -> str:
@@ -141,8 +147,53 @@ class ShellKernel(Shell, metaclass=ABCMeta):
 
         for bootstrapper in self.get_bootstrapper():
             bootstrapper.bootstrap(self)
+        self.compile_pipelines()
         return self
 
+    # ----- pipelines ----- #
+
+    def compile_pipelines(self) -> None:
+        """
+        编译输入和输出的中间件管道.
+        """
+        timer = self._pipe_timer
+        input_pipes: List[InputPipe] = []
+        for mdw in self.get_input_mdw():
+            pipe = mdw.new_pipe(self)
+            if timer is not None:
+                pipe = timed_pipe(mdw.name(), pipe, timer)
+            input_pipes.append(pipe)
+
+        output_pipes: List[OutputPipe] = []
+        for mdw in self.get_output_mdw():
+            pipe = mdw.new_pipe(self)
+            if timer is not None:
+                pipe = timed_pipe(mdw.name(), pipe, timer)
+            output_pipes.append(pipe)
+
+        self._input_pipes = input_pipes
+        self._input_pipeline = create_pipeline(input_pipes, self._input_destination)
+        self._output_pipeline = create_pipeline(output_pipes, self._output_destination)
+
+    def invalidate_pipelines(self) -> None:
+        """
+        清空编译好的管道, 下一个事件会重新编译. 中间件变更后调用.
+        """
+        self._input_pipes = None
+        self._input_pipeline = None
+        self._output_pipeline = None
+
+    def set_pipe_timer(self, timer: PIPE_TIMER | None) -> None:
+        """
+        设置每个中间件的计时回调, 参数是中间件的名字和它自身的耗时. 传入 None 关闭计时.
+        """
+        self._pipe_timer = timer
+        self.invalidate_pipelines()
+
+    def _ensure_pipelines(self) -> None:
+        if self._input_pipeline is None or self._output_pipeline is None:
+            self.compile_pipelines()
+
     # ----- async methods ----- #
 
     def handle_input(self, _input: Input) -> Batch:
@@ -150,12 +201,11 @@ class ShellKernel(Shell, metaclass=ABCMeta):
         用管道的方式来处理 input
         todo: try catch
         """
-        try:
-            pipes: List[InputPipe] = []
-            for mdw in self.get_input_mdw():
-                pipes.append(mdw.new_pipe(self))
+        self._ensure_pipelines()
+        return self._run_input_pipeline(_input, self._input_pipeline)
 
-            pipeline = create_pipeline(pipes, self._input_destination)
+    def _run_input_pipeline(self, _input: Input, pipeline: InputPipeline) -> Batch:
+        try:
             batch = pipeline(_input)
             # 解决入参的 shell_env 封装问题.
             return batch
@@ -165,6 +215,10 @@ class ShellKernel(Shell, metaclass=ABCMeta):
 
     def _input_destination(self, _input: Input) -> Batch:
         outputs = self.deliver(_input)
+        return self._new_batch(_input, outputs)
+
+    @staticmethod
+    def _new_batch(_input: Input, outputs: List[Output] | None) -> Batch:
         batch = Batch(input=_input.model_dump())
         if outputs is not None:
             batch.outputs = outputs
@@ -175,13 +229,8 @@ class ShellKernel(Shell, metaclass=ABCMeta):
         用管道的形式处理输出
         """
         try:
-            pipes: List[OutputPipe] = []
-            for mdw in self.get_output_mdw():
-                pipes.append(mdw.new_pipe(self))
-
-            pipeline = create_pipeline(pipes, self._output_destination)
-
-            final_batch = pipeline(batch)
+            self._ensure_pipelines()
+            final_batch = self._output_pipeline(batch)
             for _output in final_batch.outputs:
                 self.output(_output, final_batch.input)
         # todo: exception handler
@@ -208,6 +257,35 @@ class ShellKernel(Shell, metaclass=ABCMeta):
             # todo: 异常处理
             pass
 
+    async def deliver_async(self, _input: Input) -> List[Output] | None:
+        """
+        deliver 的异步版本. 默认在线程池里调用 deliver.
+        """
+        return await to_thread(self.deliver, _input)
+
+    async def handle_async(self, e: Any) -> None:
+        """
+        handle 的异步版本, 不会阻塞 event loop.
+        输入中间件是同步的, 放到线程里运行, 只有 deliver_async 回到 event loop 里执行.
+        输出在 event loop 里处理.
+        输入管道在 deliver_async 返回之前一直占用线程, 而 deliver_async 还需要有界的线程池,
+        所以和 adapt_sync_pipe 一样不使用有界的线程池, 避免并发时互相等待.
+        """
+        _input = self.parse_event(e)
+        if _input is None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def destination(inpt: Input) -> Batch:
+            outputs = asyncio.run_coroutine_threadsafe(self.deliver_async(inpt), loop).result()
+            return self._new_batch(inpt, outputs)
+
+        self._ensure_pipelines()
+        # 终点依赖当前的 event loop, 只复用编译好的 pipes.
+        pipeline = create_pipeline(self._input_pipes, destination)
+        batch = await asyncio.to_thread(self._run_input_pipeline, _input, pipeline)
+        self.handle_outputs(batch)
+
     @property
     def config_path(self) -> str:
         return self._config_path
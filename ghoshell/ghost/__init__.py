@@ -9,7 +9,7 @@ from ghoshell.ghost.mindset import Mindset, Mind
 from ghoshell.ghost.mindset import OnFailing, OnCanceling, OnQuiting
 from ghoshell.ghost.mindset import Stage, Reaction
 from ghoshell.ghost.mindset import Think, Thought, ThinkDriver, DictThought
-from ghoshell.ghost.mindset.operator import Operator, OperationKernel
+from ghoshell.ghost.mindset.operator import Operator, OperationKernel, ChainOperator
 from ghoshell.ghost.runtime import Runtime, Task, Process, TaskLevel, TaskStatus
 from ghoshell.ghost.sending import Sender
 from ghoshell.ghost.session import Session
@@ -32,13 +32,13 @@ __all__ = [
     "Stage", "Reaction",
     "Thought", "DictThought",
     # operator
-    "Operator", "OperationKernel",
+    "Operator", "OperationKernel", "ChainOperator",
     # runtime
     "Runtime", "Process", "Task",
     "TaskLevel", "TaskStatus",
     # exceptions
     "StackoverflowError", "UnexpectedError", "CloneError", "MindNotImplementedError", "GhostError", "ContextError",
-    "ThinkError", "BootstrapError", "LogicError", "BusyError",
+    "ThinkError", "BootstrapError", "LogicError", "BusyError", "LockLostError",
     # events
     "Event",
     "OnActivating",
@@ -15,6 +15,7 @@ if TYPE_CHECKING:
     from ghoshell.ghost.session import Session
     from ghoshell.ghost.runtime import Runtime
     from ghoshell.container import Container
+    from ghoshell.utils.tracing import Tracer
 
 M = TypeVar('M', bound=Message)
 
@@ -58,6 +59,14 @@ class Context(metaclass=ABCMeta):
     def logger(self) -> LoggerAdapter:
         pass
 
+    @property
+    @abstractmethod
+    def tracer(self) -> Optional["Tracer"]:
+        """
+        请求的 span 追踪. 没有被采样时为 None.
+        """
+        pass
+
     @property
     @abstractmethod
     def runtime(self) -> "Runtime":
@@ -116,6 +125,13 @@ class Context(metaclass=ABCMeta):
         """
         pass
 
+    def stream_output(self, _output: "Output") -> bool:
+        """
+        立刻把输出交给 shell, 不等到这一轮结束. 用于流式输出的增量.
+        返回 False 表示当前的 shell 不支持流式输出.
+        """
+        return False
+
     @abstractmethod
     def reset_input(self, _input: "Input") -> None:
         """
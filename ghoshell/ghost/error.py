@@ -34,6 +34,13 @@ class BusyError(ContextError):
     CODE: int = 420
 
 
+class LockLostError(ContextError):
+    """
+    process 的锁已经失效 (比如过期后被别的 worker 拿走), 本轮的状态变更没有保存.
+    """
+    CODE: int = 421
+
+
 class ThinkError(ContextError):
     """
     用来传递信息的 err
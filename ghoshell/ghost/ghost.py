@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, ClassVar, List
 
 from ghoshell.container import Container
 from ghoshell.messages import Input, Output
+from ghoshell.utils.asyncs import to_thread
 
 if TYPE_CHECKING:
     from ghoshell.ghost.context import Context
@@ -29,7 +30,8 @@ class Ghost(metaclass=ABCMeta):
 
     Ghost 和 Clone 两个抽象的划分是为了解决个性化问题.
 
-    Ghost 所有的方法都不做 async, 否则系统复杂度太高, 性能未见得好.
+    Ghost 的方法默认都是同步的, 否则系统复杂度太高, 性能未见得好.
+    只有 respond_async 提供异步入口, 让一个进程在等待 LLM 等 I/O 时可以服务多个会话.
     """
 
     # 一个常量, 当 ghost 与 ghost 通讯时, 发送者的 ghost 也就成了 shell. 因此需要有一个常量来标记.
@@ -100,6 +102,12 @@ class Ghost(metaclass=ABCMeta):
         """
         pass
 
+    async def respond_async(self, _input: "Input") -> List["Output"] | None:
+        """
+        respond 的异步版本. 默认在有界的线程池里运行 respond.
+        """
+        return await to_thread(self.respond, _input)
+
     # ---- 全局组件  ---- #
 
     @property
@@ -2,7 +2,7 @@ from ghoshell.ghost.mindset.events import *
 from ghoshell.ghost.mindset.focus import Focus, FocusDriver, Intention, Attention
 from ghoshell.ghost.mindset.mind import Mind
 from ghoshell.ghost.mindset.mindset import Mindset
-from ghoshell.ghost.mindset.operator import Operator, OperationKernel
+from ghoshell.ghost.mindset.operator import Operator, OperationKernel, ChainOperator
 from ghoshell.ghost.mindset.stage import Stage, Reaction
 from ghoshell.ghost.mindset.think import Think, ThinkDriver
 from ghoshell.ghost.mindset.thought import Thought, DictThought
@@ -18,5 +18,5 @@ __all__ = [
     "OnActivating", "OnCallback", "OnReceived", "OnWithdrawing", "OnCanceling", "OnFailing",
     "OnQuiting",
     "OnPreempted",
-    "Operator", "OperationKernel",
+    "Operator", "OperationKernel", "ChainOperator",
 ]
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from abc import ABCMeta, abstractmethod
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from ghoshell.ghost.context import Context
 from ghoshell.ghost.mindset.operator import Operator
@@ -42,9 +42,11 @@ class Intention(BaseModel):
 
 class Attention(BaseModel):
     to: URL
-    intentions: List[Intention]
+    intentions: List[Intention] = Field(default_factory=lambda: [])
     reaction: str
     level: int = 0
+    # 引用模式: 不保存 intentions, 匹配时根据 to 指向的 stage 和 reaction 重新取出.
+    referred: bool = False
 
 
 class FocusDriver(metaclass=ABCMeta):
@@ -73,6 +75,33 @@ class FocusDriver(metaclass=ABCMeta):
     def wildcard_match(self, ctx: Context) -> Optional[Intention]:
         pass
 
+    def cost(self) -> int:
+        """
+        匹配开销的估计, 越大越贵. 纯本地计算的驱动是 0, 需要请求模型的驱动应该返回更大的值.
+        并发模式下 focus 会提前在线程池里运行开销大的驱动, 运行的是 prepare_match 返回的方法.
+        ctx 不是线程安全的, 线程池里的任务也可能在 ctx.finish 之后才结束, 所以它们不能再访问 ctx.
+        """
+        return 0
+
+    def prepare_match(self, ctx: Context, *metas: Intention) -> Optional[Callable[[], Optional[Intention]]]:
+        """
+        在调用线程里从 ctx 读取匹配需要的全部输入, 返回一个不依赖 ctx 的匹配方法.
+        返回的方法会在线程池里运行. 返回 None 表示驱动不支持, 只在调用线程里运行 match.
+        """
+        return None
+
+    def prepare_wildcard_match(self, ctx: Context) -> Optional[Callable[[], Optional[Intention]]]:
+        """
+        wildcard_match 的 prepare_match.
+        """
+        return None
+
+    def timeout(self) -> float:
+        """
+        在线程池里运行时的超时时间, 单位是秒. 0 表示不限制. 超时视为没有匹配.
+        """
+        return 0
+
 
 class Focus(metaclass=ABCMeta):
     """
@@ -100,6 +129,18 @@ class Focus(metaclass=ABCMeta):
     def global_match(self, ctx: Context) -> Optional[Intention]:
         pass
 
+    def match_grouped(self, ctx: Context, grouped: Dict[str, List[Intention]]) -> Optional[Intention]:
+        """
+        按 kinds 的顺序匹配分好组的意图, 返回第一个命中的结果.
+        """
+        for kind in self.kinds():
+            if kind not in grouped:
+                continue
+            matched = self.match(ctx, kind, *grouped[kind])
+            if matched is not None:
+                return matched
+        return None
+
     @abstractmethod
     def register_global_intentions(self, *intentions: Intention) -> None:
         pass
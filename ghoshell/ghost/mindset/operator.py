@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Optional, TYPE_CHECKING
+from collections import deque
+from typing import Optional, TYPE_CHECKING, ClassVar, Deque, Dict, Iterable
 
-from ghoshell.ghost.error import OperatorError, ForbiddenError, ThinkError, CloneError
+from ghoshell.ghost.error import OperatorError, ForbiddenError, ThinkError, CloneError, StackoverflowError
+from ghoshell.utils.asyncs import to_thread
+from ghoshell.utils.debug import StatsCounter
+from ghoshell.utils.tracing import span
 
 if TYPE_CHECKING:
     from ghoshell.ghost.context import Context
@@ -32,11 +37,43 @@ class Operator(metaclass=ABCMeta):
         pass
 
 
+class ChainOperator(Operator):
+    """
+    链式 operator. 依次运行 chain 里的算子, 每个算子返回的后续算子先于剩下的 chain 运行.
+    OperationKernel 会把它展开到自己的队列里, 不会真的调用 run.
+    """
+
+    def __init__(self, chain: Iterable[Operator] | None = None):
+        self.chain: Deque[Operator] = deque(chain) if chain is not None else deque()
+
+    def run(self, ctx: "Context") -> Optional["Operator"]:
+        # 单独运行时原地修改队列, 不复制 chain.
+        if not self.chain:
+            return None
+        op = self.chain.popleft()
+        after = op.run(ctx)
+        if after is not None:
+            self.chain.appendleft(after)
+        return self if self.chain else None
+
+    def destroy(self) -> None:
+        del self.chain
+
+    def __repr__(self):
+        result = [f"{self.__class__.__name__}:"]
+        for op in self.chain:
+            result.append(str(op))
+        return "\n".join(result)
+
+
 class OperationKernel(metaclass=ABCMeta):
     """
     Operators Manager 的实现.
     """
 
+    # 进程级别的统计, 每种算子运行的步数和总耗时 (秒).
+    steps: ClassVar[StatsCounter] = StatsCounter()
+
     @abstractmethod
     def record(self, ctx: "Context", op: Operator) -> None:
         """
@@ -68,13 +105,24 @@ class OperationKernel(metaclass=ABCMeta):
     def run_dominos(self, ctx: "Context", initial_op: "Operator") -> None:
         """
         像推倒多米诺骨牌一样, 运行各种算子.
+        ChainOperator 展开到队列里运行, 每个算子的后续算子先于队列里剩下的算子运行.
         """
+        pending: Deque[Operator] = deque()
         op = initial_op
         err_times = 0
         try:
             count = 0
             while op is not None:
-                self.is_stackoverflow(op, count)
+                if isinstance(op, ChainOperator):
+                    pending.extendleft(reversed(op.chain))
+                    op.chain.clear()
+                    op = pending.popleft() if pending else None
+                    continue
+
+                if self.is_stackoverflow(op, count):
+                    raise StackoverflowError(
+                        f"operators exceed the step limit at {count} steps, last {type(op).__name__}"
+                    )
                 self.record(ctx, op)
                 count += 1
 
@@ -83,20 +131,28 @@ class OperationKernel(metaclass=ABCMeta):
 
                 # 正式运行.
                 # try:
+                name = op.__class__.__name__
+                start = time.perf_counter()
                 try:
-                    after = op.run(ctx)
+                    with span(name, "operator"):
+                        after = op.run(ctx)
 
                 except ForbiddenError as e:
                     err_times += 1
+                    # 和异常抛出整个 chain 一样, 放弃剩下的算子.
+                    self._drop_pending(pending)
                     ctx.send_at(None).text(e.message)
                     after = ctx.mind(None).rewind()
 
                 except ThinkError as e:
                     err_times += 1
 
+                    self._drop_pending(pending)
                     ctx.send_at(None).text(e.message)
                     ctx.send_at(None).err(e.message, e.CODE)
                     after = ctx.mind(None).rewind()
+                finally:
+                    self.count_step(name, time.perf_counter() - start)
 
                 # 检查死循环问题. 每一轮 op 都需要是一个新的 op, 基本要求.
                 if after is op:
@@ -105,11 +161,49 @@ class OperationKernel(metaclass=ABCMeta):
 
                 # 原始 op 销毁.
                 op.destroy()
+                if after is None and pending:
+                    after = pending.popleft()
                 op = after
 
         finally:
             self.save_records()
 
+    @staticmethod
+    def _drop_pending(pending: Deque[Operator]) -> None:
+        while pending:
+            pending.popleft().destroy()
+
+    @classmethod
+    def count_step(cls, name: str, cost: float) -> None:
+        cls.steps.incr(f"{name}:count")
+        cls.steps.incr(f"{name}:cost", cost)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, float]]:
+        """
+        每种算子运行的步数, 总耗时和平均耗时 (毫秒).
+        """
+        steps = cls.steps.stats()
+        result = {}
+        for key, count in steps.items():
+            name, _, field = key.rpartition(":")
+            if field != "count":
+                continue
+            cost = steps.get(f"{name}:cost", 0)
+            result[name] = {
+                "count": count,
+                "total_ms": cost * 1000,
+                "avg_ms": cost * 1000 / count if count else 0,
+            }
+        return result
+
+    async def run_dominos_async(self, ctx: "Context", initial_op: "Operator") -> None:
+        """
+        run_dominos 的异步版本.
+        算子都是同步的, 默认在有界的线程池里运行, 不阻塞 event loop.
+        """
+        await to_thread(self.run_dominos, ctx, initial_op)
+
     @abstractmethod
     def destroy(self) -> None:
         pass
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import heapq
 import uuid
 from abc import ABCMeta, abstractmethod
-from typing import List, Dict, Optional, Set
+from collections import OrderedDict
+from typing import List, Dict, Optional, Set, Tuple, Iterator
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from ghoshell.ghost.error import CloneError
-from ghoshell.ghost.mindset import Attention
+from ghoshell.ghost.mindset import Attention, Intention
 from ghoshell.messages import Tasked
 from ghoshell.url import URL
 
@@ -169,6 +171,22 @@ class Task(BaseModel):
     # task 是否已经完成实例化. 完成实例化则不需要读取.
     instanced: bool = False
 
+    def fork(self) -> "Task":
+        """
+        写时复制用的拷贝. 会被原地修改的字段 (url, forwards, callbacks, vars) 都要拷贝,
+        attentions 只会被整体替换, 可以共享.
+        """
+        copied = self.model_copy()
+        values = copied.__dict__
+        values["url"] = self.url.model_copy()
+        values["url"].args = self.url.args.copy()
+        values["forwards"] = list(self.forwards)
+        if self.callbacks is not None:
+            values["callbacks"] = set(self.callbacks)
+        if self.vars is not None:
+            values["vars"] = self.vars.copy()
+        return copied
+
     def to_tasked(self) -> Tasked:
         """
         返回出可传输, 可保存的 task 数据.
@@ -301,6 +319,52 @@ class Task(BaseModel):
         self.vars = None
         self.instanced = False
 
+    @classmethod
+    def load_trusted(cls, data: Dict) -> "Task":
+        """
+        不做校验地还原 task. 只用于读取系统自己保存的数据, 省掉 pydantic 校验的开销.
+        """
+        values = dict(data)
+        values["url"] = _construct_trusted(URL, values["url"])
+        callbacks = values.get("callbacks", None)
+        if callbacks is not None:
+            values["callbacks"] = set(callbacks)
+        attentions = values.get("attentions", None)
+        if attentions is not None:
+            values["attentions"] = [_load_trusted_attention(attention) for attention in attentions]
+        return _construct_trusted(cls, values)
+
+
+def _construct_trusted(model: type, data: Dict):
+    """
+    跳过校验构建 model. 字段完整时 (ghost 自己 dump 的数据) 直接写入 __dict__, 比 model_construct 更快.
+    """
+    fields = model.model_fields
+    if len(data) != len(fields) or any(name not in data for name in fields):
+        return model.model_construct(**data)
+    instance = model.__new__(model)
+    values = dict(data)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(values))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    private = {name: attr.get_default() for name, attr in model.__private_attributes__.items()}
+    object.__setattr__(instance, "__pydantic_private__", private if private else None)
+    return instance
+
+
+def _load_trusted_attention(data: Dict) -> Attention:
+    intentions = []
+    for intention_data in data.get("intentions", []):
+        intention_values = dict(intention_data)
+        target = intention_values.get("target", None)
+        if target is not None:
+            intention_values["target"] = _construct_trusted(URL, target)
+        intentions.append(_construct_trusted(Intention, intention_values))
+    values = dict(data)
+    values["to"] = _construct_trusted(URL, values["to"])
+    values["intentions"] = intentions
+    return _construct_trusted(Attention, values)
+
 
 class Process(BaseModel):
     """
@@ -356,9 +420,16 @@ class Process(BaseModel):
     # 表示进程是否是退出状态.
     quiting: bool = False
 
+    # 已经废弃的索引字段, 只为了兼容旧的存储数据. 索引现在由私有属性维护, 不再保存.
     tid_indexes: Optional[Dict[str, int]] = None
     status_list_indexes: Optional[Dict[int, List[str]]] = None
 
+    # 根据 tasks 建立的索引, 第一次访问时才建立. store_task 同时更新索引和 tasks.
+    # tasks 被整体替换 (或者 process 被拷贝) 后, 索引在下一次访问时重建.
+    _index: Optional["_TaskIndex"] = PrivateAttr(default=None)
+    # 和上一轮 (存储的快照) 共享的 task. 第一次通过 get_task 取出时才拷贝 (copy on write).
+    _shared: Set[str] = PrivateAttr(default_factory=set)
+
     @classmethod
     def new_process(cls, sid: str, pid: str | None = None, parent_id: str | None = None) -> "Process":
         """
@@ -379,16 +450,25 @@ class Process(BaseModel):
         """
         当前进程运行新的一帧, 每一帧都来自外部信号的输入
         """
-        # 考虑强拷贝问题, 没有直接用 base model
-        return Process(
+        return self._fork(self.round + 1)
+
+    def _fork(self, round_: int) -> "Process":
+        """
+        和当前 process 共享所有的 task, 只有被取出修改的 task 才会拷贝.
+        当前 process 作为快照, 不应该再被修改.
+        """
+        tasks = list(self.tasks)
+        forked = Process(
             sid=self.sid,
             pid=self.pid,
             root=self.root,
             current=self.current,
             parent_id=self.parent_id,
-            round=self.round + 1,
-            tasks=[task.model_copy() for task in self.tasks],
+            round=round_,
+            tasks=tasks,
         )
+        forked.__pydantic_private__["_shared"] = {task.tid for task in tasks}
+        return forked
 
     @property
     def depending(self) -> List[str]:
@@ -401,32 +481,28 @@ class Process(BaseModel):
     @property
     def running(self) -> List[str]:
         """
-        等待回调的任务, 依赖另一个任务的完成.
-        如果上下文命中了一个等待任务, 应该进入到它依赖的对象.
+        运行中的任务. 还没有被调度过的新任务也视作运行中.
         """
         return self._get_tid_by_status(TaskStatus.RUNNING)
 
     @property
     def canceling(self) -> List[str]:
         """
-        等待回调的任务, 依赖另一个任务的完成.
-        如果上下文命中了一个等待任务, 应该进入到它依赖的对象.
+        取消中的任务.
         """
         return self._get_tid_by_status(TaskStatus.CANCELING)
 
     @property
     def dead(self) -> List[str]:
         """
-        等待回调的任务, 依赖另一个任务的完成.
-        如果上下文命中了一个等待任务, 应该进入到它依赖的对象.
+        已经彻底取消的任务.
         """
         return self._get_tid_by_status(TaskStatus.DEAD)
 
     @property
     def failing(self) -> List[str]:
         """
-        等待回调的任务, 依赖另一个任务的完成.
-        如果上下文命中了一个等待任务, 应该进入到它依赖的对象.
+        失败中的任务.
         """
         return self._get_tid_by_status(TaskStatus.FAILING)
 
@@ -448,12 +524,13 @@ class Process(BaseModel):
         同时对这些任务进行 priority 优先级排序.
         二级顺序应该是运行时数据.
         """
-        preempting: List[Task] = []
-        for task in self.tasks:
-            if task.status == TaskStatus.PREEMPTING:
-                preempting.append(task)
-        preempting.sort(key=lambda t: t.priority, reverse=True)
-        return [item.tid for item in preempting]
+        index = self._get_index()
+        bucket = index.buckets.get(TaskStatus.PREEMPTING, None)
+        if not bucket:
+            return []
+        order = index.order
+        # sorted 是稳定的, 同优先级保持 tasks 的顺序.
+        return sorted(bucket, key=lambda tid: order[tid].priority, reverse=True)
 
     @property
     def callbacks(self) -> Set[str]:
@@ -468,16 +545,10 @@ class Process(BaseModel):
     @property
     def waiting(self) -> List[str]:
         """
-        取出所有的运行中任务.
+        取出所有的等待中任务.
         要排除掉 await 和 root
         """
-        arr = self._get_tid_by_status(TaskStatus.WAITING)
-        result = []
-        # todo, 这样写感觉运行效率比较低, 内存开销增加. 不过问题不大.
-        for tid in arr:
-            if tid != self.root and tid != self.current:
-                result.append(tid)
-        return result
+        return [tid for tid in self._iter_status(TaskStatus.WAITING) if tid != self.root and tid != self.current]
 
     @property
     def finished(self) -> List[str]:
@@ -487,16 +558,13 @@ class Process(BaseModel):
         return self._get_tid_by_status(TaskStatus.FINISHED)
 
     def _get_tid_by_status(self, status: TASK_STATUS) -> List[str]:
-        if self.status_list_indexes is None:
-            status_indexes = {}
-            for task in self.tasks:
-                status = task.status
-                if status not in status_indexes:
-                    status_indexes[status] = []
-                status_indexes[status].append(task.tid)
-            self.status_list_indexes = status_indexes
+        return list(self._iter_status(status))
 
-        return self.status_list_indexes.get(status, [])
+    def _iter_status(self, status: TASK_STATUS) -> Iterator[str]:
+        bucket = self._get_index().buckets.get(_TaskIndex.bucket_key(status), None)
+        if bucket is None:
+            return iter(())
+        return iter(bucket)
 
     @property
     def is_new(self) -> bool:
@@ -513,21 +581,32 @@ class Process(BaseModel):
         """
         取出来一个任务的指针.
         """
-        if self.tid_indexes is None or len(self.tid_indexes) == 0:
-            self.reset_indexes()
-        indexes = self.tid_indexes
-        if tid not in indexes:
+        index = self._get_index()
+        task = index.order.get(tid, None)
+        if task is None:
             return None
-        idx = indexes[tid]
-        return self.tasks[idx]
+        shared = self.__pydantic_private__["_shared"]
+        if shared and tid in shared:
+            # 取出的 task 可能被修改, 这时才从快照拷贝.
+            shared.discard(tid)
+            task = task.fork()
+            index.order[tid] = task
+            self._sync_tasks(index)
+        return task
+
+    def is_shared(self, tid: str) -> bool:
+        """
+        task 是否仍然和快照共享.
+        """
+        return tid in self.__pydantic_private__["_shared"]
 
     def store_task(self, *tasks: Task) -> None:
         """
-        将任务记录到 Process 中.
-        每次要重置索引.
+        将任务记录到 Process 中. 存储的任务按顺序移动到头部, 同时更新状态索引.
         """
         if len(tasks) == 0:
             return
+        index = self._get_index()
         done = set()
         task_arr = []
         for task in tasks:
@@ -541,17 +620,15 @@ class Process(BaseModel):
             task_arr.append(task)
             done.add(tid)
 
-        exists = {ptr.tid: ptr for ptr in self.tasks}
-        orders = [ptr.tid for ptr in self.tasks]
-        for tid in orders:
-            if tid in done:
-                continue
-            ptr = exists[tid]
-            task_arr.append(ptr)
-            done.add(tid)
-
-        self.tasks = task_arr
-        self._clear_cached_indexes()
+        shared = self.__pydantic_private__["_shared"]
+        # 倒序移动到头部, 保证 tasks 参数的顺序.
+        for task in reversed(task_arr):
+            if shared and index.order.get(task.tid, None) is not task:
+                # 存入了新的对象, 不再和快照共享.
+                shared.discard(task.tid)
+            index.store(task)
+        self._sync_tasks(index)
+        index.revision += 1
 
     def set_current(self, tid: str):
         """
@@ -566,11 +643,10 @@ class Process(BaseModel):
         """
         将进程重置到根任务上.
         """
-        root = self.get_task(self.root).model_copy()
+        root = self.get_task(self.root).fork()
         root.restart()
         self.current = self.root
-        self.tasks = [root]
-        self._clear_cached_indexes()
+        self.reset_tasks([root])
 
     def reset_tasks(self, tasks: List[Task]) -> None:
         done = set()
@@ -582,57 +658,177 @@ class Process(BaseModel):
             done.add(t.tid)
 
         self.tasks = task_arr
-        self.reset_indexes()
+        self._build_index()
 
     def to_saving_dict(self) -> Dict:
         return self.model_dump(include={"pid", "sid", "root", "current", "round", "parent_id", "tasks"})
 
-    def _clear_cached_indexes(self) -> None:
-        self.tid_indexes = None
-        self.status_list_indexes = None
+    @classmethod
+    def load_trusted(cls, data: Dict) -> "Process":
+        """
+        不做校验地还原 process, 参考 Task.load_trusted.
+        """
+        values = {key: data[key] for key in data if key not in {"tid_indexes", "status_list_indexes"}}
+        values["tasks"] = [Task.load_trusted(task_data) for task_data in values.get("tasks", [])]
+        return _construct_trusted(cls, values)
+
+    @property
+    def revision(self) -> int:
+        """
+        tasks 每次变更都会递增, 用来让依赖 tasks 的缓存 (比如 attention 索引) 失效. 不需要保存.
+        """
+        return self._get_index().revision
+
+    def _get_index(self) -> "_TaskIndex":
+        # 直接读 __pydantic_private__, 避免走 BaseModel.__getattr__ 的慢路径.
+        index = self.__pydantic_private__["_index"]
+        if index is None or index.owner != id(self) or index.tasks is not self.tasks:
+            index = self._build_index()
+        return index
+
+    def _build_index(self) -> "_TaskIndex":
+        """
+        根据 tasks 数组重建索引.
+        """
+        old = self.__pydantic_private__["_index"]
+        index = _TaskIndex(self.tasks, id(self))
+        if old is not None:
+            index.revision = old.revision + 1
+        self.__pydantic_private__["_index"] = index
+        return index
+
+    def _sync_tasks(self, index: "_TaskIndex") -> None:
+        """
+        按索引的顺序重新生成 tasks 数组.
+        tasks 是真实的字段, 和快照或者浅拷贝共享时不能原地修改, 所以这一步和 tasks 的长度成正比.
+        只是一次 C 层面的数组拷贝, 不再比较或者重新排序 task.
+        """
+        tasks = list(reversed(index.order.values()))
+        self.tasks = tasks
+        index.tasks = tasks
 
     def fallback(self) -> Task | None:
-        canceling = self.canceling
-        if len(canceling) > 0:
-            return self.get_task(canceling[0])
-        failing = self.failing
-        if len(failing) > 0:
-            return self.get_task(failing[0])
-
-        running = self.running
-        if len(running) > 0:
-            tid = running[0]
-            # running 的任务执行 forward
-            return self.get_task(tid)
-
-        preempting = self.preempting
-        if len(preempting) > 0:
-            tid = preempting[0]
-            return self.get_task(tid)
-
-        waiting = self.waiting
-        if len(waiting) > 0:
-            tid = waiting[0]
-            return self.get_task(tid)
+        """
+        调度时取出下一个要执行的任务, 只读取各个状态的头部, 不需要遍历.
+        """
+        index = self._get_index()
+        buckets = index.buckets
+        for status in (TaskStatus.CANCELING, TaskStatus.FAILING, TaskStatus.RUNNING):
+            bucket = buckets.get(status, None)
+            if bucket:
+                # running 的任务执行 forward
+                return index.order[next(iter(bucket))]
+
+        tid = index.top_preempting()
+        if tid is not None:
+            return index.order[tid]
+
+        for tid in buckets.get(TaskStatus.WAITING, ()):
+            if tid != self.root and tid != self.current:
+                return index.order[tid]
         return None
 
     def reset_indexes(self) -> None:
-        tid_indexes = {}
-        idx = 0
-        for task in self.tasks:
-            tid_indexes[task.tid] = idx
-            idx += 1
-        self.tid_indexes = tid_indexes
+        """
+        直接修改了 task 的状态而没有 store_task 时, 调用这个方法重建索引.
+        """
+        self._build_index()
 
     def brief(self) -> Dict:
-        brief = self.model_dump(exclude={"__tid_indexes", "__status_list_indexes"})
+        brief = self.model_dump(exclude={"tid_indexes", "status_list_indexes"})
         return brief
 
     def deep_copy(self) -> "Process":
-        self.reset_indexes()
-        # 偷懒
-        # todo: 实现一个干净一些的.
-        return Process(**self.model_dump())
+        """
+        写时复制的拷贝, 参考 new_round.
+        """
+        return self._fork(self.round)
+
+
+class _TaskIndex:
+    """
+    Process 的任务索引, 由 tasks 推导, 不参与 Process 的比较.
+    """
+
+    __slots__ = ("tasks", "owner", "order", "statuses", "buckets", "preempting_heap", "seqs", "seq", "revision")
+
+    def __init__(self, tasks: List[Task], owner: int):
+        # 建立索引时的 tasks 数组和所属的 process. 两者变化时索引失效.
+        # 浅拷贝的 process 共享同一个索引对象, 所以还要检查 owner.
+        self.tasks = tasks
+        self.owner = owner
+        # tid => task, 按存储的顺序排列, 尾部是最近存储的任务, 和 tasks 的顺序相反.
+        # 普通的 dict 移动到尾部是 O(1) 的, 倒序遍历也比 OrderedDict 快得多.
+        self.order: Dict[str, Task] = {}
+        # tid => 存储时 task 所在的状态桶.
+        self.statuses: Dict[str, int] = {}
+        # status => 有序的 tid 集合, 顺序和 tasks 一致.
+        self.buckets: Dict[int, OrderedDict[str, None]] = {}
+        # preempting 任务的优先级堆, 元素是 (-priority, -seq, tid), 惰性删除.
+        self.preempting_heap: List[Tuple[float, int, str]] = []
+        # tid => 最后一次存储的序号, 用来判断堆里的元素是否过期.
+        self.seqs: Dict[str, int] = {}
+        self.seq: int = 0
+        self.revision: int = 0
+        # 倒序写入, 让 tasks[0] 在头部.
+        for task in reversed(tasks):
+            self.store(task)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _TaskIndex)
+
+    __hash__ = None
+
+    @classmethod
+    def bucket_key(cls, status: TASK_STATUS) -> TASK_STATUS:
+        # 新任务还没有被调度过, 和运行中的任务放在一起.
+        if status == TaskStatus.NEW:
+            return TaskStatus.RUNNING
+        return status
+
+    def store(self, task: Task) -> None:
+        tid = task.tid
+        order = self.order
+        order.pop(tid, None)
+        order[tid] = task
+
+        key = self.bucket_key(task.status)
+        old_key = self.statuses.get(tid, None)
+        if old_key is not None and old_key != key:
+            del self.buckets[old_key][tid]
+        bucket = self.buckets.get(key, None)
+        if bucket is None:
+            bucket = OrderedDict()
+            self.buckets[key] = bucket
+        bucket[tid] = None
+        bucket.move_to_end(tid, last=False)
+        self.statuses[tid] = key
+
+        self.seq += 1
+        self.seqs[tid] = self.seq
+        if key == TaskStatus.PREEMPTING:
+            heapq.heappush(self.preempting_heap, (-task.priority, -self.seq, tid))
+
+    def top_preempting(self) -> str | None:
+        """
+        优先级最高的 preempting 任务, 过期的堆元素直接丢弃.
+        同优先级时最近存储的优先, 和 tasks 的顺序一致.
+        没有 store_task 就直接修改了 priority 的任务, 按当前的优先级重新入堆, 不会丢失.
+        调高的优先级要等到旧的元素到达堆顶才生效, 需要立刻生效时调用 store_task.
+        """
+        heap = self.preempting_heap
+        while heap:
+            neg_priority, neg_seq, tid = heap[0]
+            task = self.order.get(tid, None)
+            if task is None \
+                    or self.statuses.get(tid) != TaskStatus.PREEMPTING \
+                    or self.seqs.get(tid) != -neg_seq:
+                heapq.heappop(heap)
+                continue
+            if task.priority == -neg_priority:
+                return tid
+            heapq.heapreplace(heap, (-task.priority, neg_seq, tid))
+        return None
 
 
 class Runtime(metaclass=ABCMeta):
@@ -666,6 +862,14 @@ class Runtime(metaclass=ABCMeta):
     def unlock_process(self, process_id: str | None = None) -> bool:
         pass
 
+    @abstractmethod
+    def reload(self) -> None:
+        """
+        丢弃已经读取的 process 和 task, 下次使用时重新从 session 读取.
+        在等待进程锁之后调用, 避免使用锁的持有者保存之前的旧数据.
+        """
+        pass
+
     @abstractmethod
     def get_process(self, pid: str | None = None) -> Optional[Process]:
         """
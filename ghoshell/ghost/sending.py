@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import json
 from abc import ABCMeta, abstractmethod
-from typing import Optional, Any
+from typing import Optional, Any, Iterable
 
 from ghoshell.ghost.error import ThinkError
 from ghoshell.messages import *
@@ -46,6 +46,17 @@ class Sender(metaclass=ABCMeta):
         string = json.dumps(value, indent=indent, ensure_ascii=False)
         return self.text(f"```json\n{string}\n```", markdown=True)
 
+    def stream_text(self, chunks: Iterable[str], markdown: bool = False) -> str:
+        """
+        流式输出文本, 返回完整的文本. 完整的文本最后仍然以 Text 消息输出.
+        增量不经过输出的管道, 也不是事务的: 失败时已经发送给 shell 的增量不会撤回.
+        默认实现不支持流式, 拼接后一次性输出.
+        """
+        content = "".join(chunks)
+        if content:
+            self.text(content, markdown=markdown)
+        return content
+
     def err(self, errmsg: str, code: int = ThinkError.CODE) -> "Sender":
         """
         输出错误消息的语法糖.
@@ -68,6 +68,12 @@ class Session(metaclass=ABCMeta):
         """
         pass
 
+    def get_many(self, *keys: str) -> Dict[str, Dict | None]:
+        """
+        批量读取 session 中的数据, 不存在的数据为 None.
+        """
+        return {key: self.get(key) for key in keys}
+
     @abstractmethod
     def remove(self, *key: str) -> None:
         """
@@ -76,16 +82,29 @@ class Session(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def lock(self, key: str, overdue: int = -1) -> bool:
+    def lock(self, key: str, overdue: int = -1) -> int:
         """
-        session 给一个 key 上锁.
+        session 给一个 key 上锁. 成功返回 fencing token, 失败返回 0.
         """
         pass
 
     @abstractmethod
-    def unlock(self, key: str) -> bool:
+    def unlock(self, key: str, token: int = 0) -> bool:
+        """
+        session 给一个 key 解锁. 注意 token 为 0 时并没有强行要求上锁成功才能解锁.
+        """
+        pass
+
+    @abstractmethod
+    def renew_lock(self, key: str, token: int, overdue: int) -> bool:
+        """
+        锁续约, token 已经过期时返回 False.
         """
-        session 给一个 key 解锁. 注意这里并没有强行要求上锁成功才能解锁.
+        pass
+
+    def fence(self, key: str, token: int) -> None:
+        """
+        本轮的写操作只有在 key 的锁仍然被 token 持有时才会提交.
         """
         pass
 
@@ -93,10 +112,22 @@ class Session(metaclass=ABCMeta):
     def get_task_data(self, tid: str) -> Dict | None:
         pass
 
+    def get_many_task_data(self, *tids: str) -> Dict[str, Dict | None]:
+        """
+        批量读取长期任务的数据, 不存在的数据为 None.
+        """
+        return {tid: self.get_task_data(tid) for tid in tids}
+
     @abstractmethod
     def set_task_data(self, tid: str, value: Dict, overdue: int) -> None:
         pass
 
+    def flush(self) -> bool:
+        """
+        如果 session 缓存了写操作, 一次性提交. 因为 fencing token 过期被拒绝时返回 False.
+        """
+        return True
+
     @abstractmethod
     def clear_all(self) -> None:
         """
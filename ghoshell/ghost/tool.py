@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 from logging import Logger
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, ClassVar, Set
 
 from pydantic import ValidationError
 
@@ -12,10 +13,115 @@ from ghoshell.ghost.mindset import Think, Thought, Stage, Event
 from ghoshell.ghost.mindset.operator import Operator
 from ghoshell.ghost.runtime import Task, TaskStatus, Process, TaskLevel
 from ghoshell.url import URL
+from ghoshell.utils import StatsCounter
+from ghoshell.utils.tracing import span
 
 GroupedIntentions = Dict[str, List[Intention]]
 
 
+class AttentionIndex:
+    """
+    一轮 process 中预编译好的注意力索引.
+    intentions 已经标记好 target 和 reaction, 并按 kind 分组. 匹配的顺序由 Focus.match_grouped 决定.
+    process 变更 (revision, root, current) 后失效.
+    """
+
+    def __init__(self, process: Process, attentions: List[Attention]):
+        self.process = process
+        self.revision = process.revision
+        self.root = process.root
+        self.current = process.current
+        self.attentions = attentions
+        self.grouped: GroupedIntentions = {}
+        for attention in attentions:
+            for intention in attention.intentions:
+                # 标记索引.
+                intention.target = attention.to
+                intention.reaction = attention.reaction
+            CtxTool.group_intentions(self.grouped, attention.intentions)
+
+    def is_valid(self, process: Process) -> bool:
+        return self.process is process \
+            and self.revision == process.revision \
+            and self.root == process.root \
+            and self.current == process.current
+
+
+class ReactionIntentionsCache:
+    """
+    引用模式的 attention 需要的 intentions, 按 (think, stage, reaction) 缓存.
+    think 实例变化 (比如 meta 被重新注册) 时自动失效.
+    引用模式假设 Reaction.intentions 的结果只和 stage 有关, 和上下文无关.
+    """
+
+    __cache: ClassVar[Dict[Tuple[str, str, str], Tuple[Think, List[Intention]]]] = {}
+
+    @classmethod
+    def fetch(cls, ctx: Context, url: URL, reaction_name: str) -> List[Intention]:
+        think = ctx.clone.mindset.fetch_meta_instance(url.think)
+        if think is None:
+            return []
+        key = (url.think, url.stage, reaction_name)
+        cached = cls.__cache.get(key, None)
+        if cached is not None and cached[0] is think:
+            return cached[1]
+        intentions = []
+        stage = think.fetch_stage(url.stage)
+        if stage is not None:
+            reaction = stage.reactions().get(reaction_name, None)
+            if reaction is not None:
+                intentions = reaction.intentions(ctx)
+        cls.__cache[key] = (think, intentions)
+        return intentions
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.__cache.clear()
+
+
+class CtxMemo:
+    """
+    上下文级别的备忘, 保存在 ctx 上, ctx.finish 时清空.
+    多任务的流程里同一个 url 每轮会被解析很多次, 这里缓存:
+    think 实例, (think, args) 对应的 tid, 校验通过的 args, (think, stage) 对应的 Stage.
+    """
+
+    key: ClassVar[str] = "ghoshell.ghost.tool.memo"
+
+    # 进程级别的命中计数, 方便观察.
+    counter: ClassVar[StatsCounter] = StatsCounter("hit", "miss")
+
+    def __init__(self):
+        self.thinks: Dict[str, Think] = {}
+        self.tids: Dict[Tuple[str, str], str] = {}
+        self.validated: Set[Tuple[str, str]] = set()
+        self.stages: Dict[Tuple[str, str], Optional[Stage]] = {}
+
+    @classmethod
+    def of(cls, ctx: Context) -> "CtxMemo":
+        memo = ctx.get(cls.key)
+        if memo is None:
+            memo = cls()
+            ctx.set(cls.key, memo)
+        return memo
+
+    @staticmethod
+    def args_key(args: Dict) -> str:
+        if not args:
+            return ""
+        return json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+    def think(self, ctx: Context, name: str) -> Think:
+        think = self.thinks.get(name, None)
+        if think is None:
+            self.counter.incr("miss")
+            think = ctx.clone.mindset.force_fetch(name)
+            self.thinks[name] = think
+        else:
+            self.counter.incr("hit")
+        return think
+
+
 class CtxTool:
     """
     基于抽象实现的一些基础上下文工具.
@@ -69,9 +175,38 @@ class CtxTool:
 
     @classmethod
     def fetch_stage(cls, ctx: Context, think: str, stage: str) -> Optional["Stage"]:
-        think = ctx.clone.mindset.fetch_meta_instance(think)
-        stage = think.fetch_stage(stage)
-        return stage
+        memo = CtxMemo.of(ctx)
+        key = (think, stage)
+        if key in memo.stages:
+            memo.counter.incr("hit")
+            return memo.stages[key]
+        memo.counter.incr("miss")
+        think_instance = ctx.clone.mindset.fetch_meta_instance(think)
+        stage_instance = think_instance.fetch_stage(stage) if think_instance is not None else None
+        memo.stages[key] = stage_instance
+        return stage_instance
+
+    attention_index_key: ClassVar[str] = "ghoshell.ghost.tool.attention_index"
+
+    @classmethod
+    def context_attention_index(cls, ctx: "Context") -> AttentionIndex:
+        """
+        当前 process 的注意力索引. 每轮只构建一次, 缓存在 ctx 上, process 变更后重建.
+        """
+        process = ctx.runtime.current_process()
+        index: AttentionIndex | None = ctx.get(cls.attention_index_key)
+        if index is None or not index.is_valid(process):
+            index = AttentionIndex(process, cls.context_attentions(ctx))
+            ctx.set(cls.attention_index_key, index)
+        return index
+
+    @classmethod
+    def match_context_attentions(cls, ctx: "Context") -> Optional[Intention]:
+        """
+        用预编译的索引匹配上下文的意图.
+        """
+        index = cls.context_attention_index(ctx)
+        return ctx.clone.focus.match_grouped(ctx, index.grouped)
 
     @classmethod
     def match_attentions(
@@ -92,16 +227,7 @@ class CtxTool:
                 intention.reaction = attention.reaction
 
             grouped_intentions = cls.group_intentions(grouped_intentions, attention.intentions)
-        ordered_kinds = ctx.clone.focus.kinds()
-        focus = ctx.clone.focus
-        for kind in ordered_kinds:
-            if kind not in grouped_intentions:
-                continue
-            intentions = grouped_intentions[kind]
-            matched = focus.match(ctx, kind, *intentions)
-            if matched is not None:
-                return matched
-        return None
+        return ctx.clone.focus.match_grouped(ctx, grouped_intentions)
 
     @classmethod
     def context_intentions(
@@ -109,18 +235,9 @@ class CtxTool:
             ctx: "Context",
     ) -> GroupedIntentions:
         """
-        从上下文的 attentions 中解析出 intentions
+        从上下文的 attentions 中解析出 intentions. 返回的是共享的索引, 不要修改.
         """
-        attentions = cls.context_attentions(ctx)
-        grouped_intentions: GroupedIntentions = {}
-        for attention in attentions:
-            for intention in attention.intentions:
-                # 标记索引.
-                intention.target = attention.to
-                intention.reaction = attention.reaction
-
-            grouped_intentions = cls.group_intentions(grouped_intentions, attention.intentions)
-        return grouped_intentions
+        return cls.context_attention_index(ctx).grouped
 
     @classmethod
     def group_intentions(cls, grouped: GroupedIntentions, intentions: List[Intention]) -> GroupedIntentions:
@@ -152,6 +269,7 @@ class CtxTool:
         runtime = ctx.runtime
         process = runtime.current_process()
         result: List[Attention] = []
+        rehydrate = cls.rehydrate_attention
 
         # 第一步, 添加 root. root 永远有最高优先级.
         root_task = RuntimeTool.fetch_root_task(ctx)
@@ -164,13 +282,13 @@ class CtxTool:
         if awaiting_task.attentions:
             # awaiting 添加所有.
             for attention in awaiting_task.attentions:
-                result.append(attention)
+                result.append(rehydrate(ctx, attention))
 
         if root_task.tid != awaiting_task.tid and root_task.attentions is not None:
             for attention in root_task.attentions:
                 # root 非私有方法都可以添加进去, 而且是高优.
                 if attention.level != TaskLevel.LEVEL_PRIVATE:
-                    result.append(attention)
+                    result.append(rehydrate(ctx, attention))
 
         # 封闭域任务, 不再继续增加注意目标.
         if awaiting_task_level == TaskLevel.LEVEL_PRIVATE:
@@ -185,9 +303,25 @@ class CtxTool:
                     # protected + public
                     # public + public
                     if TaskLevel.allow(awaiting_task_level, attention.level):
-                        result.append(attention)
+                        result.append(rehydrate(ctx, attention))
         return result
 
+    @classmethod
+    def rehydrate_attention(cls, ctx: "Context", attention: Attention) -> Attention:
+        """
+        引用模式的 attention, 从 stage 的 reaction 里还原出 intentions.
+        intentions 会被标记 target, 所以要拷贝, 避免不同任务共享同一个实例.
+        """
+        if not attention.referred:
+            return attention
+        intentions = ReactionIntentionsCache.fetch(ctx, attention.to, attention.reaction)
+        return Attention(
+            to=attention.to,
+            intentions=[intention.model_copy() for intention in intentions],
+            reaction=attention.reaction,
+            level=attention.level,
+        )
+
     @classmethod
     def current_process(cls, ctx: Context) -> Process:
         return ctx.runtime.current_process()
@@ -221,7 +355,8 @@ class RuntimeTool:
 
         # 触发事件. 要使用 event 的 stage
         stage = CtxTool.force_fetch_stage(ctx, thought.url.think, thought.url.stage)
-        after = stage.on_event(ctx, thought, event)
+        with span(f"{thought.url.think}::{thought.url.stage}", "stage", event=event.__class__.__name__):
+            after = stage.on_event(ctx, thought, event)
 
         # 这时 thought 已经变更了, 变更的信息要保存到 task 里.
         task = RuntimeTool.merge_thought_to_task(thought, task)
@@ -304,13 +439,17 @@ class RuntimeTool:
         根据 url 初始化一个 thought
         并没有执行实例化
         """
-        think = ctx.clone.mindset.force_fetch(url.think)
+        memo = CtxMemo.of(ctx)
+        think = memo.think(ctx, url.think)
         args_type = think.args_type()
         if args_type is not None:
-            try:
-                args_type(**url.args)
-            except ValidationError as e:
-                raise CloneError(str(e))
+            key = (url.think, memo.args_key(url.args))
+            if key not in memo.validated:
+                try:
+                    args_type(**url.args)
+                except ValidationError as e:
+                    raise CloneError(str(e))
+                memo.validated.add(key)
         thought = think.new_thought(ctx, url.args)
         return thought
 
@@ -367,11 +506,16 @@ class RuntimeTool:
 
     @classmethod
     def new_task_id(cls, ctx: Context, url: URL) -> str:
-        # todo: 以后实现一个 ctx 级别的缓存, 避免重复生成.
-        clone = ctx.clone
-        mindset = clone.mindset
-        think = mindset.force_fetch(url.think)
-        tid = think.new_task_id(ctx, url.args)
+        # ctx 级别的缓存, 避免重复生成.
+        memo = CtxMemo.of(ctx)
+        key = (url.think, memo.args_key(url.args))
+        tid = memo.tids.get(key, None)
+        if tid is None:
+            think = memo.think(ctx, url.think)
+            tid = think.new_task_id(ctx, url.args)
+            memo.tids[key] = tid
+        else:
+            memo.counter.incr("hit")
         return tid
 
     @classmethod
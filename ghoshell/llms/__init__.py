@@ -12,6 +12,7 @@ __all__ = [
     "OpenAIChatChoice",
     "OpenAIChatMsg",
     "OpenAIChatCompletion",
+    "OpenAIChatStream",
     "OpenAIFuncSchema",
     "OpenAIFuncCalled",
 
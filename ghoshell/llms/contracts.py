@@ -3,6 +3,8 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from typing import List
 
+from ghoshell.utils.asyncs import to_thread
+
 
 class LLMTextCompletion(metaclass=ABCMeta):
     """
@@ -12,10 +14,16 @@ class LLMTextCompletion(metaclass=ABCMeta):
     @abstractmethod
     def text_completion(self, prompt: str, config_name: str = "") -> str:
         """
-        同步接口. 未来还需要实现异步接口.
+        同步接口.
         """
         pass
 
+    async def text_completion_async(self, prompt: str, config_name: str = "") -> str:
+        """
+        异步接口. 默认在有界的线程池里调用同步接口.
+        """
+        return await to_thread(self.text_completion, prompt, config_name)
+
 
 class LLMTextEmbedding(metaclass=ABCMeta):
     """
@@ -25,3 +33,9 @@ class LLMTextEmbedding(metaclass=ABCMeta):
     @abstractmethod
     def text_embedding(self, text: str, config_name: str = "") -> List[float]:
         pass
+
+    def text_embeddings(self, texts: List[str], config_name: str = "") -> List[List[float]]:
+        """
+        批量生成 embedding. 默认逐个调用, 支持批量请求的实现应该重写它.
+        """
+        return [self.text_embedding(text, config_name) for text in texts]
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import os
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Iterator
 
 import openai
 from pydantic import BaseModel, Field
 
 from ghoshell.ghost import ContextError
-from ghoshell.llms.contracts import LLMTextCompletion
+from ghoshell.llms.contracts import LLMTextCompletion, LLMTextEmbedding
 from ghoshell.llms.openai_contracts import OpenAIChatCompletion, OpenAIChatChoice, OpenAIChatMsg, OpenAIFuncSchema
+from ghoshell.llms.openai_contracts import OpenAIChatStream
+from ghoshell.utils.tracing import span, current_tracer
 
 proxy_env = os.getenv("OPENAI_PROXY", "")
 if proxy_env:
@@ -40,6 +43,14 @@ class ChatCompletionConfig(BaseModel):
         return self.model_dump()
 
 
+class EmbeddingConfig(BaseModel):
+    model: str = "text-embedding-ada-002"
+    request_timeout: float = 5
+
+    def embedding_kwargs(self) -> Dict:
+        return self.model_dump()
+
+
 class OpenAIConfig(BaseModel):
     text_completions: Dict[str, TextCompletionConfig] = Field(
         default_factory=lambda: {"default": TextCompletionConfig()}
@@ -47,6 +58,9 @@ class OpenAIConfig(BaseModel):
     chat_completions: Dict[str, ChatCompletionConfig] = Field(
         default_factory=lambda: {"default": ChatCompletionConfig()}
     )
+    embeddings: Dict[str, EmbeddingConfig] = Field(
+        default_factory=lambda: {"default": EmbeddingConfig()}
+    )
 
 
 class OpenAITextCompletionChoice(BaseModel):
@@ -86,7 +100,7 @@ class OpenAIRecordStorage(metaclass=ABCMeta):
         pass
 
 
-class OpenAIAdapter(LLMTextCompletion, OpenAIChatCompletion):
+class OpenAIAdapter(LLMTextCompletion, LLMTextEmbedding, OpenAIChatCompletion):
     """
     openai 套皮实现
     """
@@ -97,7 +111,32 @@ class OpenAIAdapter(LLMTextCompletion, OpenAIChatCompletion):
 
     @classmethod
     def contracts(cls) -> List:
-        return [LLMTextCompletion, OpenAIChatCompletion]
+        return [LLMTextCompletion, LLMTextEmbedding, OpenAIChatCompletion]
+
+    def text_embedding(self, text: str, config_name: str = "") -> List[float]:
+        return self.text_embeddings([text], config_name)[0]
+
+    def text_embeddings(self, texts: List[str], config_name: str = "") -> List[List[float]]:
+        config_name = config_name if config_name else "default"
+        config = self._config.embeddings.get(config_name, None)
+        if config is None:
+            raise RuntimeError(f"embedding config {config_name} not found")
+        request = config.embedding_kwargs()
+        resp_dict = None
+        err = None
+        try:
+            with span("openai.embedding", "llm", model=config.model, size=len(texts)):
+                resp = openai.Embedding.create(input=texts, **request)
+            resp_dict = resp.to_dict_recursive()
+        except openai.error.OpenAIError as e:
+            err = ContextError(str(e))
+            err.with_traceback(e.__traceback__)
+            raise err
+        finally:
+            # embedding 的结果很大, 只记录请求.
+            self._storage.record(dict(input=texts, **request), None, err)
+        data = sorted(resp_dict["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
 
     def text_completion(self, prompt: str, config_name: str = "") -> str:
         if not config_name:
@@ -114,10 +153,11 @@ class OpenAIAdapter(LLMTextCompletion, OpenAIChatCompletion):
         resp = None
         err = None
         try:
-            resp = openai.Completion.create(
-                prompt=prompt,
-                **request,
-            )
+            with span("openai.text_completion", "llm", model=request.get("model", "")):
+                resp = openai.Completion.create(
+                    prompt=prompt,
+                    **request,
+                )
         except openai.error.OpenAIError as e:
             err = ContextError(str(e))
             err.with_traceback(e.__traceback__)
@@ -136,36 +176,42 @@ class OpenAIAdapter(LLMTextCompletion, OpenAIChatCompletion):
             function_call: str = "",
             config_name: str = "",  # 选择哪个预设的配置
     ) -> OpenAIChatChoice:
-        config_name = config_name if config_name else "default"
-        config = self._config.chat_completions.get(config_name, None)
-        if config is None:
-            raise RuntimeError(f"chat completion config {config_name} not found")
+        request = None
+        resp_dict = None
+        err = None
+        try:
+            request = self._chat_completion_request(chat_context, functions, function_call, config_name)
+            with span("openai.chat_completion", "llm", model=request.get("model", "")):
+                resp = openai.ChatCompletion.create(**request)
+            resp_dict = resp.to_dict_recursive()
+        except openai.error.OpenAIError as e:
+            err = ContextError(str(e))
+            err.with_traceback(e.__traceback__)
+            raise err
+        finally:
+            self._storage.record(request, resp_dict, err)
+
+        resp = OpenAIChatCompletionResponse(**resp_dict)
+        return resp.choices[0]
 
+    async def chat_completion_async(
+            self,
+            session_id: str,
+            chat_context: List[OpenAIChatMsg],
+            functions: List[OpenAIFuncSchema] | None = None,
+            function_call: str = "",
+            config_name: str = "",
+    ) -> OpenAIChatChoice:
+        """
+        使用 openai 原生的异步接口, 不占用线程池.
+        """
         request = None
         resp_dict = None
         err = None
         try:
-            request = config.chat_completion_kwargs()
-
-            messages: List[Dict] = []
-            for msg in chat_context:
-                messages.append(msg.to_message())
-            request["messages"] = messages
-
-            # functions
-            if functions:
-                request["functions"] = [func.dict() for func in functions]
-
-            # function_call
-            if functions:
-                if function_call == "none":
-                    request["function_call"] = "none"
-                elif function_call:
-                    request["function_call"] = {"name": function_call}
-                else:
-                    request["function_call"] = "auto"
-
-            resp = openai.ChatCompletion.create(**request)
+            request = self._chat_completion_request(chat_context, functions, function_call, config_name)
+            with span("openai.chat_completion_async", "llm", model=request.get("model", "")):
+                resp = await openai.ChatCompletion.acreate(**request)
             resp_dict = resp.to_dict_recursive()
         except openai.error.OpenAIError as e:
             err = ContextError(str(e))
@@ -176,3 +222,81 @@ class OpenAIAdapter(LLMTextCompletion, OpenAIChatCompletion):
 
         resp = OpenAIChatCompletionResponse(**resp_dict)
         return resp.choices[0]
+
+    def chat_completion_stream(
+            self,
+            session_id: str,
+            chat_context: List[OpenAIChatMsg],
+            functions: List[OpenAIFuncSchema] | None = None,
+            function_call: str = "",
+            config_name: str = "",
+    ) -> OpenAIChatStream:
+        """
+        使用 openai 的流式接口. 请求在第一次迭代时发出.
+        """
+        request = self._chat_completion_request(chat_context, functions, function_call, config_name)
+        request["stream"] = True
+        return OpenAIChatStream(self._iter_chat_deltas(request))
+
+    def _iter_chat_deltas(self, request: Dict) -> Iterator[Dict]:
+        deltas = []
+        err = None
+        tracer = current_tracer()
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for chunk in openai.ChatCompletion.create(**request):
+                choices = chunk.to_dict_recursive().get("choices", [])
+                if not choices:
+                    continue
+                item = choices[0]
+                deltas.append(item)
+                if first_token is None and item.get("delta", {}).get("content"):
+                    first_token = time.perf_counter()
+                yield item
+        except openai.error.OpenAIError as e:
+            err = ContextError(str(e))
+            err.with_traceback(e.__traceback__)
+            raise err
+        finally:
+            self._storage.record(request, dict(deltas=deltas), err)
+            if tracer is not None:
+                # 首个 token 的耗时是流式输出时用户实际感受到的延迟.
+                model = request.get("model", "")
+                end = time.perf_counter()
+                tracer.record("openai.chat_completion_stream", "llm", start, end, {"model": model})
+                if first_token is not None:
+                    tracer.record("openai.chat_completion_stream.first_token", "llm", start, first_token)
+
+    def _chat_completion_request(
+            self,
+            chat_context: List[OpenAIChatMsg],
+            functions: List[OpenAIFuncSchema] | None,
+            function_call: str,
+            config_name: str,
+    ) -> Dict:
+        config_name = config_name if config_name else "default"
+        config = self._config.chat_completions.get(config_name, None)
+        if config is None:
+            raise RuntimeError(f"chat completion config {config_name} not found")
+
+        request = config.chat_completion_kwargs()
+
+        messages: List[Dict] = []
+        for msg in chat_context:
+            messages.append(msg.to_message())
+        request["messages"] = messages
+
+        # functions
+        if functions:
+            request["functions"] = [func.dict() for func in functions]
+
+        # function_call
+        if functions:
+            if function_call == "none":
+                request["function_call"] = "none"
+            elif function_call:
+                request["function_call"] = {"name": function_call}
+            else:
+                request["function_call"] = "auto"
+        return request
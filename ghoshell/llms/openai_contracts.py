@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
+import time
 from abc import ABCMeta, abstractmethod
-from typing import List, Dict, ClassVar
+from typing import List, Dict, ClassVar, Iterable, Iterator
 
 from pydantic import BaseModel, Field
 
+from ghoshell.utils.asyncs import to_thread
+
 
 # 这里是用的 openai 提供的抽象
 # 没有定义成通用抽象, 因为 LLM 现在没有 openai 之外的 API 解决方案, 未来的接口也可能会向 openai 看齐.
@@ -129,6 +132,67 @@ class OpenAIChatResponse(BaseModel):
     usage: Dict
 
 
+class OpenAIChatStream:
+    """
+    流式的 chat completion.
+    迭代得到回复内容的增量, 迭代结束后用 choice() 得到完整的结果 (包括函数调用).
+    """
+
+    def __init__(self, deltas: Iterable[Dict]):
+        """
+        :param deltas: openai 流式接口每个 chunk 里 choices[0] 的数据, 包含 delta 和 finish_reason.
+        """
+        self._deltas = iter(deltas)
+        self._role = OpenAIChatMsg.ROLE_ASSISTANT
+        self._content: List[str] = []
+        self._function_call: Dict | None = None
+        self._finish_reason = ""
+        self._done = False
+        self.started_at = time.perf_counter()
+        # 收到第一个内容增量的耗时, 单位是秒.
+        self.time_to_first_token: float | None = None
+
+    @classmethod
+    def from_choice(cls, choice: OpenAIChatChoice) -> "OpenAIChatStream":
+        """
+        把非流式的结果包装成只有一个增量的流.
+        """
+        return cls([{"delta": choice.message, "finish_reason": choice.finish_reason}])
+
+    def __iter__(self) -> Iterator[str]:
+        for item in self._deltas:
+            delta = item.get("delta", {})
+            if item.get("finish_reason"):
+                self._finish_reason = item["finish_reason"]
+            if delta.get("role"):
+                self._role = delta["role"]
+            called = delta.get("function_call", None)
+            if called:
+                if self._function_call is None:
+                    self._function_call = {"name": "", "arguments": ""}
+                self._function_call["name"] += called.get("name", None) or ""
+                self._function_call["arguments"] += called.get("arguments", None) or ""
+            content = delta.get("content", None)
+            if content:
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - self.started_at
+                self._content.append(content)
+                yield content
+        self._done = True
+
+    def choice(self) -> OpenAIChatChoice:
+        """
+        完整的结果. 没有迭代完的增量会先被读完.
+        """
+        if not self._done:
+            for _ in self:
+                pass
+        message = {"role": self._role, "content": "".join(self._content)}
+        if self._function_call is not None:
+            message["function_call"] = self._function_call
+        return OpenAIChatChoice(index=0, message=message, finish_reason=self._finish_reason or "stop")
+
+
 class OpenAIChatCompletion(metaclass=ABCMeta):
 
     @abstractmethod
@@ -141,3 +205,30 @@ class OpenAIChatCompletion(metaclass=ABCMeta):
             config_name: str = "",  # 选择哪个预设的配置
     ) -> OpenAIChatChoice:
         pass
+
+    async def chat_completion_async(
+            self,
+            session_id: str,
+            chat_context: List[OpenAIChatMsg],
+            functions: List[OpenAIFuncSchema] | None = None,
+            function_call: str = "",
+            config_name: str = "",
+    ) -> OpenAIChatChoice:
+        """
+        异步接口. 默认在有界的线程池里调用同步接口.
+        """
+        return await to_thread(self.chat_completion, session_id, chat_context, functions, function_call, config_name)
+
+    def chat_completion_stream(
+            self,
+            session_id: str,
+            chat_context: List[OpenAIChatMsg],
+            functions: List[OpenAIFuncSchema] | None = None,
+            function_call: str = "",
+            config_name: str = "",
+    ) -> OpenAIChatStream:
+        """
+        流式接口. 默认等待完整的结果, 包装成只有一个增量的流.
+        """
+        choice = self.chat_completion(session_id, chat_context, functions, function_call, config_name)
+        return OpenAIChatStream.from_choice(choice)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import json
 import os
 from abc import abstractmethod, ABCMeta
-from typing import Dict, List, Callable, Type, Optional, AnyStr, Union, Iterator
+from typing import Dict, List, Callable, Type, Optional, AnyStr, Union, Iterator, Iterable
 
 import yaml
 from pydantic import BaseModel, Field
@@ -39,6 +39,9 @@ class AgentStageConfig(BaseModel):
     # 调用大模型时是否有指定的 config
     llm_config_name: str = ""
 
+    # 是否流式输出大模型的回复. 为空的话, 复用 AgentThinkConfig.stream
+    stream: bool | None = None
+
     # 启动时是否要使用一个 prompt 来引导对话. 让 Ghost 自己决定如何回应用户.
     # 这个 prompt 也会调用 function
     # 如果为空的话, 不会调用.
@@ -99,6 +102,9 @@ class AgentThinkConfig(BaseModel):
     # 调用大模型时是否有指定的 config
     llm_config_name: str = ""
 
+    # 流式输出大模型的回复. shell 不支持流式时仍然一次性输出.
+    stream: bool = False
+
     stages: List[AgentStageConfig] = Field(default_factory=list)
 
     def as_think_meta(self) -> Meta:
@@ -163,6 +169,15 @@ class AgentThought(Thought):
         ctx.send_at(self).text(message)
         self.data.add_ai_message(message, name)
 
+    def say_stream(self, ctx: Context, chunks: Iterable[str], name: str | None = None) -> str:
+        """
+        流式输出, 完整的回复记录到对话里.
+        """
+        message = ctx.send_at(self).stream_text(chunks)
+        if message:
+            self.data.add_ai_message(message, name)
+        return message
+
     @classmethod
     def data_wrapper(cls) -> Type[AgentThoughtData]:
         """
@@ -471,6 +486,8 @@ class AgentThink(Think, Stage):
         if not config.llm_config_name:
             # 默认每个 stage 使用的 llm config name 都和 think 的一致.
             config.llm_config_name = self.config.llm_config_name
+        if config.stream is None:
+            config.stream = self.config.stream
 
         if config.class_name:
             wrapper = import_module_value(config.class_name)
@@ -706,6 +723,22 @@ class AgentStage(BasicStage, metaclass=ABCMeta):
             func_schemas = None
             # default_function_call = ""
 
+        if self.config.stream:
+            stream = prompter.chat_completion_stream(
+                session_id,
+                chat_context,
+                func_schemas,
+                function_call="",
+                config_name=self.config.llm_config_name,
+            )
+            # 函数调用没有内容增量, 不会输出任何消息.
+            this.say_stream(ctx, stream)
+            choice = stream.choice()
+            called = choice.as_func_called()
+            if called is not None:
+                return self.call_llm_func(ctx, this, called)
+            return self.on_llm_text_resp(ctx, this)
+
         choice = prompter.chat_completion(
             session_id,
             chat_context,
@@ -44,6 +44,9 @@ class ConversationalConfig(BaseModel):
     # 默认的 debug 模式
     debug: bool = False
 
+    # 流式输出回复. shell 不支持流式时仍然一次性输出.
+    stream: bool = False
+
     reactions: Dict[str, str] = Field(default_factory=lambda: {})
 
     # 全局的对话说明.
@@ -124,12 +127,13 @@ class DefaultConversationalStage(BasicStage):
         self._record_user_info(this, text.content)
 
         #  prompt 如果发生错误, RuntimeTool.fire_event 不会保存.
-        resp = self._prompt(ctx, this)
-
-        # 删除超额的内容.
-
-        # 发送消息.
-        ctx.send_at(this).text(resp)
+        if self.config.stream:
+            # 流式输出时一边生成一边发送.
+            self._prompt_stream(ctx, this)
+        else:
+            resp = self._prompt(ctx, this)
+            # 发送消息.
+            ctx.send_at(this).text(resp)
 
         if self._beyond_max_turns(this):
             ctx.send_at(this).text(self.config.on_beyond_max_turns)
@@ -155,15 +159,7 @@ class DefaultConversationalStage(BasicStage):
         return len(this.data.context) > self.config.max_turns
 
     def _prompt(self, ctx: Context, this: ConversationalThought) -> str:
-        chats = [
-            OpenAIChatMsg(
-                role=OpenAIChatMsg.ROLE_SYSTEM,
-                content=this.data.instruction,
-            )
-        ]
-        for chat in this.data.context:
-            chats.append(chat)
-
+        chats = self._chat_context(this)
         llm = ctx.container.force_fetch(OpenAIChatCompletion)
         chat = llm.chat_completion(
             ctx.input.trace.session_id,
@@ -174,6 +170,29 @@ class DefaultConversationalStage(BasicStage):
         this.data.context.append(chat.as_chat_msg())
         return chat.get_content()
 
+    def _prompt_stream(self, ctx: Context, this: ConversationalThought) -> str:
+        llm = ctx.container.force_fetch(OpenAIChatCompletion)
+        stream = llm.chat_completion_stream(
+            ctx.input.trace.session_id,
+            self._chat_context(this),
+            config_name=self.config.llm_config,
+        )
+        content = ctx.send_at(this).stream_text(stream)
+        this.data.context.append(stream.choice().as_chat_msg())
+        return content
+
+    @classmethod
+    def _chat_context(cls, this: ConversationalThought) -> List[OpenAIChatMsg]:
+        chats = [
+            OpenAIChatMsg(
+                role=OpenAIChatMsg.ROLE_SYSTEM,
+                content=this.data.instruction,
+            )
+        ]
+        for chat in this.data.context:
+            chats.append(chat)
+        return chats
+
     @classmethod
     def _send_and_await(cls, ctx: Context, this: ConversationalThought, content: str) -> Operator | None:
         if content:
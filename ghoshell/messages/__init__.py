@@ -2,10 +2,10 @@ from ghoshell.messages.base import Payload, Message, Signal
 from ghoshell.messages.error import ErrMsg
 from ghoshell.messages.io import Input, Output, Trace, Batch
 from ghoshell.messages.tasked import Tasked
-from ghoshell.messages.text import Text
+from ghoshell.messages.text import Text, TextDelta
 
 __all__ = [
     "Input", "Output", "Trace", "Batch",
     "Payload", "Message",
-    "Text", "Tasked", "ErrMsg", "Signal",
+    "Text", "TextDelta", "Tasked", "ErrMsg", "Signal",
 ]
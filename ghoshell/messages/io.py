@@ -29,6 +29,9 @@ class Trace(BaseModel):
     # 对话的进程 id. 一个 session 可以同时运行多个进程. 默认为空.
     process_id: str = ""
 
+    # 父进程 id. 异步输入创建的子进程会记录它, 子进程结束时回调父进程.
+    parent_process_id: str = ""
+
     # 输入信息的主体
     # 通常是用户.
     subject_id: str = ""
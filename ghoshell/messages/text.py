@@ -6,9 +6,28 @@ class Text(Message):
 
     markdown: bool = False
     content: str
+    # 流式输出的完整结果. shell 已经按 TextDelta 渲染过同一个 stream_id 时, 不需要重复展示.
+    stream_id: str = ""
 
     def __str__(self):
         return self.content
 
     def is_empty(self) -> bool:
         return not self.content
+
+
+class TextDelta(Message):
+    """
+    流式输出的文本增量. 同一个 stream_id 的增量按 index 顺序拼接,
+    最后一个增量的 done 为 True. 完整的文本仍然会以 Text 消息输出.
+    增量立刻交给 shell, 不在输出的事务里: 这一轮失败回滚时已经展示的增量无法撤回.
+    生成中途失败时, 最后一个增量的 aborted 为 True, 不会再有完整的 Text.
+    """
+    KIND = "text_delta"
+
+    stream_id: str
+    index: int
+    delta: str = ""
+    markdown: bool = False
+    done: bool = False
+    aborted: bool = False
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from abc import ABCMeta, abstractmethod
-from typing import Dict, Iterator, TypeVar, Generic, Type
+from typing import Dict, Iterator, TypeVar, Generic, Type, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -56,6 +58,80 @@ class MetaDriver(Generic[MC], metaclass=ABCMeta):
         pass
 
 
+class MetaInstanceCache(Generic[MC]):
+    """
+    Meta 实例的缓存.
+    driver.from_meta 每次都要重新解析 config, 对于高频读取的 meta (比如 Think) 成本很高.
+    缓存以 meta id + meta 内容的 hash 作为 key, meta 内容变更后自然失效.
+    version 在每次 clear 时递增, 方便外部判断缓存是否被整体刷新过.
+    """
+
+    def __init__(self):
+        # mid => (content hash, instance)
+        self._instances: Dict[str, Tuple[str, MC]] = {}
+        # mid => (meta, content hash), 同一个 meta 对象不重复计算 hash.
+        self._hashes: Dict[str, Tuple[Meta, str]] = {}
+        self.version: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+
+    @classmethod
+    def meta_hash(cls, meta: Meta) -> str:
+        """
+        meta 内容的 hash.
+        """
+        content = json.dumps(meta.model_dump(), sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def _hash_of(self, meta: Meta) -> str:
+        cached = self._hashes.get(meta.id, None)
+        if cached is not None and cached[0] is meta:
+            return cached[1]
+        hashed = self.meta_hash(meta)
+        self._hashes[meta.id] = (meta, hashed)
+        return hashed
+
+    def get(self, meta: Meta) -> MC | None:
+        cached = self._instances.get(meta.id, None)
+        if cached is not None and cached[0] == self._hash_of(meta):
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        return None
+
+    def put(self, meta: Meta, instance: MC) -> None:
+        self._instances[meta.id] = (self._hash_of(meta), instance)
+
+    def forget(self, mid: str) -> None:
+        """
+        让单个 meta 的实例失效.
+        """
+        if mid in self._instances:
+            del self._instances[mid]
+            self.invalidations += 1
+        if mid in self._hashes:
+            del self._hashes[mid]
+
+    def clear(self) -> None:
+        """
+        让所有的实例失效.
+        """
+        self.invalidations += len(self._instances)
+        self._instances = {}
+        self._hashes = {}
+        self.version += 1
+
+    def stats(self) -> Dict:
+        return dict(
+            version=self.version,
+            size=len(self._instances),
+            hits=self.hits,
+            misses=self.misses,
+            invalidations=self.invalidations,
+        )
+
+
 class MetaRepository(Generic[MC], metaclass=ABCMeta):
 
     @abstractmethod
@@ -66,7 +142,21 @@ class MetaRepository(Generic[MC], metaclass=ABCMeta):
         meta = self.fetch_meta(mid)
         if meta is None:
             return None
-        return self.wrap_meta_instance(meta)
+        cache = self.meta_instance_cache()
+        if cache is None:
+            return self.wrap_meta_instance(meta)
+        instance = cache.get(meta)
+        if instance is None:
+            instance = self.wrap_meta_instance(meta)
+            cache.put(meta, instance)
+        return instance
+
+    def meta_instance_cache(self) -> MetaInstanceCache[MC] | None:
+        """
+        repository 可以提供实例缓存, 避免每次读取都重新 from_meta.
+        默认不缓存.
+        """
+        return None
 
     def wrap_meta_instance(self, meta: Meta) -> MC:
         driver = self.get_meta_driver(meta.kind)
@@ -2,7 +2,7 @@ from typing import List, ClassVar
 
 from ghoshell.container import Provider
 from ghoshell.framework.bootstrapper import FileLoggerBootstrapper, \
-    CommandFocusDriverBootstrapper, LLMToolsFocusDriverBootstrapper
+    CommandFocusDriverBootstrapper, LLMToolsFocusDriverBootstrapper, KeywordFocusDriverBootstrapper
 from ghoshell.framework.ghost import GhostKernel
 from ghoshell.llms import LLMTextCompletion, OpenAIChatCompletion
 from ghoshell.llms.openai import OpenAIBootstrapper
@@ -21,6 +21,7 @@ class MockGhost(GhostKernel):
         FileLoggerBootstrapper(),
         RegisterThinkDemosBootstrapper(),
         CommandFocusDriverBootstrapper(),
+        KeywordFocusDriverBootstrapper(),
         OpenAIBootstrapper(),
 
         # 使用 llm chat completion 实现的思维
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import time
-from typing import Dict, Type
+from typing import Dict, Type, List
 
 from ghoshell.container import Provider, Container, Contract
 from ghoshell.contracts import Cache
@@ -12,15 +12,32 @@ class MockCache(Cache):
     __strings = {}
     __hash_map = {}
     __overdue: Dict[str, int] = {}
+    # 锁当前的 token, 以及每个 key 发出过的最大 token.
+    __tokens: Dict[str, int] = {}
+    __fences: Dict[str, int] = {}
 
-    def lock(self, key: str, overdue: int = 0) -> bool:
+    def lock(self, key: str, overdue: int = 0) -> int:
         if key in self.__locker and not self.__is_overdue(key):
-            return False
+            return 0
 
         self.__locker.add(key)
         self.__set_overdue(key, overdue)
+        token = self.__fences.get(key, 0) + 1
+        self.__fences[key] = token
+        self.__tokens[key] = token
+        return token
+
+    def renew(self, key: str, token: int, overdue: int) -> bool:
+        if self.lock_token(key) != token:
+            return False
+        self.__set_overdue(key, overdue)
         return True
 
+    def lock_token(self, key: str) -> int:
+        if key not in self.__locker or self.__is_overdue(key):
+            return 0
+        return self.__tokens.get(key, 0)
+
     def __set_overdue(self, key: str, overdue: int) -> None:
         if overdue <= 0:
             self.__overdue[key] = overdue
@@ -36,19 +53,22 @@ class MockCache(Cache):
         now = int(time.time())
         return overdue < now
 
-    def unlock(self, key: str) -> bool:
+    def unlock(self, key: str, token: int = 0) -> bool:
+        if token and self.lock_token(key) != token:
+            return False
         if key in self.__locker:
             self.__locker.remove(key)
+            self.__tokens.pop(key, None)
             self.remove(key)
             return True
         return False
 
-    def set(self, key: str, val: str, exp: int = 0) -> bool:
+    def set(self, key: str, val: str | bytes, exp: int = 0) -> bool:
         self.__strings[key] = val
         self.__set_overdue(key, exp)
         return True
 
-    def get(self, key: str) -> str | None:
+    def get(self, key: str) -> str | bytes | None:
         if self.__is_overdue(key):
             self.remove(key)
             return None
@@ -60,15 +80,34 @@ class MockCache(Cache):
             return True
         return False
 
-    def set_member(self, key: str, member: str, value: str) -> bool:
+    def set_member(self, key: str, member: str, value: str | bytes) -> bool:
         if key not in self.__hash_map:
             self.__hash_map[key] = {}
         self.__hash_map[key][member] = value
         return True
 
-    def get_member(self, key: str, member: str) -> str | None:
+    def get_member(self, key: str, member: str) -> str | bytes | None:
         return self.__hash_map.get(key, {}).get(member, None)
 
+    def mget(self, *keys: str) -> List[str | bytes | None]:
+        return [self.get(key) for key in keys]
+
+    def mset(self, values: Dict[str, str | bytes], exp: int = 0) -> bool:
+        self.__strings.update(values)
+        for key in values:
+            self.__set_overdue(key, exp)
+        return True
+
+    def get_members(self, key: str, *members: str) -> Dict[str, str | bytes | None]:
+        data = self.__hash_map.get(key, {})
+        return {member: data.get(member, None) for member in members}
+
+    def set_members(self, key: str, values: Dict[str, str | bytes]) -> bool:
+        if key not in self.__hash_map:
+            self.__hash_map[key] = {}
+        self.__hash_map[key].update(values)
+        return True
+
     def remove_member(self, key: str, *members: str) -> int:
         count = 0
         if key in self.__hash_map:
@@ -1,21 +1,25 @@
 from __future__ import annotations
 
+import logging
 from logging import Logger
 from typing import Dict, Type
 
 from ghoshell.container import Provider, Container, Contract
+from ghoshell.framework.ghost.config import GhostConfig
 from ghoshell.framework.ghost.operators import ReceiveInputOperator
-from ghoshell.mocks.ghost_mock.bootstrappers import *
+from ghoshell.ghost import OperationKernel, Operator, Context
 
 
 class OperatorMock(OperationKernel):
 
-    def __init__(self, max_operators=10):
+    def __init__(self, max_operators=100):
         self.max_operators = max_operators
 
     def record(self, ctx: Context, op: Operator) -> None:
         logger = ctx.container.force_fetch(Logger)
-        logger.debug(f"run operator: {op}")
+        # operator 的描述很长, 只在需要输出 debug 日志时才生成.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("run operator: %s", op)
         return
 
     def save_records(self) -> None:
@@ -40,4 +44,7 @@ class MockOperationKernelProvider(Provider):
         return OperationKernel
 
     def factory(self, con: Container, params: Dict | None = None) -> Contract | None:
-        return OperatorMock()
+        config = con.fetch(GhostConfig)
+        if config is None:
+            return OperatorMock()
+        return OperatorMock(config.operator_max_steps)
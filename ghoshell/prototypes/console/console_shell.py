@@ -1,17 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 import uuid
-from typing import Optional, ClassVar, List
+from collections import OrderedDict
+from typing import Optional, ClassVar, List, Dict, Tuple
 
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.patch_stdout import patch_stdout
 from prompt_toolkit.shortcuts import PromptSession
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 
 from ghoshell.container import Container
 from ghoshell.container import Provider
+from ghoshell.framework.ghost.dispatcher import AsyncInputDispatcher
+from ghoshell.framework.ghost.streaming import OutputStreamer
 from ghoshell.framework.shell import ShellKernel
 from ghoshell.framework.shell import ShellOutputMdw, ShellInputMdw, ShellBootstrapper
 from ghoshell.ghost import Ghost
@@ -20,17 +25,30 @@ from ghoshell.messages import *
 
 class ConsoleShell(ShellKernel):
     KIND: ClassVar[str] = "console"
+    # 最多记录多少个渲染过的流.
+    max_streamed: ClassVar[int] = 64
 
     def __init__(self, container: Container, config_path: str, runtime_path: str):
-        # message_queue = ghost
-        ghost = container.force_fetch(Ghost)
         self._session_id = str(uuid.uuid4().hex)
         self._user_id = str(uuid.uuid4().hex)
         self._app = Console()
-        self._ghost = ghost
+        self._ghost: Ghost | None = None
         self._session: PromptSession | None = None
+        # 正在渲染的流式输出: stream_id => (live, 已收到的文本, 所属输入的 mid).
+        self._streams: Dict[str, Tuple[Live, List[str], str]] = {}
+        # 已经完整渲染过的流, 对应的 Text 不再重复输出.
+        # 这一轮失败时完整的 Text 不会到达, 所以只保留最近的 max_streamed 个.
+        self._streamed: OrderedDict[str, None] = OrderedDict()
+        self._stream_lock = threading.Lock()
         super().__init__(container, config_path, runtime_path)
 
+    @property
+    def ghost(self) -> Ghost:
+        # 延迟获取. 通过别的方式投递输入的子类 (比如 worker 池) 不需要本地的 ghost.
+        if self._ghost is None:
+            self._ghost = self._container.force_fetch(Ghost)
+        return self._ghost
+
     def get_bootstrapper(self) -> List[ShellBootstrapper]:
         return []
 
@@ -61,8 +79,72 @@ log:
 
     def run_as_app(self):
         self._welcome()
+        self._listen_async_outputs()
+        self._listen_stream_outputs()
         asyncio.run(self._main())
 
+    def _listen_async_outputs(self) -> None:
+        """
+        接收 ghost 在后台运行异步输入时产生的输出.
+        """
+        dispatcher = self.ghost.container.get(AsyncInputDispatcher)
+        if dispatcher is not None:
+            dispatcher.register_shell(self.kind(), self.output)
+
+    def _listen_stream_outputs(self) -> None:
+        """
+        接收 ghost 处理过程中的流式输出.
+        """
+        streamer = self.ghost.container.get(OutputStreamer)
+        if streamer is not None:
+            streamer.register_shell(self.kind(), self._on_stream)
+
+    def _on_stream(self, _output: Output) -> None:
+        delta = TextDelta.read(_output.payload)
+        if delta is None:
+            return
+        with self._stream_lock:
+            stream = self._streams.get(delta.stream_id, None)
+            if stream is None:
+                live = Live(console=self._app, refresh_per_second=12)
+                live.start()
+                stream = (live, [], _output.input_mid)
+                self._streams[delta.stream_id] = stream
+            live, parts, _ = stream
+            parts.append(delta.delta)
+            content = "".join(parts)
+            live.update(self._markdown_output(content) if delta.markdown else "\n\n" + content)
+            if delta.done:
+                live.stop()
+                del self._streams[delta.stream_id]
+                if not delta.aborted:
+                    self._streamed[delta.stream_id] = None
+                    if len(self._streamed) > self.max_streamed:
+                        self._streamed.popitem(last=False)
+
+    def _close_streams(self, input_mid: str) -> None:
+        """
+        ghost 处理完输入后, 它没有结束的流不会再有增量.
+        其它输入 (比如后台运行的异步输入) 的流不受影响.
+        """
+        with self._stream_lock:
+            for stream_id, (live, _, owner) in list(self._streams.items()):
+                if owner == input_mid:
+                    live.stop()
+                    del self._streams[stream_id]
+
+    def _pop_streamed(self, stream_id: str) -> bool:
+        """
+        流已经完整渲染过时返回 True.
+        """
+        if not stream_id:
+            return False
+        with self._stream_lock:
+            if stream_id not in self._streamed:
+                return False
+            del self._streamed[stream_id]
+            return True
+
     async def _main(self):
         with patch_stdout(raw=True):
             await self._prompt_loop()
@@ -73,12 +155,12 @@ log:
         self._session = session
         bindings = KeyBindings()
 
-        self.handle("")
+        await self.handle_async("")
         while True:
             try:
                 event = await session.prompt_async(multiline=False, key_bindings=bindings)
                 self._app.print(Markdown("\n----\n"))
-                self.handle(event)
+                await self.handle_async(event)
             except (EOFError, KeyboardInterrupt):
                 self._app.print(f"quit!!")
                 exit(0)
@@ -113,11 +195,15 @@ log:
             self._quit()
 
     def output(self, _output: Output, _input: Input) -> None:
+        self._close_streams(_input.mid)
         signal = Signal.read(_output.payload)
         if signal is not None:
             self._on_signal(signal)
             return
         text = Text.read(_output.payload)
+        if text is not None and self._pop_streamed(text.stream_id):
+            # 已经流式渲染过.
+            text = None
         if text is not None:
             if text.markdown:
                 self._app.print(self._markdown_output(text.content))
@@ -144,4 +230,7 @@ log:
         return Markdown("\n\n".join(result))
 
     def deliver(self, _input: Input) -> List[Output] | None:
-        return self._ghost.respond(_input)
+        return self.ghost.respond(_input)
+
+    async def deliver_async(self, _input: Input) -> List[Output] | None:
+        return await self.ghost.respond_async(_input)
@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import io
+import queue
+import re
 import threading
 import time
 import uuid
-from typing import Optional, List
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple, ClassVar
 from wave import Wave_read
 
 import speech_recognition as sr
@@ -18,11 +21,12 @@ from rich.console import Console
 from rich.markdown import Markdown
 
 from ghoshell.container import Provider
+from ghoshell.framework.ghost.streaming import OutputStreamer
 from ghoshell.framework.shell import ShellKernel
 from ghoshell.framework.shell import ShellOutputMdw, ShellInputMdw, ShellBootstrapper
 from ghoshell.ghost import Ghost
 from ghoshell.messages import Input, Output, Message
-from ghoshell.messages import Text, ErrMsg, Signal
+from ghoshell.messages import Text, TextDelta, ErrMsg, Signal
 from ghoshell.prototypes.playground.baidu_speech.adapter import BaiduSpeechAdapter, BaiduSpeechProvider
 from ghoshell.url import URL
 
@@ -36,11 +40,33 @@ class BaiduSpeechShellConfig(BaseModel):
     debug: bool = True
 
 
+# 句子的结束符, 流式输出时按句子合成语音.
+_SENTENCE_END = re.compile(r"[。！？；!?;\n]+|\.(?=\s)")
+
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    """
+    切分出完整的句子, 返回 (句子, 剩余的文本).
+    """
+    sentences = []
+    start = 0
+    for matched in _SENTENCE_END.finditer(buffer):
+        sentence = buffer[start:matched.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = matched.end()
+    return sentences, buffer[start:]
+
+
 class BaiduSpeechShell(ShellKernel):
     """
     Shell
     """
 
+    SHELL_KIND: ClassVar[str] = "audio_shell"
+    # 最多记录多少个播放过的流.
+    max_streamed: ClassVar[int] = 64
+
     def __init__(
             self,
             ghost: Ghost,
@@ -63,6 +89,13 @@ class BaiduSpeechShell(ShellKernel):
         self._is_running: bool = True
         # thread
         self._ghost_event_thread = threading.Thread(target=self._ghost_event_loop)
+        # 流式输出: stream_id => 还没有组成句子的文本.
+        self._streams: Dict[str, str] = {}
+        # 已经播放过的流. 这一轮失败时完整的 Text 不会到达, 所以只保留最近的 max_streamed 个.
+        self._streamed: OrderedDict[str, None] = OrderedDict()
+        # 按顺序合成并播放句子的队列. 合成下一句的同时不阻塞 ghost 生成.
+        self._speech_queue: queue.Queue[Optional[str]] = queue.Queue()
+        self._speech_thread = threading.Thread(target=self._speech_loop, daemon=True)
 
     def get_providers(self) -> List[Provider]:
         return [
@@ -93,6 +126,10 @@ class BaiduSpeechShell(ShellKernel):
         text = Text.read(_output.payload)
         if self._config.debug:
             self._console.print(_output.payload)
+        if text is not None and text.stream_id in self._streamed:
+            # 已经按句子播放过.
+            del self._streamed[text.stream_id]
+            text = None
         if text is not None:
             self._output_text(text)
 
@@ -107,6 +144,41 @@ class BaiduSpeechShell(ShellKernel):
         self._print_text(text)
         self._say(text)
 
+    def _on_stream(self, _output: Output) -> None:
+        """
+        流式输出时, 每凑齐一个句子就打印并合成语音. 首句的延迟只取决于第一个句子的生成时间.
+        """
+        delta = TextDelta.read(_output.payload)
+        if delta is None:
+            return
+        if delta.aborted:
+            # 生成中途失败, 丢弃还没有组成句子的文本.
+            self._streams.pop(delta.stream_id, None)
+            return
+        buffer = self._streams.get(delta.stream_id, "") + delta.delta
+        sentences, rest = split_sentences(buffer)
+        if delta.done:
+            if rest.strip():
+                sentences.append(rest.strip())
+            rest = ""
+            self._streams.pop(delta.stream_id, None)
+            self._streamed[delta.stream_id] = None
+            if len(self._streamed) > self.max_streamed:
+                self._streamed.popitem(last=False)
+        else:
+            self._streams[delta.stream_id] = rest
+        for sentence in sentences:
+            self._console.print(sentence)
+            self._speech_queue.put(sentence)
+
+    def _speech_loop(self) -> None:
+        # thread method
+        while True:
+            sentence = self._speech_queue.get()
+            if sentence is None:
+                return
+            self._say(Text(content=sentence))
+
     def _error_print(self, err: ErrMsg) -> None:
         self._markdown_print(f"""
 # error {err.errcode} occur
@@ -124,6 +196,7 @@ class BaiduSpeechShell(ShellKernel):
 
     def _quit(self, message: str):
         self._is_running = False
+        self._speech_queue.put(None)
         self._ghost_event_thread.join()
         self._console.print(message)
         exit(0)
@@ -148,7 +221,7 @@ class BaiduSpeechShell(ShellKernel):
             clone_id=self.session_id,
             session_id=self.session_id,
             shell_id=self.session_id,
-            shell_kind="audio_shell",
+            shell_kind=self.SHELL_KIND,
             subject_id=self.user_id,
         )
         return Input(
@@ -159,6 +232,10 @@ class BaiduSpeechShell(ShellKernel):
         )
 
     def run_as_app(self) -> None:
+        streamer = self._ghost.container.get(OutputStreamer)
+        if streamer is not None:
+            streamer.register_shell(self.SHELL_KIND, self._on_stream)
+        self._speech_thread.start()
         self._welcome()
         self.handle("")
         self._ghost_event_thread.start()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+import argparse
+import functools
+import os.path
+import sys
+from logging.config import dictConfig
+from typing import List
+
+import yaml
+
+from ghoshell.container import Container
+from ghoshell.framework.ghost.workers import GhostWorkerPool
+from ghoshell.ghost import Ghost
+from ghoshell.messages import Input, Output
+from ghoshell.prototypes.console import ConsoleShell
+from ghoshell.scripts.script_console import demo_ghost
+
+
+def worker_ghost(root_path: str) -> Ghost:
+    """
+    在 worker 进程里启动 demo ghost. 每个 worker 有自己的容器和 cache.
+    """
+    with open(root_path + "/configs/logging.yaml", "r", encoding="utf-8") as f:
+        dictConfig(yaml.safe_load(f))
+    container = Container()
+    ghost = demo_ghost(root_path, container)
+    ghost.boostrap()
+    container.set(Ghost, ghost)
+    return ghost
+
+
+class WorkerPoolConsoleShell(ConsoleShell):
+    """
+    通过 worker 池投递输入的 console shell.
+    """
+
+    def __init__(self, container: Container, config_path: str, runtime_path: str, pool: GhostWorkerPool):
+        self._pool = pool
+        super().__init__(container, config_path, runtime_path)
+
+    def _listen_async_outputs(self) -> None:
+        # 异步输入在 worker 进程里运行, 它们的输出暂时无法回到这个 shell.
+        pass
+
+    def _listen_stream_outputs(self) -> None:
+        # 流式输出同样发生在 worker 进程里, 只能收到完整的回复.
+        pass
+
+    def deliver(self, _input: Input) -> List[Output] | None:
+        return self._pool.respond(_input)
+
+    async def deliver_async(self, _input: Input) -> List[Output] | None:
+        return await self._pool.respond_async(_input)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="run ghoshell console shell with a pool of demo ghost workers")
+    parser.add_argument(
+        "--path", "-p",
+        nargs="?",
+        default="",
+        help="relative directory path that include config and runtime directories",
+        type=str,
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        default=0,
+        help="number of ghost worker processes, default is the cpu count",
+        type=int,
+    )
+    parsed = parser.parse_args(sys.argv[1:])
+    relative = str(parsed.path)
+
+    cwd = os.getcwd()
+    root_path = cwd.rstrip("/") + "/" + relative.lstrip("/")
+
+    pool = GhostWorkerPool(functools.partial(worker_ghost, root_path), workers=parsed.workers)
+    pool.start()
+    try:
+        config_path = "/".join([root_path, "configs", "shells/console"])
+        runtime_path = "/".join([root_path, "runtime"])
+        shell = WorkerPoolConsoleShell(Container(), config_path, runtime_path, pool)
+        shell.bootstrap().run_as_app()
+    finally:
+        pool.stop()
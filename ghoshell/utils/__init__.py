@@ -1,15 +1,28 @@
-from ghoshell.utils.debug import InstanceCount
+from ghoshell.utils.asyncs import to_thread, set_thread_pool_size, create_async_pipeline, adapt_sync_pipe
+from ghoshell.utils.asyncs import timed_async_pipe
+from ghoshell.utils.debug import InstanceCount, StatsCounter
 from ghoshell.utils.decorators import deprecated
 from ghoshell.utils.importing import import_module_value
-from ghoshell.utils.pipeline import create_pipeline
+from ghoshell.utils.lru import LRUCache
+from ghoshell.utils.pipeline import create_pipeline, timed_pipe, PIPE_TIMER
 
 __all__ = [
 
     "create_pipeline",
+    "create_async_pipeline",
+    "adapt_sync_pipe",
+    "timed_pipe",
+    "timed_async_pipe",
+    "PIPE_TIMER",
+    "to_thread",
+    "set_thread_pool_size",
 
     "deprecated",
 
     "import_module_value",
 
+    "LRUCache",
+
     "InstanceCount",
+    "StatsCounter",
 ]
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+R = TypeVar('R')
+PI = TypeVar('PI')
+PO = TypeVar('PO')
+
+ASYNC_PIPELINE = Callable[[PI], Awaitable[PO]]
+ASYNC_PIPE = Callable[[PI, ASYNC_PIPELINE], Awaitable[PO]]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_size: int = 16
+_executor_lock = threading.Lock()
+
+
+def set_thread_pool_size(size: int) -> None:
+    """
+    设置同步驱动使用的线程池大小. 已经创建的线程池会在处理完任务后关闭.
+    """
+    global _executor, _executor_size
+    with _executor_lock:
+        _executor_size = size
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_executor_size, thread_name_prefix="ghoshell-sync")
+    return _executor
+
+
+async def to_thread(func: Callable[..., R], *args, **kwargs) -> R:
+    """
+    在有界的线程池里运行同步方法, 不阻塞 event loop.
+    同步的 cache, LLM 等驱动都通过它适配成异步接口. 线程池的大小决定了同时阻塞的调用上限.
+    和 asyncio.to_thread 一样, 线程里继承当前的 contextvars (比如 tracer).
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+def create_async_pipeline(pipes: List[ASYNC_PIPE[PI, PO]], destination: ASYNC_PIPELINE[PI, PO]):
+    """
+    create_pipeline 的异步版本.
+    """
+
+    def wrapper(pipe: ASYNC_PIPE, next_caller: ASYNC_PIPELINE):
+        async def fn(req):
+            return await pipe(req, next_caller)
+
+        return fn
+
+    caller = destination
+    for p in reversed(pipes):
+        caller = wrapper(p, caller)
+    return caller
+
+
+def adapt_sync_pipe(pipe: Callable[[PI, Callable[[PI], PO]], PO]) -> ASYNC_PIPE[PI, PO]:
+    """
+    把同步的 pipe 适配到异步管道里.
+    同步的 pipe 在线程里运行, 它调用的 after 会回到 event loop 里执行.
+    注意在 after 返回之前会一直占用一个线程, 所以不使用有界的线程池, 避免嵌套时互相等待.
+    """
+
+    async def fn(req: PI, after: ASYNC_PIPELINE[PI, PO]) -> PO:
+        loop = asyncio.get_running_loop()
+
+        def sync_after(r: PI) -> PO:
+            return asyncio.run_coroutine_threadsafe(after(r), loop).result()
+
+        return await asyncio.to_thread(pipe, req, sync_after)
+
+    return fn
+
+
+def timed_async_pipe(
+        name: str,
+        pipe: ASYNC_PIPE[PI, PO],
+        timer: Callable[[str, float], None],
+) -> ASYNC_PIPE[PI, PO]:
+    """
+    timed_pipe 的异步版本. 统计的是 pipe 自身的墙钟耗时, 包括等待线程池的时间.
+    """
+
+    async def fn(req, after):
+        downstream = 0.0
+
+        async def timed_after(r):
+            nonlocal downstream
+            began = time.perf_counter()
+            try:
+                return await after(r)
+            finally:
+                downstream += time.perf_counter() - began
+
+        start = time.perf_counter()
+        try:
+            return await pipe(req, timed_after)
+        finally:
+            timer(name, time.perf_counter() - start - downstream)
+
+    return fn
@@ -1,3 +1,4 @@
+import threading
 from typing import ClassVar, Dict
 
 
@@ -16,5 +17,29 @@ class InstanceCount:
             cls.count[class_name] = count - 1
 
 
-
-
+class StatsCounter:
+    """
+    线程安全的计数器. 各个模块用它记录进程级别的统计, 方便观察.
+    """
+
+    def __init__(self, *names: str):
+        self._values: Dict[str, float] = {name: 0 for name in names}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, num: float = 1) -> None:
+        if not num:
+            return
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + num
+
+    def maximum(self, name: str, value: float) -> None:
+        """
+        记录出现过的最大值.
+        """
+        with self._lock:
+            if value > self._values.get(name, 0):
+                self._values[name] = value
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return self._values.copy()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+from ghoshell.utils.debug import StatsCounter
+
+# get 没有命中时的返回值, 用来区分缓存了 None 的情况.
+MISSING = object()
+
+
+class LRUCache:
+    """
+    带过期时间的 LRU 缓存, 线程安全.
+    ttl <= 0 表示不过期.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.counter = StatsCounter("hit", "miss", "expired", "evicted")
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                self.counter.incr("miss")
+                return default
+            expire_at, value = item
+            if expire_at and expire_at < time.monotonic():
+                del self._data[key]
+                self.counter.incr("expired")
+                self.counter.incr("miss")
+                return default
+            self._data.move_to_end(key)
+            self.counter.incr("hit")
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expire_at = time.monotonic() + self.ttl if self.ttl > 0 else 0
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.counter.incr("evicted")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,3 +1,4 @@
+import time
 from typing import Callable, List, TypeVar
 
 PI = TypeVar('PI')
@@ -6,6 +7,9 @@ PO = TypeVar('PO')
 PIPELINE = Callable[[PI], PO]
 PIPE = Callable[[PI, PIPELINE], PO]
 
+# pipe 的计时回调, 参数是 pipe 的名字和它自身的耗时 (秒, 不包含后续的 pipe).
+PIPE_TIMER = Callable[[str, float], None]
+
 
 def create_pipeline(pipes: List[PIPE[PI, PO]], destination: PIPELINE[PI, PO]):
     """
@@ -22,3 +26,28 @@ def create_pipeline(pipes: List[PIPE[PI, PO]], destination: PIPELINE[PI, PO]):
     for p in reversed(pipes):
         caller = wrapper(p, caller)
     return caller
+
+
+def timed_pipe(name: str, pipe: PIPE[PI, PO], timer: PIPE_TIMER) -> PIPE[PI, PO]:
+    """
+    给 pipe 加上计时. 只统计 pipe 自身的耗时, 扣除调用 after 的时间.
+    """
+
+    def fn(req, after):
+        downstream = 0.0
+
+        def timed_after(r):
+            nonlocal downstream
+            began = time.perf_counter()
+            try:
+                return after(r)
+            finally:
+                downstream += time.perf_counter() - began
+
+        start = time.perf_counter()
+        try:
+            return pipe(req, timed_after)
+        finally:
+            timer(name, time.perf_counter() - start - downstream)
+
+    return fn
@@ -0,0 +1,230 @@
+"""
+请求级别的 span 追踪.
+
+1. ghost 处理一个被采样的输入时创建 Tracer, 并通过 activate 设置成当前的 tracer.
+2. 中间件, 算子, stage 事件, session 读写, 焦点匹配, LLM 请求等位置用 span 记录耗时.
+   当前 tracer 保存在 contextvars 里, 线程池 (to_thread) 和 asyncio 的 task 都会继承它.
+3. 没有当前 tracer 时, span 返回一个共享的空对象, 开销只有一次 ContextVar 的读取.
+4. 结束后交给 TraceExporter 导出, 支持 chrome trace 的 json 文件和滚动的 jsonl 文件.
+"""
+from __future__ import annotations
+
+import functools
+import itertools
+import json
+import logging
+import os
+import time
+from abc import ABCMeta, abstractmethod
+from contextvars import ContextVar, Token
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+R = TypeVar('R')
+
+_current: ContextVar[Optional["Tracer"]] = ContextVar("ghoshell_tracer", default=None)
+
+
+class _NullSpan:
+    """
+    没有开启追踪时使用的 span.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("_tracer", "name", "cat", "args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self._start = 0.0
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self._tracer.record(self.name, self.cat, self._start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    一次请求的 span 记录. span 以 chrome trace 的 complete event ("ph": "X") 格式保存.
+    """
+
+    _seq = itertools.count(1)
+
+    def __init__(self, trace_id: str, **args: Any):
+        self.trace_id = trace_id
+        self.args = args
+        # chrome trace 里用 tid 区分不同的请求, 每个请求一行.
+        self.seq = next(self._seq)
+        self.events: List[Dict] = []
+        # perf_counter 的起点对齐到墙钟时间.
+        self._wall = time.time()
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, cat: str = "", **args: Any) -> Span:
+        return Span(self, name, cat, args)
+
+    def record(self, name: str, cat: str, start: float, end: float, args: Dict | None = None) -> None:
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": round((self._wall + start - self._origin) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": self.seq,
+            "args": args or {},
+        })
+
+    def dump(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "args": self.args,
+            "spans": self.events,
+        }
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current.get()
+
+
+def activate(tracer: Tracer) -> Token:
+    """
+    设置当前的 tracer, 返回的 token 用于 deactivate.
+    """
+    return _current.set(tracer)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+def span(name: str, cat: str = "", **args: Any):
+    """
+    在当前 tracer 上记录一个 span. 用法: with span("name", "cat"): ...
+    """
+    tracer = _current.get()
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, cat, **args)
+
+
+def traced(cat: str, name: str = "") -> Callable[[Callable[..., R]], Callable[..., R]]:
+    """
+    记录方法调用的 span. 默认使用方法的 qualname 作为名字.
+    """
+
+    def decorator(func: Callable[..., R]) -> Callable[..., R]:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> R:
+            tracer = _current.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, cat):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_pipe(name: str, pipe: Callable) -> Callable:
+    """
+    记录中间件 pipe 的 span, 包含后续的 pipe, 在 chrome trace 里表现为嵌套.
+    """
+
+    def fn(req, after):
+        with span(name, "middleware"):
+            return pipe(req, after)
+
+    return fn
+
+
+def traced_async_pipe(name: str, pipe: Callable) -> Callable:
+    async def fn(req, after):
+        with span(name, "middleware"):
+            return await pipe(req, after)
+
+    return fn
+
+
+def chrome_trace(*tracers: Tracer) -> Dict:
+    """
+    合并成 chrome://tracing 或者 perfetto 可以打开的 json.
+    """
+    events = []
+    for tracer in tracers:
+        events.append({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": tracer.seq,
+            "args": {"name": tracer.trace_id},
+        })
+        events.extend(tracer.events)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class TraceExporter(metaclass=ABCMeta):
+    """
+    导出一次请求的 span.
+    """
+
+    @abstractmethod
+    def export(self, tracer: Tracer) -> None:
+        pass
+
+
+class ChromeTraceExporter(TraceExporter):
+    """
+    每个请求保存成一个 chrome trace 的 json 文件.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, tracer: Tracer) -> None:
+        filename = os.path.join(self._directory, f"{tracer.trace_id}.json")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(chrome_trace(tracer), f, ensure_ascii=False)
+
+
+class JSONLTraceExporter(TraceExporter):
+    """
+    每个请求一行 json, 写入按大小滚动的文件.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._logger = logging.getLogger(f"ghoshell.tracing.{filename}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def export(self, tracer: Tracer) -> None:
+        self._logger.info(json.dumps(tracer.dump(), ensure_ascii=False))
@@ -0,0 +1,73 @@
+"""
+CommandFocusDriver 在注册 500 个命令时的匹配开销.
+legacy 模拟旧的实现: 每次匹配都重新包装 intention, 重新构建 argparse 的 parser.
+
+python -m tests.benchmarks.bench_command_driver
+"""
+from __future__ import annotations
+
+import timeit
+from typing import Callable, List
+
+from ghoshell.framework.intentions.command_intention import Command, CommandIntention, CommandFocusDriver
+from ghoshell.framework.intentions.command_intention import CompiledCommand
+from ghoshell.ghost import Intention
+
+COMMANDS = 500
+
+
+def new_commands(count: int) -> List[Intention]:
+    result = []
+    for i in range(count):
+        command = Command(
+            name=f"cmd_{i}",
+            desc=f"command {i}",
+            arg={"name": "first"},
+            opts=[{"name": "option", "short": "o", "nargs": "?", "default": "option"}],
+        )
+        # 上下文里的命令通常是从 process 里读出来的, 没有包装成 CommandIntention.
+        result.append(Intention(**command.to_intention().model_dump()))
+    return result
+
+
+def legacy_match(driver: CommandFocusDriver, text: str, metas: List[Intention]):
+    commands = driver.default_commands.copy()
+    for meta in metas:
+        commands.append(CommandIntention(**meta.model_dump()))
+    if text[0] != driver.prefix:
+        return None
+    named = {c.config.name: c for c in commands}
+    seps = text[1:].split(' ', 1)
+    matched = named.get(seps[0], None)
+    if matched is None:
+        return None
+    CompiledCommand(matched.config).parse("" if len(seps) < 2 else seps[1])
+    return matched
+
+
+def bench(name: str, func: Callable, number: int) -> float:
+    cost = timeit.timeit(func, number=number) / number * 1_000_000
+    print(f"  {name:<32} {cost:10.1f} us")
+    return cost
+
+
+def run() -> None:
+    metas = new_commands(COMMANDS)
+    driver = CommandFocusDriver()
+    driver.register_global_intentions(*[CommandIntention(**m.model_dump()) for m in metas])
+    cases = {
+        "plain text": "hello, how are you today?",
+        "command hit": f"/cmd_{COMMANDS - 1} foo -o bar",
+        "unknown command": "/not_exists foo",
+    }
+    print(f"{COMMANDS} commands")
+    for case, text in cases.items():
+        print(case)
+        legacy = bench("legacy", lambda: legacy_match(driver, text, metas), 50)
+        current = bench("context commands", lambda: driver.match_raw_text(text, *metas), 500)
+        bench("global commands (trie)", lambda: driver._match_text(text, (), driver._get_global_trie()), 5000)
+        print(f"  speedup x{legacy / current:.1f}")
+
+
+if __name__ == "__main__":
+    run()
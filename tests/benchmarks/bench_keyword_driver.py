@@ -0,0 +1,68 @@
+"""
+KeywordFocusDriver 在大量关键词时的匹配开销.
+legacy 模拟逐个关键词做子串查找的实现, 开销和关键词数量成正比.
+自动机的开销只和输入长度有关.
+
+python -m tests.benchmarks.bench_keyword_driver
+"""
+from __future__ import annotations
+
+import random
+import string
+import timeit
+from typing import Callable, List
+
+from ghoshell.framework.intentions import KeywordIntention, KeywordFocusDriver
+
+SIZES = [1_000, 10_000]
+TEXT_LENGTHS = [20, 200, 2000]
+
+
+def new_intentions(count: int) -> List[KeywordIntention]:
+    rand = random.Random(count)
+    result = []
+    for i in range(count):
+        word = "".join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(5, 12)))
+        result.append(KeywordIntention(config={"keywords": [f"{word}{i}"]}))
+    return result
+
+
+def new_text(length: int) -> str:
+    rand = random.Random(length)
+    return "".join(rand.choice(string.ascii_lowercase + " ") for _ in range(length))
+
+
+def legacy_match(intentions: List[KeywordIntention], text: str):
+    lowered = text.lower()
+    for intention in intentions:
+        for keyword in intention.config.keywords:
+            if keyword in lowered:
+                return intention
+    return None
+
+
+def bench(name: str, func: Callable, number: int) -> float:
+    cost = timeit.timeit(func, number=number) / number * 1_000_000
+    print(f"  {name:<32} {cost:10.1f} us")
+    return cost
+
+
+def run() -> None:
+    for size in SIZES:
+        intentions = new_intentions(size)
+        driver = KeywordFocusDriver()
+        print(f"{size} keywords")
+        bench("register (full build)", lambda: KeywordFocusDriver().register_global_intentions(*intentions), 3)
+        driver.register_global_intentions(*intentions)
+        extra = new_intentions(10)
+        bench("register 10 more (incremental)", lambda: driver.register_global_intentions(*extra), 20)
+        for length in TEXT_LENGTHS:
+            text = new_text(length)
+            print(f" input of {length} chars")
+            legacy = bench("legacy", lambda: legacy_match(intentions, text), 20)
+            current = bench("aho-corasick", lambda: driver.global_matcher.match(text), 200)
+            print(f"  speedup x{legacy / current:.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,63 @@
+"""
+比较每一轮 process 全量拷贝 task 和写时复制 (copy on write) 的内存分配.
+一轮对话通常只会修改少数几个 task.
+
+python -m tests.benchmarks.bench_process_round
+"""
+from __future__ import annotations
+
+import timeit
+import tracemalloc
+from typing import Callable, Tuple
+
+from ghoshell.ghost import Process
+
+from tests.benchmarks.bench_state_codec import new_process
+
+
+def full_copy_round(process: Process) -> Process:
+    # 原来 new_round 的实现, 每一轮都拷贝所有的 task.
+    return Process(
+        sid=process.sid,
+        pid=process.pid,
+        root=process.root,
+        current=process.current,
+        parent_id=process.parent_id,
+        round=process.round + 1,
+        tasks=[task.model_copy() for task in process.tasks],
+    )
+
+
+def cow_round(process: Process) -> Process:
+    return process.new_round()
+
+
+def one_request(new_round: Callable[[Process], Process], stored: Process, touched: int) -> None:
+    process = new_round(stored)
+    for ptr in process.tasks[:touched]:
+        task = process.get_task(ptr.tid)
+        task.url.stage = "changed"
+        process.store_task(task)
+
+
+def measure(func: Callable[[], None], number: int) -> Tuple[float, float]:
+    func()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cost = timeit.timeit(func, number=number) / number * 1_000_000
+    return peak / 1024, cost
+
+
+def run(sizes=(5, 20, 100), touched: int = 2, number: int = 200) -> None:
+    for size in sizes:
+        stored = new_process(size)
+        print(f"process with {size} tasks, {touched} tasks changed per round:")
+        for name, new_round in (("full copy", full_copy_round), ("copy on write", cow_round)):
+            peak, cost = measure(lambda: one_request(new_round, stored, touched), number)
+            print(f"  {name:<16} peak {peak:8.1f} KiB  {cost:8.1f} us")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,58 @@
+"""
+比较 json 与 binary codec 保存 / 读取 process 的开销.
+
+python -m tests.benchmarks.bench_state_codec
+"""
+from __future__ import annotations
+
+import timeit
+from typing import Callable, Dict
+
+from ghoshell.contracts import StateCodec
+from ghoshell.framework.ghost.codec import JSONStateCodec, BinaryStateCodec
+from ghoshell.ghost import Task, URL, Process, Attention, Intention, TaskStatus
+
+
+def new_process(count: int) -> Process:
+    process = Process.new_process("session_id", "process_id")
+    for i in range(count):
+        task = Task(
+            tid=f"tid_{i:08d}",
+            url=URL(think=f"ghost/thinks/think_{i % 5}", stage=f"stage_{i % 3}", args={"index": i}),
+            status=TaskStatus.WAITING,
+            priority=float(i % 2),
+            forwards=["step_1", "step_2"],
+            callbacks={f"tid_{(i + 1) % count:08d}"},
+            attentions=[Attention(
+                to=URL(think=f"ghost/thinks/think_{i % 5}", stage="on_command"),
+                reaction="on_command",
+                intentions=[Intention(kind="command", config={"name": f"/cmd_{i % 5}"})],
+            )],
+        )
+        process.store_task(task)
+    return process
+
+
+def bench(name: str, func: Callable, number: int) -> float:
+    cost = timeit.timeit(func, number=number) / number * 1_000_000
+    print(f"  {name:<28} {cost:10.1f} us")
+    return cost
+
+
+def run(codecs: Dict[str, StateCodec], sizes=(5, 20, 100), number: int = 200) -> None:
+    for size in sizes:
+        process = new_process(size)
+        print(f"process with {size} tasks:")
+        for name, codec in codecs.items():
+            data = process.model_dump()
+            encoded = codec.encode(data)
+            decoded = codec.decode(encoded)
+            print(f"  {name} size: {len(encoded)} bytes")
+            bench(f"{name} dump+encode", lambda: codec.encode(process.model_dump()), number)
+            bench(f"{name} decode+validate", lambda: Process(**codec.decode(encoded)), number)
+            bench(f"{name} decode+trusted", lambda: Process.load_trusted(codec.decode(encoded)), number)
+            assert Process.load_trusted(decoded).model_dump() == Process(**decoded).model_dump()
+
+
+if __name__ == "__main__":
+    run({"json": JSONStateCodec(), "binary": BinaryStateCodec()})
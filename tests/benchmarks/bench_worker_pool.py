@@ -0,0 +1,113 @@
+"""
+GhostWorkerPool 的吞吐量随 worker 数量的变化.
+stub ghost 每轮用真实的 ghost 内核读写 process (CPU), 再模拟一次 LLM 调用的等待 (I/O).
+
+python -m tests.benchmarks.bench_worker_pool
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+import uuid
+import warnings
+from typing import List
+
+from ghoshell.container import Container, Provider
+from ghoshell.framework.ghost import GhostKernel
+from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.workers import GhostWorkerPool
+from ghoshell.ghost import Context, Ghost, Task, URL
+from ghoshell.messages import Input, Text, Trace
+from ghoshell.mocks.providers import MockAPIRepositoryProvider, MockCacheProvider, MockThinkMetaDriverProvider
+
+# 模拟 LLM 调用的耗时.
+LLM_LATENCY = 0.02
+TASKS = 20
+
+
+class StubGhost(GhostKernel):
+    """
+    真实的 ghost 内核 (中间件, 加锁, runtime), 只替换掉运行算子的最后一环.
+    """
+
+    def get_contracts_providers(self) -> List[Provider]:
+        return [MockCacheProvider(), MockAPIRepositoryProvider(), MockThinkMetaDriverProvider()]
+
+    @staticmethod
+    def _store_tasks(ctx: Context) -> None:
+        runtime = ctx.runtime
+        process = runtime.current_process()
+        for i in range(TASKS):
+            task = process.get_task(f"task_{i}") or Task(tid=f"task_{i}", url=URL(think=f"think_{i}"))
+            task.url.args["round"] = process.round
+            runtime.store_task(task)
+
+    def _build_destination(self):
+        def destination(ctx: Context) -> Context:
+            self._store_tasks(ctx)
+            # stub llm
+            time.sleep(LLM_LATENCY)
+            ctx.send_at(None).text("ok")
+            return ctx
+
+        return destination
+
+    def _build_async_destination(self):
+        async def destination(ctx: Context) -> Context:
+            self._store_tasks(ctx)
+            # stub llm
+            await asyncio.sleep(LLM_LATENCY)
+            ctx.send_at(None).text("ok")
+            return ctx
+
+        return destination
+
+
+def stub_ghost() -> Ghost:
+    # 忽略 pydantic 对 task.priority 的序列化警告.
+    warnings.filterwarnings("ignore", category=UserWarning)
+    config = GhostConfig(root_url=URL(think="root"), process_max_tasks=50)
+    return StubGhost(Container(), config, "", "").boostrap()
+
+
+def new_input(session_id: str) -> Input:
+    return Input(
+        mid=uuid.uuid4().hex,
+        payload=Text(content="hello").as_payload(),
+        trace=Trace(clone_id="bench", session_id=session_id),
+    )
+
+
+def bench(workers: int, sessions: int = 64, rounds: int = 8) -> float:
+    pool = GhostWorkerPool(stub_ghost, workers=workers, concurrency=8).start()
+    try:
+        # 预热, 等所有的 worker 启动.
+        for future in [pool.submit(new_input(f"warmup_{i}")) for i in range(workers * 4)]:
+            future.result()
+        session_ids = [uuid.uuid4().hex for _ in range(sessions)]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # 同一个会话的输入是串行的, 不同的会话并发.
+            futures = [pool.submit(new_input(sid)) for sid in session_ids]
+            for future in futures:
+                future.result()
+        cost = time.perf_counter() - start
+    finally:
+        pool.stop()
+    return sessions * rounds / cost
+
+
+def run() -> None:
+    cores = multiprocessing.cpu_count()
+    sizes = sorted({1, 2, 4, cores})
+    print(f"cpu count {cores}, llm latency {LLM_LATENCY * 1000:.0f} ms, {TASKS} tasks per process")
+    base = None
+    for size in sizes:
+        throughput = bench(size)
+        base = base or throughput
+        print(f"  {size:>3} workers {throughput:10.1f} req/s  x{throughput / base:.2f}")
+
+
+if __name__ == "__main__":
+    run()
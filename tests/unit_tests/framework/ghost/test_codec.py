@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import uuid
+
+from ghoshell.framework.ghost.codec import BinaryStateCodec, JSONStateCodec
+from ghoshell.framework.ghost.runtime import RuntimeImpl
+from ghoshell.framework.ghost.session import SessionImpl
+from ghoshell.ghost import Task, URL, Process, Attention, Intention
+from ghoshell.mocks.providers.cache import MockCache
+
+
+def _new_process(count: int) -> Process:
+    process = Process.new_process("sid", "pid")
+    for i in range(count):
+        task = Task(
+            tid=f"task_{i}",
+            url=URL(think=f"think_{i % 3}", stage="stage", args={"i": i, "f": -1.5}),
+            callbacks={"task_0"},
+            attentions=[Attention(
+                to=URL(think="foo", stage="bar"),
+                intentions=[Intention(kind="command", config={"name": "/foo"}, target=URL(think="foo"))],
+                reaction="bar",
+            )],
+        )
+        process.store_task(task)
+    return process
+
+
+def test_binary_codec_round_trip():
+    codec = BinaryStateCodec()
+    data = _new_process(5).model_dump(mode="json")
+    encoded = codec.encode(data)
+    assert isinstance(encoded, bytes)
+    assert codec.decode(encoded) == data
+    # 比 json 更紧凑.
+    assert len(encoded) < len(JSONStateCodec().encode(data))
+    # 兼容 json 数据.
+    assert codec.decode(JSONStateCodec().encode(data)) == data
+    # 版本不一致视作数据丢失.
+    assert codec.decode(encoded[:2] + b"\xff" + encoded[3:]) is None
+
+
+def test_process_load_trusted():
+    process = _new_process(5)
+    data = BinaryStateCodec().decode(BinaryStateCodec().encode(process.model_dump()))
+    loaded = Process.load_trusted(data)
+    assert loaded.model_dump() == Process(**data).model_dump()
+    assert isinstance(loaded.tasks[0].callbacks, set)
+    assert loaded.tasks[0].attentions[0].intentions[0].target.think == "foo"
+
+
+def test_runtime_with_binary_codec():
+    cache = MockCache()
+    session_id = uuid.uuid4().hex
+    for delta in (True, False):
+        session = SessionImpl(cache, "clone", session_id, 60, codec=BinaryStateCodec())
+        runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30, delta, process_trusted_loading=True)
+        runtime.store_task(*_new_process(5).tasks)
+        runtime.finish()
+
+        session = SessionImpl(cache, "clone", session_id, 60, codec=BinaryStateCodec())
+        runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30, delta, process_trusted_loading=True)
+        assert len(runtime.current_process().tasks) == 5
+        session.clear_all()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from typing import List
+
+from ghoshell.container import Container, Provider
+from ghoshell.framework.ghost import GhostKernel
+from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.dispatcher import AsyncInputDispatcher
+from ghoshell.framework.ghost.mailbox import Mailbox
+from ghoshell.framework.ghost.runtime import RuntimeImpl
+from ghoshell.framework.ghost.session import SessionImpl
+from ghoshell.ghost import URL
+from ghoshell.messages import Input, Output, Text, Trace
+from ghoshell.mocks.providers import MockAPIRepositoryProvider, MockThinkMetaDriverProvider
+from ghoshell.mocks.providers.cache import MockCache, MockCacheProvider
+
+
+def _async_input(content: str, process_id: str, parent_process_id: str = "") -> Input:
+    return Input(
+        mid=uuid.uuid4().hex,
+        payload=Text(content=content).as_payload(),
+        trace=Trace(
+            clone_id="clone",
+            session_id="session",
+            shell_kind="test",
+            process_id=process_id,
+            parent_process_id=parent_process_id,
+        ),
+        is_async=True,
+    )
+
+
+class _StubGhost:
+    """
+    子进程运行结束时回调父进程, 模拟 operator 的行为.
+    """
+
+    def __init__(self):
+        self.dispatcher: AsyncInputDispatcher | None = None
+        self.handled: List[str] = []
+        self.lock = threading.Lock()
+
+    def respond(self, _input: Input) -> List[Output]:
+        text = Text.read(_input.payload)
+        with self.lock:
+            self.handled.append(text.content)
+        if _input.trace.parent_process_id:
+            callback = _async_input("callback", _input.trace.parent_process_id)
+            self.dispatcher.dispatch([callback])
+        _output = Output.new(uuid.uuid4().hex, _input)
+        Text(content=f"done {text.content}").join(_output.payload)
+        return [_output]
+
+
+def test_dispatcher_runs_sub_process_and_callback():
+    ghost = _StubGhost()
+    dispatcher = AsyncInputDispatcher(ghost, workers=2)
+    ghost.dispatcher = dispatcher
+    delivered: List[Output] = []
+    dispatcher.register_shell("test", lambda o, i: delivered.append(o))
+    try:
+        assert dispatcher.dispatch([_async_input("child", "child_pid", "parent_pid")]) == 1
+        dispatcher.join()
+    finally:
+        dispatcher.stop()
+
+    assert ghost.handled == ["child", "callback"]
+    contents = sorted(Text.read(o.payload).content for o in delivered)
+    assert contents == ["done callback", "done child"]
+    assert all(o.is_async for o in delivered)
+
+
+def test_runtime_runs_async_input_process():
+    session = SessionImpl(MockCache(), clone_id="clone", session_id=uuid.uuid4().hex, expire=60)
+    runtime = RuntimeImpl(
+        session, URL(think="root"), False, 20, 30,
+        process_id="child_pid",
+        parent_process_id="parent_pid",
+    )
+    assert runtime.current_process_id == "child_pid"
+    assert runtime.current_process().parent_id == "parent_pid"
+    # session 的当前进程不受影响.
+    assert session.current_process_id() != "child_pid"
+
+
+class _Kernel(GhostKernel):
+    """
+    真实的中间件和加锁, 只替换掉运行算子的最后一环.
+    """
+
+    def __init__(self, config: GhostConfig):
+        super().__init__(Container(), config, "", "")
+        self.handled: List[str] = []
+
+    def get_contracts_providers(self) -> List[Provider]:
+        return [MockCacheProvider(), MockAPIRepositoryProvider(), MockThinkMetaDriverProvider()]
+
+    def _build_destination(self):
+        def destination(ctx):
+            text = ctx.read(Text)
+            self.handled.append(text.content)
+            ctx.send_at(None).text(f"done {text.content}")
+            return ctx
+
+        return destination
+
+
+def _lock_parent(session_id: str) -> RuntimeImpl:
+    session = SessionImpl(MockCache(), clone_id="clone", session_id=session_id, expire=60)
+    runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30, process_id="parent_pid")
+    assert runtime.lock_process("parent_pid")
+    return runtime
+
+
+def _callback(session_id: str) -> Input:
+    _input = _async_input("callback", "parent_pid")
+    _input.trace.session_id = session_id
+    return _input
+
+
+def test_callback_waits_for_busy_parent():
+    kernel = _Kernel(GhostConfig(root_url=URL(think="root")))
+    kernel.boostrap()
+    dispatcher = kernel.container.force_fetch(AsyncInputDispatcher)
+    delivered: List[Output] = []
+    dispatcher.register_shell("test", lambda o, i: delivered.append(o))
+    session_id = uuid.uuid4().hex
+    # 父进程正在处理别的输入.
+    holder = _lock_parent(session_id)
+    queued = Mailbox.counter.stats().get("queued", 0)
+    try:
+        dispatcher.dispatch([_callback(session_id)])
+        # 回调在信箱里排队, 而不是回复 on_busy.
+        while Mailbox.counter.stats().get("queued", 0) == queued and not delivered:
+            threading.Event().wait(0.01)
+        assert delivered == []
+        assert kernel.handled == []
+        holder.unlock_process("parent_pid")
+        Mailbox.notify("parent_pid")
+        dispatcher.join()
+    finally:
+        dispatcher.stop()
+
+    assert kernel.handled == ["callback"]
+    assert [Text.read(o.payload).content for o in delivered] == ["done callback"]
+
+
+def test_busy_callback_is_retried_not_answered():
+    config = GhostConfig(
+        root_url=URL(think="root"),
+        async_input_lock_timeout=0,
+        async_input_retries=2,
+        async_input_retry_backoff=0,
+    )
+    kernel = _Kernel(config)
+    kernel.boostrap()
+    dispatcher = kernel.container.force_fetch(AsyncInputDispatcher)
+    delivered: List[Output] = []
+    dispatcher.register_shell("test", lambda o, i: delivered.append(o))
+    session_id = uuid.uuid4().hex
+    holder = _lock_parent(session_id)
+    retried = AsyncInputDispatcher.counter.stats()["retried"]
+    try:
+        dispatcher.dispatch([_callback(session_id)])
+        dispatcher.join()
+    finally:
+        dispatcher.stop()
+        holder.unlock_process("parent_pid")
+
+    # 重试耗尽后丢弃, 不会把 on_busy 当作回调的结果发给 shell.
+    assert AsyncInputDispatcher.counter.stats()["retried"] - retried == 2
+    assert kernel.handled == []
+    assert delivered == []
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, List, Optional
+
+from ghoshell.framework.ghost.focus import FocusImpl
+from ghoshell.ghost import FocusDriver, Context, Intention
+
+
+class _Driver(FocusDriver):
+    """
+    开始匹配时设置 started, 有 wait_for 时等待它之后才返回.
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            hit: bool,
+            cost: int = 0,
+            timeout: float = 0,
+            wait_for: threading.Event | None = None,
+    ):
+        self._kind = kind
+        self._hit = hit
+        self._cost = cost
+        self._timeout = timeout
+        self.wait_for = wait_for
+        self.started = threading.Event()
+        # wait_for 是否在等待时间内被设置.
+        self.waited: bool | None = None
+        self.called = 0
+
+    def kind(self) -> str:
+        return self._kind
+
+    def cost(self) -> int:
+        return self._cost
+
+    def timeout(self) -> float:
+        return self._timeout
+
+    def match(self, ctx: Context, *metas: Intention) -> Optional[Intention]:
+        return self.wildcard_match(ctx)
+
+    def prepare_match(self, ctx: Context, *metas: Intention) -> Optional[Callable[[], Optional[Intention]]]:
+        return self.prepare_wildcard_match(ctx)
+
+    def register_global_intentions(self, *intentions: Intention) -> None:
+        pass
+
+    def wildcard_match(self, ctx: Context) -> Optional[Intention]:
+        return self._run()
+
+    def prepare_wildcard_match(self, ctx: Context) -> Optional[Callable[[], Optional[Intention]]]:
+        return self._run
+
+    def _run(self) -> Optional[Intention]:
+        self.called += 1
+        self.started.set()
+        if self.wait_for is not None:
+            self.waited = self.wait_for.wait(5)
+        if self._hit:
+            return Intention(kind=self._kind, config={})
+        return None
+
+
+def test_focus_concurrent_fallthrough():
+    llm = _Driver("llm", True, cost=100)
+    # 便宜的驱动运行时, 开销大的驱动已经在线程池里开始了.
+    cheap = _Driver("command", False, wait_for=llm.started)
+    focus = FocusImpl(cheap, llm, concurrent=True)
+    matched = focus.global_match(None)
+    assert cheap.waited
+    assert matched.kind == "llm"
+    focus.destroy()
+
+
+def test_focus_concurrent_priority():
+    release = threading.Event()
+    llm = _Driver("llm", True, cost=100, wait_for=release)
+    cheap = _Driver("command", True)
+    focus = FocusImpl(cheap, llm, concurrent=True)
+    before = FocusImpl.counter.stats()
+    # 优先级高的驱动命中时, 不等待开销大的驱动.
+    matched = focus.match_grouped(None, {
+        "command": [Intention(kind="command", config={})],
+        "llm": [Intention(kind="llm", config={})],
+    })
+    assert matched.kind == "command"
+    # 返回时开销大的驱动仍然在等待.
+    assert llm.waited is None
+    stats = FocusImpl.counter.stats()
+    assert stats["cancelled"] + stats["ignored"] == before["cancelled"] + before["ignored"] + 1
+    release.set()
+    focus.destroy()
+
+
+def test_focus_concurrent_timeout():
+    release = threading.Event()
+    slow = _Driver("llm", True, cost=100, timeout=0.05, wait_for=release)
+    fallback = _Driver("fallback", True)
+    focus = FocusImpl(slow, fallback, concurrent=True)
+    timeout = FocusImpl.counter.stats()["timeout"]
+    # 超时视为没有命中, 交给后面的驱动.
+    assert focus.global_match(None).kind == "fallback"
+    assert slow.waited is None
+    assert FocusImpl.counter.stats()["timeout"] == timeout + 1
+    release.set()
+    focus.destroy()
+
+
+class _Ctx:
+    """
+    记录读取 ctx 的线程.
+    """
+
+    def __init__(self):
+        self.threads: List[int] = []
+
+    def read(self, _):
+        self.threads.append(threading.get_ident())
+        return "hello"
+
+
+class _CtxDriver(FocusDriver):
+
+    def __init__(self, kind: str, cost: int, prepared: bool):
+        self._kind = kind
+        self._cost = cost
+        self._prepared = prepared
+        self.threads: List[int] = []
+
+    def kind(self) -> str:
+        return self._kind
+
+    def cost(self) -> int:
+        return self._cost
+
+    def match(self, ctx: Context, *metas: Intention) -> Optional[Intention]:
+        return self.wildcard_match(ctx)
+
+    def register_global_intentions(self, *intentions: Intention) -> None:
+        pass
+
+    def wildcard_match(self, ctx: Context) -> Optional[Intention]:
+        ctx.read(None)
+        self.threads.append(threading.get_ident())
+        return None
+
+    def prepare_wildcard_match(self, ctx: Context) -> Optional[Callable[[], Optional[Intention]]]:
+        if not self._prepared:
+            return None
+        ctx.read(None)
+
+        def task() -> Optional[Intention]:
+            self.threads.append(threading.get_ident())
+            return None
+
+        return task
+
+
+def test_focus_concurrent_reads_ctx_on_calling_thread():
+    prepared = _CtxDriver("llm", 100, True)
+    unprepared = _CtxDriver("embedding", 100, False)
+    focus = FocusImpl(prepared, unprepared, concurrent=True)
+    ctx = _Ctx()
+    assert focus.global_match(ctx) is None
+    focus.destroy()
+
+    current = threading.get_ident()
+    # ctx 只在调用线程里读取.
+    assert ctx.threads == [current, current]
+    # 支持 prepare 的驱动在线程池里运行, 不支持的在调用线程里运行.
+    assert prepared.threads != [current]
+    assert unprepared.threads == [current]
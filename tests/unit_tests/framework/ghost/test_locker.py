@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+
+import pytest
+
+from ghoshell.framework.ghost.locker import Lease, LeaseKeeper, ProcessLocker
+from ghoshell.framework.ghost.runtime import RuntimeImpl
+from ghoshell.framework.ghost.session import SessionImpl
+from ghoshell.ghost import LockLostError, Task, URL
+from ghoshell.mocks.providers.cache import MockCache
+
+
+def _new_runtime(session_id: str, overdue: int, renewal: bool) -> RuntimeImpl:
+    session = SessionImpl(MockCache(), clone_id="clone", session_id=session_id, expire=60)
+    return RuntimeImpl(session, URL(think="root"), False, 20, overdue, process_lock_renewal=renewal)
+
+
+def test_stale_fencing_token_rejects_saving():
+    session_id = uuid.uuid4().hex
+    _new_runtime(session_id, 30, False).finish()
+
+    first = _new_runtime(session_id, 30, False)
+    pid = first.current_process_id
+    assert first.lock_process(pid)
+    key = f"ghoshell:session:{session_id}:locker:process_locker:{pid}"
+    token = MockCache().lock_token(key)
+    assert token > 0
+
+    # 模拟锁过期之后, 另一个 worker 拿到了锁.
+    MockCache().unlock(key)
+    second = _new_runtime(session_id, 30, False)
+    assert second.lock_process(pid)
+    assert MockCache().lock_token(key) > token
+
+    before = ProcessLocker.counter.stats()
+    first.store_task(Task(tid="stale", url=URL(think="stale")))
+    with pytest.raises(LockLostError) as e:
+        first.finish()
+    assert pid in e.value.message
+    assert ProcessLocker.counter.stats()["rejected"] - before["rejected"] == 1
+    # 旧的 token 不能释放别人的锁.
+    assert not first.unlock_process(pid)
+    assert MockCache().lock_token(key) > token
+
+    second.store_task(Task(tid="fresh", url=URL(think="fresh")))
+    second.finish()
+    assert second.unlock_process(pid)
+
+    loaded = _new_runtime(session_id, 30, False).current_process()
+    assert loaded.get_task("stale") is None
+    assert loaded.get_task("fresh") is not None
+
+
+def test_lock_lease_renewal():
+    session_id = uuid.uuid4().hex
+    runtime = _new_runtime(session_id, 1, True)
+    pid = runtime.current_process_id
+    before = ProcessLocker.counter.stats()
+    assert runtime.lock_process(pid)
+    time.sleep(0.5)
+    runtime.unlock_process(pid)
+    stats = ProcessLocker.counter.stats()
+    assert stats["renewed"] - before["renewed"] >= 1
+    assert stats["lost"] == before["lost"]
+    assert stats["hold_max_ms"] >= 500
+
+
+class _RenewSession:
+
+    def __init__(self, broken: bool):
+        self.broken = broken
+        self.renewed = threading.Event()
+
+    def renew_lock(self, key: str, token: int, overdue: int) -> bool:
+        self.renewed.set()
+        if self.broken:
+            raise ConnectionError("cache is down")
+        return True
+
+
+def test_lease_keeper_survives_renew_error():
+    broken = _RenewSession(True)
+    healthy = _RenewSession(False)
+    bad_lease = Lease(broken, "broken", 1, 0.03)
+    good_lease = Lease(healthy, "healthy", 1, 0.03)
+    LeaseKeeper.keep(bad_lease)
+    LeaseKeeper.keep(good_lease)
+    try:
+        assert broken.renewed.wait(5)
+        # 出错之后守护线程仍然在为其它的锁续约.
+        healthy.renewed.clear()
+        assert healthy.renewed.wait(5)
+    finally:
+        LeaseKeeper.release(good_lease)
+    assert bad_lease.lost
+    assert bad_lease not in LeaseKeeper._leases
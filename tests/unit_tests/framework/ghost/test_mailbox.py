@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Dict
+
+import pytest
+
+from ghoshell.framework.ghost.mailbox import Mailbox
+from ghoshell.framework.ghost.runtime import RuntimeImpl
+from ghoshell.framework.ghost.session import SessionImpl
+from ghoshell.ghost import BusyError, URL
+from ghoshell.messages import Input, Text, Trace
+from ghoshell.mocks.providers.cache import MockCache
+from ghoshell.utils import set_thread_pool_size, to_thread
+
+
+class _Ctx:
+
+    def __init__(self, session_id: str, content: str):
+        session = SessionImpl(MockCache(), clone_id="clone", session_id=session_id, expire=60)
+        self.runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30)
+        self.input = Input(
+            mid=uuid.uuid4().hex,
+            payload=Text(content=content).as_payload(),
+            trace=Trace(clone_id="clone", session_id=session_id),
+        )
+
+    def read(self, expect):
+        return expect.read(self.input.payload)
+
+    def reset_input(self, inpt: Input) -> None:
+        self.input = inpt
+
+
+def _wait_for_queue(mailbox: Mailbox, depth: int) -> None:
+    for _ in range(100):
+        if len(mailbox.queue) == depth:
+            return
+        time.sleep(0.01)
+    raise AssertionError("queue not ready")
+
+
+def test_mailbox_coalesce_queued_texts():
+    session_id = uuid.uuid4().hex
+    _Ctx(session_id, "init").runtime.finish()
+    holder = _Ctx(session_id, "first")
+    process_id = holder.runtime.current_process_id
+    assert holder.runtime.lock_process(process_id)
+
+    mailbox = Mailbox.get(process_id)
+    waiters = [_Ctx(session_id, content) for content in ("second", "third", "fourth")]
+    results: Dict[str, bool] = {}
+    assert all(ctx.runtime.current_process_id == process_id for ctx in waiters)
+    threads = []
+    for i, ctx in enumerate(waiters):
+        # 和 ProcessLockerMiddleware 一样, 先尝试加锁.
+        assert not ctx.runtime.lock_process(process_id)
+
+        def wait(c=ctx):
+            results[c.input.mid] = mailbox.wait(c, timeout=2, max_depth=5, coalesce=True)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        threads.append(thread)
+        _wait_for_queue(mailbox, i + 1)
+
+    holder.runtime.unlock_process(process_id)
+    Mailbox.notify(process_id)
+    for thread in threads:
+        thread.join()
+
+    # 第一个等待的输入拿到锁, 合并了后面的文本.
+    assert results[waiters[0].input.mid] is True
+    assert waiters[0].read(Text).content == "second\nthird\nfourth"
+    assert results[waiters[1].input.mid] is False
+    assert results[waiters[2].input.mid] is False
+    # 没拿到锁的 runtime 不会保存 process.
+    assert waiters[1].runtime._locked[process_id] is False
+    waiters[0].runtime.unlock_process(process_id)
+
+
+def test_mailbox_bounded():
+    session_id = uuid.uuid4().hex
+    holder = _Ctx(session_id, "first")
+    process_id = holder.runtime.current_process_id
+    assert holder.runtime.lock_process(process_id)
+
+    mailbox = Mailbox.get(process_id)
+    before = Mailbox.counter.stats()
+    with pytest.raises(BusyError):
+        mailbox.wait(_Ctx(session_id, "second"), timeout=0.1, max_depth=5, coalesce=True)
+    with pytest.raises(BusyError):
+        mailbox.wait(_Ctx(session_id, "third"), timeout=0.1, max_depth=0, coalesce=True)
+    stats = Mailbox.counter.stats()
+    assert stats["timeout"] - before["timeout"] == 1
+    assert stats["rejected"] - before["rejected"] == 1
+    holder.runtime.unlock_process(process_id)
+
+
+def test_mailbox_deregistered_before_wait():
+    session_id = uuid.uuid4().hex
+    _Ctx(session_id, "init").runtime.finish()
+    holder = _Ctx(session_id, "first")
+    process_id = holder.runtime.current_process_id
+    assert holder.runtime.lock_process(process_id)
+
+    # 取到信箱之后, 别的线程清空队列注销了信箱, 第三个输入拿到了新的信箱.
+    stale = Mailbox.get(process_id)
+    with stale.condition:
+        stale._release()
+    fresh = Mailbox.get(process_id)
+    assert fresh is not stale
+
+    waiters = [_Ctx(session_id, content) for content in ("second", "third")]
+    results: Dict[str, bool] = {}
+    threads = []
+    for i, (mailbox, ctx) in enumerate(zip((fresh, stale), waiters)):
+        def wait(m=mailbox, c=ctx):
+            results[c.input.mid] = m.wait(c, timeout=2, max_depth=5, coalesce=False)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        threads.append(thread)
+        # 两个输入排在同一个队列里.
+        _wait_for_queue(fresh, i + 1)
+    assert len(stale.queue) == 0
+
+    holder.runtime.unlock_process(process_id)
+    Mailbox.notify(process_id)
+    threads[0].join()
+    assert results[waiters[0].input.mid] is True
+    waiters[0].runtime.unlock_process(process_id)
+    Mailbox.notify(process_id)
+    threads[1].join()
+    assert results[waiters[1].input.mid] is True
+    waiters[1].runtime.unlock_process(process_id)
+
+
+def test_mailbox_wait_async_holds_no_thread():
+    session_id = uuid.uuid4().hex
+    holder = _Ctx(session_id, "first")
+    process_id = holder.runtime.current_process_id
+    assert holder.runtime.lock_process(process_id)
+    mailbox = Mailbox.get(process_id)
+    waiters = [_Ctx(session_id, content) for content in ("second", "third", "fourth")]
+
+    async def main():
+        tasks = [
+            asyncio.ensure_future(mailbox.wait_async(ctx, timeout=2, max_depth=5, coalesce=False))
+            for ctx in waiters
+        ]
+        await asyncio.sleep(0.1)
+        assert len(mailbox.queue) == 3
+        # 排队的输入不占用线程, 锁的持有者仍然可以在线程池里释放锁.
+        await asyncio.wait_for(to_thread(holder.runtime.unlock_process, process_id), 1)
+        assert await asyncio.wait_for(tasks[0], 1) is True
+        for task in tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*tasks[1:], return_exceptions=True)
+
+    set_thread_pool_size(1)
+    try:
+        asyncio.run(main())
+    finally:
+        set_thread_pool_size(16)
+    assert len(mailbox.queue) == 0
+    waiters[0].runtime.unlock_process(process_id)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from ghoshell.container import Container
+from ghoshell.framework.ghost import GhostKernel
+from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.middleware import CtxMiddleware, CtxPipe
+from ghoshell.ghost import Ghost, URL
+
+
+class _CountMiddleware(CtxMiddleware):
+
+    def __init__(self, built: Dict[str, int], tag: str):
+        self.built = built
+        self.tag = tag
+
+    def name(self) -> str:
+        return self.tag
+
+    def new(self, ghost: Ghost) -> CtxPipe:
+        self.built[self.tag] = self.built.get(self.tag, 0) + 1
+
+        def pipe(ctx, after):
+            ctx.append(self.tag)
+            return after(ctx)
+
+        return pipe
+
+
+class _StubKernel(GhostKernel):
+
+    def __init__(self, built: Dict[str, int]):
+        self.built = built
+        config = GhostConfig(root_url=URL(think="root"))
+        super().__init__(Container(), config, "", "")
+
+    def get_context_middleware(self) -> List[CtxMiddleware]:
+        return [_CountMiddleware(self.built, "first")]
+
+    def _build_destination(self):
+        return lambda ctx: ctx
+
+
+def test_pipeline_is_compiled_once():
+    built = {}
+    kernel = _StubKernel(built)
+    for _ in range(3):
+        assert kernel._build_pipeline()([]) == ["first"]
+    assert built == {"first": 1}
+
+    # 追加中间件之后重新编译.
+    kernel.add_context_middleware(_CountMiddleware(built, "second"))
+    for _ in range(3):
+        assert kernel._build_pipeline()([]) == ["first", "second"]
+    assert built == {"first": 2, "second": 1}
+
+
+def test_pipe_timer():
+    kernel = _StubKernel({})
+    timings = []
+    kernel.set_pipe_timer(lambda name, cost: timings.append(name))
+    kernel._build_pipeline()([])
+    assert timings == ["first"]
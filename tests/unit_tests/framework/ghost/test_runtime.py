@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import uuid
+
+from ghoshell.framework.ghost.gc import ProcessGC
+from ghoshell.framework.ghost.runtime import RuntimeImpl
+from ghoshell.framework.ghost.session import SessionImpl
+from typing import Dict
+
+from ghoshell.ghost import Task, URL
+from ghoshell.mocks.providers.cache import MockCache
+
+
+class _CountingCache(MockCache):
+
+    def __init__(self):
+        self.written_members = []
+        self.calls = 0
+
+    def set_member(self, key: str, member: str, value: str) -> bool:
+        self.written_members.append(member)
+        self.calls += 1
+        return super().set_member(key, member, value)
+
+    def set_members(self, key: str, values: Dict) -> bool:
+        self.written_members.extend(values.keys())
+        self.calls += 1
+        return super().set_members(key, values)
+
+    def set(self, key: str, val: str, exp: int = 0) -> bool:
+        self.calls += 1
+        return super().set(key, val, exp)
+
+    def remove_member(self, key: str, *members: str) -> int:
+        self.calls += 1
+        return super().remove_member(key, *members)
+
+
+def _new_runtime(cache: _CountingCache, session_id: str, delta: bool) -> RuntimeImpl:
+    session = SessionImpl(cache, clone_id="clone", session_id=session_id, expire=60)
+    return RuntimeImpl(session, URL(think="root"), False, 20, 30, process_delta_saving=delta)
+
+
+def test_runtime_delta_saving():
+    cache = _CountingCache()
+    session_id = uuid.uuid4().hex
+
+    runtime = _new_runtime(cache, session_id, True)
+    cache.written_members = []
+    tasks = [Task(tid=f"task_{i}", url=URL(think=f"think_{i}"), attentions=[]) for i in range(20)]
+    runtime.store_task(*tasks)
+    runtime.finish()
+    # 第一轮完整保存: 20 个 task + header + current_process_id
+    assert len(cache.written_members) == 22
+
+    # 第二轮只变更一个 task.
+    cache.written_members = []
+    runtime = _new_runtime(cache, session_id, True)
+    process = runtime.current_process()
+    assert len(process.tasks) == 20
+    task = process.get_task("task_3")
+    task.url.stage = "changed"
+    runtime.store_task(task)
+    runtime.finish()
+    assert len(cache.written_members) == 2
+
+    # 读取结果是一致的.
+    runtime = _new_runtime(cache, session_id, True)
+    process = runtime.current_process()
+    assert process.tasks[0].tid == "task_3"
+    assert process.tasks[0].url.stage == "changed"
+    assert len(process.tasks) == 20
+
+
+def test_runtime_delta_saving_reads_full_saving():
+    cache = _CountingCache()
+    session_id = uuid.uuid4().hex
+
+    runtime = _new_runtime(cache, session_id, False)
+    runtime.store_task(Task(tid="a", url=URL(think="a")))
+    runtime.finish()
+
+    runtime = _new_runtime(cache, session_id, True)
+    process = runtime.current_process()
+    assert process.root == "a"
+    runtime.finish()
+
+    runtime = _new_runtime(cache, session_id, True)
+    assert runtime.current_process().get_task("a") is not None
+
+
+def test_runtime_delta_saving_rollback():
+    cache = _CountingCache()
+    session_id = uuid.uuid4().hex
+
+    runtime = _new_runtime(cache, session_id, True)
+    runtime.store_task(Task(tid="a", url=URL(think="a")))
+    runtime.finish()
+
+    # 关闭增量保存后仍然能读取增量格式, 保存时写回完整的 process.
+    runtime = _new_runtime(cache, session_id, False)
+    process = runtime.current_process()
+    assert process.get_task("a") is not None
+    process.store_task(Task(tid="b", url=URL(think="b")))
+    runtime.store_process(process)
+    runtime.finish()
+
+    runtime = _new_runtime(cache, session_id, False)
+    assert [t.tid for t in runtime.current_process().tasks] == ["b", "a"]
+
+
+def test_runtime_finish_flushes_in_one_batch():
+    cache = _CountingCache()
+    session_id = uuid.uuid4().hex
+
+    runtime = _new_runtime(cache, session_id, True)
+    tasks = [Task(tid=f"task_{i}", url=URL(think=f"think_{i}")) for i in range(20)]
+    runtime.store_task(*tasks)
+    # finish 之前不会写入 cache.
+    assert cache.calls == 0
+    runtime.finish()
+    # 21 个成员合并为一次批量写入.
+    assert cache.calls == 1
+    assert len(cache.written_members) == 22
+
+
+class _ReadCountingCache(MockCache):
+
+    def __init__(self):
+        self.gets = 0
+        self.mgets = 0
+
+    def get(self, key: str):
+        self.gets += 1
+        return super().get(key)
+
+    def mget(self, *keys: str):
+        self.mgets += 1
+        return [super(_ReadCountingCache, self).get(key) for key in keys]
+
+
+def test_runtime_prefetch_long_term_tasks():
+    for prefetch, mgets, gets in (("eager", 1, 0), ("lazy", 0, 5), ("attention", 1, 4)):
+        cache = _ReadCountingCache()
+        session_id = uuid.uuid4().hex
+        session = SessionImpl(cache, clone_id="clone", session_id=session_id, expire=60)
+        runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30, task_prefetch=prefetch)
+        tasks = [Task(tid=f"task_{i}", url=URL(think=f"think_{i}"), overdue=-1, vars={"i": i}) for i in range(5)]
+        runtime.store_task(*tasks)
+        runtime.finish()
+
+        cache.gets = 0
+        session = SessionImpl(cache, clone_id="clone", session_id=session_id, expire=60)
+        runtime = RuntimeImpl(session, URL(think="root"), False, 20, 30, task_prefetch=prefetch)
+        for task in runtime.current_process().tasks:
+            task = runtime.instance_task(task)
+            assert task.vars == {"i": int(task.tid[-1])}
+        assert cache.mgets == mgets
+        assert cache.gets == gets
+
+
+def test_runtime_gc_evicts_lru_tasks():
+    cache = MockCache()
+    session_id = uuid.uuid4().hex
+    session = SessionImpl(cache, clone_id="clone", session_id=session_id, expire=60)
+    runtime = RuntimeImpl(session, URL(think="root"), False, 5, 30)
+    before = ProcessGC.counter.stats()
+
+    # root 最早放入, 是最久没有使用的任务.
+    runtime.store_task(Task(tid="root", url=URL(think="root")))
+    depending = Task(tid="depending", url=URL(think="depending"), callbacks={"target"})
+    runtime.store_task(depending, Task(tid="target", url=URL(think="target")))
+    tasks = [Task(tid=f"task_{i}", url=URL(think=f"think_{i}"), overdue=-1, vars={"i": i}) for i in range(5)]
+    for task in tasks:
+        runtime.store_task(task)
+    runtime.finish()
+
+    session = SessionImpl(cache, clone_id="clone", session_id=session_id, expire=60)
+    runtime = RuntimeImpl(session, URL(think="root"), False, 5, 30)
+    tids = [task.tid for task in runtime.current_process().tasks]
+    assert tids == ["task_4", "task_3", "depending", "target", "root"]
+    # 被淘汰的长期任务仍然可以找回.
+    assert session.get_task_data("task_0")["vars"] == {"i": 0}
+
+    stats = ProcessGC.counter.stats()
+    assert stats["evicted"] - before["evicted"] == 3
+    assert stats["archived"] - before["archived"] == 3
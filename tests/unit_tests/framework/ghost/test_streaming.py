@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import itertools
+import uuid
+from typing import List
+
+from ghoshell.framework.ghost.sending import SendingImpl
+from ghoshell.framework.ghost.streaming import OutputStreamer
+from ghoshell.llms import OpenAIChatStream
+from ghoshell.messages import Input, Output, Text, TextDelta, Trace
+
+
+class _Session:
+
+    def __init__(self):
+        self._ids = itertools.count()
+
+    def new_message_id(self) -> str:
+        return f"mid_{next(self._ids)}"
+
+
+class _Ctx:
+    """
+    SendingImpl 只用到上下文的这几个方法.
+    """
+
+    def __init__(self, streamer: OutputStreamer):
+        self.session = _Session()
+        self.input = Input(
+            mid=uuid.uuid4().hex,
+            payload=Text(content="hi").as_payload(),
+            trace=Trace(clone_id="clone", session_id="session", shell_kind="console"),
+        )
+        self.streamer = streamer
+        self.outputs: List[Output] = []
+
+    def stream_output(self, _output: Output) -> bool:
+        return self.streamer.stream(_output)
+
+    def send_output(self, _output: Output) -> None:
+        self.outputs.append(_output)
+
+
+def test_stream_text_to_shell():
+    streamer = OutputStreamer()
+    streamed: List[TextDelta] = []
+    streamer.register_shell("console", lambda o: streamed.append(TextDelta.read(o.payload)))
+    ctx = _Ctx(streamer)
+    sender = SendingImpl("tid", ctx)
+
+    assert sender.stream_text(iter(["你好", "", ", 世界"])) == "你好, 世界"
+    sender.destroy()
+
+    assert [d.delta for d in streamed] == ["你好", ", 世界", ""]
+    assert [d.done for d in streamed] == [False, False, True]
+    # 完整的文本仍然作为普通输出, 带上 stream_id.
+    assert len(ctx.outputs) == 1
+    text = Text.read(ctx.outputs[0].payload)
+    assert text.content == "你好, 世界"
+    assert text.stream_id == streamed[0].stream_id
+
+
+def test_stream_text_without_streaming_shell():
+    ctx = _Ctx(OutputStreamer())
+    sender = SendingImpl("tid", ctx)
+    sender.stream_text(iter(["a", "b"]))
+    sender.destroy()
+    text = Text.read(ctx.outputs[0].payload)
+    assert text.content == "ab"
+
+
+def test_chat_stream_aggregates_choice():
+    stream = OpenAIChatStream([
+        {"delta": {"role": "assistant"}},
+        {"delta": {"content": "hello"}},
+        {"delta": {"content": " world"}, "finish_reason": "stop"},
+    ])
+    assert list(stream) == ["hello", " world"]
+    assert stream.time_to_first_token is not None
+    assert stream.choice().as_chat_msg().content == "hello world"
+
+    # 函数调用没有内容增量, 参数分多次返回.
+    stream = OpenAIChatStream([
+        {"delta": {"role": "assistant", "function_call": {"name": "weather", "arguments": ""}}},
+        {"delta": {"function_call": {"arguments": "{\"city\": "}}},
+        {"delta": {"function_call": {"arguments": "\"北京\"}"}}, "finish_reason": "function_call"},
+    ])
+    called = stream.choice().as_func_called()
+    assert called.name == "weather"
+    assert called.arguments == {"city": "北京"}
+
+
+def test_stream_text_aborted():
+    streamer = OutputStreamer()
+    streamed: List[TextDelta] = []
+    streamer.register_shell("console", lambda o: streamed.append(TextDelta.read(o.payload)))
+    ctx = _Ctx(streamer)
+    sender = SendingImpl("tid", ctx)
+
+    def chunks():
+        yield "你好"
+        raise ValueError("broken")
+
+    try:
+        sender.stream_text(chunks())
+        assert False, "exception expected"
+    except ValueError:
+        pass
+    sender.destroy()
+
+    # shell 收到 aborted 的结束增量, 不会收到完整的文本.
+    assert [(d.done, d.aborted) for d in streamed] == [(False, False), (True, True)]
+    assert ctx.outputs == []
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import pytest
+
+from ghoshell.container import Container, Provider
+from ghoshell.framework.ghost import GhostKernel
+from ghoshell.framework.ghost.config import GhostConfig
+from ghoshell.framework.ghost.workers import GhostWorkerPool, HashRing, WorkerError
+from ghoshell.ghost import Context, Ghost, URL
+from ghoshell.messages import Input, Output, Text, Trace
+from ghoshell.mocks.providers import MockAPIRepositoryProvider, MockCacheProvider, MockThinkMetaDriverProvider
+
+
+def test_hash_ring_routing():
+    ring = HashRing([0, 1, 2, 3])
+    keys = [f"session_{i}" for i in range(1000)]
+    routed = {key: ring.get(key) for key in keys}
+    # 路由是稳定的, 并且分布到所有的 worker.
+    assert all(ring.get(key) == routed[key] for key in keys)
+    assert set(routed.values()) == {0, 1, 2, 3}
+
+    # 去掉一个 worker 时, 其它 worker 上的会话不会迁移.
+    shrunk = HashRing([0, 1, 2])
+    for key, node in routed.items():
+        if node != 3:
+            assert shrunk.get(key) == node
+
+
+class _EchoGhost(GhostKernel):
+    """
+    真实的 ghost 内核, 只替换掉运行算子的最后一环: 回复 worker 的进程号和输入的文本.
+    输入 "crash" 让 worker 进程直接退出, 输入 "fatal" 抛出无法处理的异常.
+    """
+
+    def get_contracts_providers(self) -> List[Provider]:
+        return [MockCacheProvider(), MockAPIRepositoryProvider(), MockThinkMetaDriverProvider()]
+
+    @staticmethod
+    def _reply(ctx: Context) -> Context:
+        text = ctx.read(Text)
+        if text.content == "crash":
+            os._exit(1)
+        if text.content == "fatal":
+            # 非 GhostError 的异常, GhostKernel._fail 会调用 exit.
+            raise RuntimeError("fatal")
+        ctx.send_at(None).text(f"{os.getpid()}:{text.content}")
+        return ctx
+
+    def _build_destination(self):
+        return self._reply
+
+    def _build_async_destination(self):
+        async def destination(ctx: Context) -> Context:
+            return self._reply(ctx)
+
+        return destination
+
+
+def _echo_ghost() -> Ghost:
+    # worker 进程里调用, 必须是模块级的函数.
+    return _EchoGhost(Container(), GhostConfig(root_url=URL(think="root")), "", "").boostrap()
+
+
+def _broken_ghost() -> Ghost:
+    raise RuntimeError("bootstrap failed")
+
+
+def _input(session_id: str, content: str) -> Input:
+    return Input(
+        mid=uuid.uuid4().hex,
+        payload=Text(content=content).as_payload(),
+        trace=Trace(clone_id="clone", session_id=session_id),
+    )
+
+
+def _reply(outputs: List[Output]) -> Tuple[str, str]:
+    pid, content = Text.read(outputs[0].payload).content.split(":", 1)
+    return pid, content
+
+
+def test_worker_pool_routes_and_restarts():
+    pool = GhostWorkerPool(_echo_ghost, workers=2, concurrency=2).start()
+    try:
+        # 同一个会话总是路由到同一个 worker, 不同的会话分布到所有的 worker.
+        sessions = [f"session_{i}" for i in range(8)]
+        pids: Dict[str, str] = {}
+        for session_id in sessions:
+            for i in range(2):
+                pid, content = _reply(pool.respond(_input(session_id, f"hello {i}"), timeout=60))
+                assert content == f"hello {i}"
+                assert pids.setdefault(session_id, pid) == pid
+        workers = {pool.route(_input(session_id, "")) for session_id in sessions}
+        assert len(workers) == 2
+        assert len(set(pids.values())) == 2
+
+        # 无法处理的异常只让这一个请求失败, worker 不会退出.
+        with pytest.raises(WorkerError):
+            pool.respond(_input(sessions[1], "fatal"), timeout=60)
+        pid, content = _reply(pool.respond(_input(sessions[1], "after fatal"), timeout=60))
+        assert pid == pids[sessions[1]]
+
+        # worker 退出时, 它的请求失败, 然后 worker 被重启.
+        restarted = GhostWorkerPool.counter.stats()["restarted"]
+        crashed = sessions[0]
+        with pytest.raises(WorkerError):
+            pool.respond(_input(crashed, "crash"), timeout=60)
+        assert GhostWorkerPool.counter.stats()["restarted"] == restarted + 1
+        pid, content = _reply(pool.respond(_input(crashed, "again"), timeout=60))
+        assert content == "again"
+        assert pid != pids[crashed]
+    finally:
+        pool.stop()
+
+
+def test_worker_pool_abandons_broken_bootstrap(monkeypatch):
+    monkeypatch.setattr(GhostWorkerPool, "CHECK_INTERVAL", 0.1)
+    monkeypatch.setattr(GhostWorkerPool, "RESTART_BACKOFF", 0.1)
+    monkeypatch.setattr(GhostWorkerPool, "MAX_BOOTSTRAP_FAILURES", 2)
+    before = GhostWorkerPool.counter.stats()
+    pool = GhostWorkerPool(_broken_ghost, workers=1).start()
+    try:
+        # 启动失败的 worker 退避重启一次, 第二次失败后放弃.
+        deadline = time.monotonic() + 60
+        while not pool._is_abandoned(0):
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+        with pytest.raises(WorkerError):
+            pool.respond(_input("session", "hello"), timeout=1)
+        stats = GhostWorkerPool.counter.stats()
+        assert stats["bootstrap_failed"] - before["bootstrap_failed"] == 2
+        assert stats["restarted"] - before["restarted"] == 1
+    finally:
+        pool.stop()
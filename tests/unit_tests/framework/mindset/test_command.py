@@ -1,4 +1,5 @@
-from ghoshell.framework.intentions.command_intention import Command, CommandIntention
+from ghoshell.framework.intentions.command_intention import Command, CommandIntention, CommandFocusDriver
+from ghoshell.framework.intentions.command_intention import CompiledCommand, CommandTrie
 from ghoshell.ghost import Intention
 
 
@@ -47,3 +48,44 @@ def test_command_intention():
 #     assert matched.result is not None
 #     assert matched.result.error is False
 #     assert matched.result.params == {"first": "foo", "second": None, "option": "option"}
+
+
+def _foo_command() -> CommandIntention:
+    return Command(
+        name="foo",
+        desc="foo is a command name",
+        arg={"name": "first"},
+        opts=[{"name": "option", "short": "o", "nargs": "?", "default": "option"}],
+    ).to_intention()
+
+
+def test_command_driver_match():
+    driver = CommandFocusDriver()
+    command = _foo_command()
+    assert driver.match_raw_text("hello world", command) is None
+    assert driver.match_raw_text("/bar", command) is None
+
+    matched = driver.match_raw_text("/foo first -o second", command)
+    assert matched.params.error is False
+    assert matched.params.params == {"first": "first", "option": "second"}
+
+    # 没有包装过的 intention 也可以匹配, parser 按配置复用.
+    compiled = CompiledCommand.counter.stats()["compiled"]
+    matched = driver.match_raw_text("/foo -h", Intention(**command.model_dump()))
+    assert matched.params.error is False
+    assert "foo is a command name" in matched.params.message
+    assert CompiledCommand.counter.stats()["compiled"] == compiled
+
+    # 默认命令.
+    assert driver.match_raw_text("/help").config.name == "help"
+
+
+def test_command_trie():
+    trie = CommandTrie()
+    for name in ["help", "hello", "foo", "he"]:
+        trie.insert(name, name.upper())
+    assert len(trie) == 4
+    assert trie.get("hello") == "HELLO"
+    assert trie.get("hel") is None
+    assert trie.prefixed("he") == ["he", "hello", "help"]
+    assert trie.prefixed("x") == []
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from ghoshell.framework.intentions import KeywordIntention, KeywordFocusDriver
+from ghoshell.framework.intentions.keyword_intention import AhoCorasick, KeywordMatcher
+
+
+def _intention(*keywords: str, regex: str = "") -> KeywordIntention:
+    return KeywordIntention(config={"keywords": list(keywords), "regex": [regex] if regex else []})
+
+
+def test_aho_corasick_prefers_longest_match():
+    automaton = AhoCorasick([("he", 0), ("she", 1), ("hers", 2), ("his", 3)])
+    assert automaton.search("ushers") == (2, 2, 6)
+    assert automaton.search("ahis") == (3, 1, 4)
+    assert automaton.search("xyz") is None
+
+
+def test_keyword_matcher_incremental():
+    matcher = KeywordMatcher([_intention(f"kw{i}x") for i in range(100)])
+    assert matcher.match("say KW42X please").params.matched == "kw42x"
+
+    # 少量新增只重建增量自动机.
+    main = matcher._main
+    matcher.add(_intention("天气", "北京天气"))
+    assert matcher._main is main
+    matched = matcher.match("今天北京天气怎么样")
+    assert matched.config.keywords == ["天气", "北京天气"]
+    assert matched.params.matched == "北京天气"
+    assert matched.params.start == 2
+
+    # 增量足够多时合并.
+    matcher.add(*[_intention(f"new{i}y") for i in range(100)])
+    assert matcher._main is not main
+    assert matcher._delta.size == 0
+    assert matcher.match("new99y").params.matched == "new99y"
+    assert matcher.match("kw0x").params.matched == "kw0x"
+
+
+def test_keyword_driver_regex():
+    driver = KeywordFocusDriver()
+    metas = [
+        _intention("hello"),
+        _intention(regex=r"set alarm at (?P<hour>\d+)"),
+    ]
+    matched = driver.match_text("please set alarm at 7", *metas)
+    assert matched.params.is_regex
+    assert matched.params.groups == {"hour": "7"}
+    assert driver.match_text("Hello world", *metas).params.matched == "hello"
+    assert driver.match_text("nothing", *metas) is None
+    # 相同的意图复用编译好的匹配器.
+    assert KeywordFocusDriver.counter.stats()["cache_hit"] >= 2
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from typing import List
+
+from ghoshell.framework.intentions import LLMToolIntention, LLMToolsFocusConfig, LLMToolsFocusDriver
+from ghoshell.llms import LLMTextCompletion, LLMTextEmbedding
+
+
+class _Prompter(LLMTextCompletion):
+
+    def __init__(self, resp: str):
+        self.resp = resp
+        self.prompts: List[str] = []
+
+    def text_completion(self, prompt: str, config_name: str = "") -> str:
+        self.prompts.append(prompt)
+        return self.resp
+
+
+class _Embedder(LLMTextEmbedding):
+    """
+    按包含的关键词生成向量.
+    """
+
+    axes = ["weather", "music", "alarm"]
+
+    def __init__(self):
+        self.queries: List[str] = []
+        self.batches: List[List[str]] = []
+
+    def _vector(self, text: str) -> List[float]:
+        return [1.0 if axis in text else 0.0 for axis in self.axes]
+
+    def text_embedding(self, text: str, config_name: str = "") -> List[float]:
+        self.queries.append(text)
+        return self._vector(text)
+
+    def text_embeddings(self, texts: List[str], config_name: str = "") -> List[List[float]]:
+        self.batches.append(texts)
+        return [self._vector(text) for text in texts]
+
+
+def _tools() -> List[LLMToolIntention]:
+    return [
+        LLMToolIntention(config={"name": "weather", "desc": "查询天气 weather forecast"}),
+        LLMToolIntention(config={"name": "music", "desc": "播放音乐 play music"}),
+        LLMToolIntention(config={"name": "alarm", "desc": "设置闹钟 set alarm"}),
+    ]
+
+
+def test_llm_tools_cache():
+    prompter = _Prompter("weather: 北京")
+    driver = LLMToolsFocusDriver(LLMToolsFocusConfig(), prompter)
+
+    matched = driver.match_tools("北京天气", "root::", lambda: "", *_tools())
+    assert matched.config.name == "weather"
+    assert matched.params.context == "北京"
+    # 返回的是副本, 不修改传入的工具.
+    assert all(tool.params is None for tool in _tools())
+
+    # 规范化后相同的输入命中缓存.
+    assert driver.match_tools("  北京天气 ", "root::", lambda: "", *_tools()).config.name == "weather"
+    assert len(prompter.prompts) == 1
+    # 不同的 stage 不共用缓存.
+    driver.match_tools("北京天气", "root::other", lambda: "", *_tools())
+    assert len(prompter.prompts) == 2
+
+    # 没有匹配的结果也会缓存.
+    prompter.resp = "no"
+    assert driver.match_tools("你好", "root::", lambda: "", *_tools()) is None
+    assert driver.match_tools("你好", "root::", lambda: "", *_tools()) is None
+    assert len(prompter.prompts) == 3
+
+
+def test_llm_tools_keyword_prefilter():
+    prompter = _Prompter("music")
+    config = LLMToolsFocusConfig(prefilter="keyword", prefilter_top_k=1, prefilter_threshold=0.1)
+    driver = LLMToolsFocusDriver(config, prompter)
+
+    assert driver.match_tools("play some music", "root::", lambda: "", *_tools()).config.name == "music"
+    # 只有最相关的工具进入 prompt.
+    assert "music" in prompter.prompts[0]
+    assert "alarm" not in prompter.prompts[0]
+
+    # 和所有工具都不相关时不请求大模型.
+    assert driver.match_tools("hello there", "root::", lambda: "", *_tools()) is None
+    assert len(prompter.prompts) == 1
+
+
+def test_llm_tools_embedding_prefilter():
+    prompter = _Prompter("weather")
+    embedder = _Embedder()
+    config = LLMToolsFocusConfig(prefilter="embedding", prefilter_top_k=1, prefilter_threshold=0.5)
+    driver = LLMToolsFocusDriver(config, prompter, embedder)
+
+    assert driver.match_tools("weather tomorrow", "root::", lambda: "", *_tools()).config.name == "weather"
+    assert "weather" in prompter.prompts[0]
+    assert "music" not in prompter.prompts[0]
+    # 工具的向量只计算一次.
+    assert len(embedder.batches) == 1
+
+    # 命中缓存时不再请求 embedding.
+    assert driver.match_tools("Weather tomorrow", "root::", lambda: "", *_tools()).config.name == "weather"
+    assert embedder.queries == ["weather tomorrow"]
+    assert len(prompter.prompts) == 1
+
+    # 相似度低于阈值时不请求大模型, 结果同样缓存.
+    assert driver.match_tools("hello", "root::", lambda: "", *_tools()) is None
+    assert driver.match_tools("hello", "root::", lambda: "", *_tools()) is None
+    assert embedder.queries == ["weather tomorrow", "hello"]
+    assert len(embedder.batches) == 1
+    assert len(prompter.prompts) == 1
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional
+
+from ghoshell.framework.contracts import ThinkMetaStorage
+from ghoshell.framework.ghost.mindset import MindsetImpl
+from ghoshell.ghost import ThinkDriver, Think
+from ghoshell.meta import Meta
+from ghoshell.mocks.ghost_mock.think_mock import HelloWorldThink
+
+
+class _Storage(ThinkMetaStorage):
+
+    def __init__(self):
+        self.metas: Dict[str, Meta] = {}
+
+    def clone(self, clone_id: str | None) -> ThinkMetaStorage:
+        return self
+
+    def fetch_meta(self, think_name: str, clone_id: str | None) -> Optional[Meta]:
+        return self.metas.get(think_name, None)
+
+    def iterate_think_metas(self) -> Iterator[Meta]:
+        return iter(self.metas.values())
+
+    def register_meta(self, meta: Meta, clone_id: str | None) -> None:
+        self.metas[meta.id] = meta
+
+
+class _Driver(ThinkDriver):
+
+    def __init__(self):
+        self.made = 0
+
+    def meta_kind(self) -> str:
+        return "test"
+
+    def meta_config_json_schema(self) -> Dict:
+        return {}
+
+    def from_meta(self, meta: Meta) -> Think:
+        self.made += 1
+        return HelloWorldThink()
+
+    def preload_metas(self) -> Iterator[Meta]:
+        return iter([Meta(id="foo", kind="test", config={"a": 1})])
+
+
+def test_mindset_thinks_cache():
+    driver = _Driver()
+    mindset = MindsetImpl(_Storage(), None)
+    mindset.register_meta_driver(driver)
+
+    first = mindset.force_fetch("foo")
+    assert mindset.force_fetch("foo") is first
+    assert driver.made == 1
+
+    # clone 共享缓存.
+    clone = mindset.clone("clone")
+    assert clone.force_fetch("foo") is first
+    stats = mindset.meta_instance_cache().stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+    # 重新注册 meta, 缓存失效.
+    mindset.register_meta(Meta(id="foo", kind="test", config={"a": 2}))
+    second = mindset.force_fetch("foo")
+    assert second is not first
+    assert driver.made == 2
+
+    # 重新注册 driver, 缓存整体失效.
+    mindset.register_meta_driver(driver)
+    assert mindset.meta_instance_cache().stats()["size"] == 0
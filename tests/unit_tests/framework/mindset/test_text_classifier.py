@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from typing import List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ghoshell.framework.intentions.text_classifier import TextClassifier, TextClassifierFocusDriver, EmbeddingCache
+from ghoshell.llms import LLMTextEmbedding
+
+WORDS = ["weather", "rain", "music", "song", "play", "today"]
+
+
+class _BagOfWords(LLMTextEmbedding):
+
+    def __init__(self):
+        self.examples: List[str] = []
+        self.queries: List[str] = []
+
+    def text_embedding(self, text: str, config_name: str = "") -> List[float]:
+        self.queries.append(text)
+        return [float(word in text) for word in WORDS]
+
+    def text_embeddings(self, texts: List[str], config_name: str = "") -> List[List[float]]:
+        self.examples.extend(texts)
+        return [[float(word in text) for word in WORDS] for text in texts]
+
+
+def _classifiers() -> List[TextClassifier]:
+    return [
+        TextClassifier(config={"description": "weather", "examples": ["weather today", "rain"]}),
+        TextClassifier(config={"description": "music", "examples": ["play music", "song"], "threshold": 0.99}),
+    ]
+
+
+def test_text_classifier_driver(tmp_path):
+    embedder = _BagOfWords()
+    cache_file = str(tmp_path / "embeddings.npz")
+    driver = TextClassifierFocusDriver(embedder, threshold=0.7, cache=EmbeddingCache(cache_file))
+
+    matched = driver.classify("will it rain today", *_classifiers())
+    assert matched.config.description == "weather"
+    assert matched.params.example == "weather today" or matched.params.example == "rain"
+    # music 的阈值更高, 不完全相同的输入不会命中.
+    assert driver.classify("play a song", *_classifiers()) is None
+    assert driver.classify("play music", *_classifiers()).config.description == "music"
+    assert driver.classify("hello", *_classifiers()) is None
+
+    # example 只 embedding 一次.
+    assert sorted(embedder.examples) == sorted(["weather today", "rain", "play music", "song"])
+
+    # 持久化的缓存在重启后生效.
+    restarted = _BagOfWords()
+    driver = TextClassifierFocusDriver(restarted, threshold=0.7, cache=EmbeddingCache(cache_file))
+    assert driver.classify("rain", *_classifiers()).config.description == "weather"
+    assert restarted.examples == []
+    assert restarted.queries == ["rain"]
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+import pytest
+
+from ghoshell.ghost import ChainOperator, OperationKernel, Operator, StackoverflowError, ThinkError
+
+
+class _Op(Operator):
+
+    def __init__(self, name: str, trail: List[str], after: Optional[Operator] = None):
+        self.name = name
+        self.trail = trail
+        self.after = after
+
+    def run(self, ctx) -> Optional[Operator]:
+        self.trail.append(self.name)
+        return self.after
+
+    def destroy(self) -> None:
+        pass
+
+
+class _Bad(Operator):
+
+    def __init__(self, trail: List[str]):
+        self.trail = trail
+
+    def run(self, ctx) -> Optional[Operator]:
+        self.trail.append("bad")
+        raise ThinkError("bad")
+
+    def destroy(self) -> None:
+        pass
+
+
+class _Sender:
+
+    def __init__(self, sent: List[str]):
+        self.sent = sent
+
+    def text(self, *lines: str):
+        self.sent.extend(lines)
+
+    def err(self, message: str, code: int = 0):
+        self.sent.append(message)
+
+
+class _Ctx:
+    """
+    出错时 run_dominos 只用到 send_at 和 mind.
+    """
+
+    def __init__(self, trail: List[str]):
+        self.trail = trail
+        self.sent: List[str] = []
+
+    def send_at(self, this):
+        return _Sender(self.sent)
+
+    def mind(self, this):
+        trail = self.trail
+        return type("_Mind", (), {"rewind": lambda _: _Op("rewind", trail)})()
+
+
+class _Loop(Operator):
+
+    def run(self, ctx) -> Optional[Operator]:
+        return _Loop()
+
+    def destroy(self) -> None:
+        pass
+
+
+class _Kernel(OperationKernel):
+
+    def __init__(self, max_steps: int = 100):
+        self.max_steps = max_steps
+
+    def record(self, ctx, op: Operator) -> None:
+        pass
+
+    def save_records(self) -> None:
+        pass
+
+    def is_stackoverflow(self, op: Operator, length: int) -> bool:
+        return length >= self.max_steps
+
+    def init_operator(self) -> Operator:
+        raise NotImplementedError
+
+    def destroy(self) -> None:
+        pass
+
+
+def test_run_dominos_flattens_chains():
+    trail = []
+    nested = ChainOperator([_Op("c1", trail), _Op("c2", trail)])
+    chain = ChainOperator([
+        _Op("a", trail, _Op("a.after", trail, nested)),
+        _Op("b", trail),
+    ])
+    _Kernel().run_dominos(None, chain)
+    assert trail == ["a", "a.after", "c1", "c2", "b"]
+    assert OperationKernel.stats()["_Op"]["count"] >= 5
+
+
+def test_run_dominos_step_budget():
+    with pytest.raises(StackoverflowError):
+        _Kernel(max_steps=10).run_dominos(None, _Loop())
+
+
+def test_run_dominos_drops_chain_on_error():
+    trail = []
+    ctx = _Ctx(trail)
+    chain = ChainOperator([_Bad(trail), _Op("ok", trail)])
+    _Kernel().run_dominos(ctx, ChainOperator([chain, _Op("outer", trail)]))
+    # 和异常抛出整个 chain 一样, 出错后剩下的算子都不再运行.
+    assert trail == ["bad", "rewind"]
+    assert ctx.sent
@@ -1,4 +1,5 @@
-from ghoshell.ghost import Task, URL, Process, TaskStatus
+from ghoshell.ghost import Task, URL, Process, TaskStatus, Attention, Intention
+from ghoshell.ghost.tool import AttentionIndex
 
 
 def test_task_init():
@@ -57,3 +58,116 @@ def test_process_store_same_task():
     p.store_task(a, a, a, a, a)
     p.reset_indexes()
     assert len(p.tasks) == 1
+
+
+def test_attention_index_invalidated_by_process_change():
+    p = Process.new_process("sid", "pid")
+    a = Task(tid="a", url=URL(think="a"))
+    p.store_task(a)
+    attention = Attention(
+        to=URL(think="b"),
+        reaction="on_b",
+        intentions=[Intention(kind="command", config={}), Intention(kind="regex", config={})],
+    )
+    index = AttentionIndex(p, [attention])
+    assert set(index.grouped) == {"regex", "command"}
+    assert index.grouped["command"][0].target.think == "b"
+    assert index.grouped["command"][0].reaction == "on_b"
+    assert index.is_valid(p)
+
+    p.store_task(Task(tid="b", url=URL(think="b")))
+    assert not index.is_valid(p)
+
+
+def test_process_incremental_status_indexes():
+    p = Process.new_process("sid", "pid")
+    tasks = [Task(tid=str(i), url=URL(think=str(i)), status=TaskStatus.WAITING) for i in range(5)]
+    p.store_task(*tasks)
+    assert [t.tid for t in p.tasks] == ["0", "1", "2", "3", "4"]
+    assert p.waiting == ["1", "2", "3", "4"]
+
+    # 状态迁移后, 索引增量更新, 并且移动到头部.
+    low = p.get_task("3")
+    low.status = TaskStatus.PREEMPTING
+    low.priority = 1
+    high = p.get_task("4")
+    high.status = TaskStatus.PREEMPTING
+    high.priority = 2
+    p.store_task(low)
+    p.store_task(high)
+    assert [t.tid for t in p.tasks] == ["4", "3", "0", "1", "2"]
+    assert p.waiting == ["1", "2"]
+    assert p.preempting == ["4", "3"]
+    assert p.fallback() is high
+
+    high.status = TaskStatus.FINISHED
+    p.store_task(high)
+    assert p.fallback() is low
+    assert p.finished == ["4"]
+
+    # 序列化格式保持兼容.
+    loaded = Process(**p.model_dump())
+    assert [t.tid for t in loaded.tasks] == ["4", "3", "0", "1", "2"]
+    assert loaded.preempting == ["3"]
+    assert loaded.model_dump() == p.model_dump()
+
+
+def test_process_preempting_priority_changed_in_place():
+    p = Process.new_process("sid", "pid")
+    tasks = [Task(tid=tid, url=URL(think=tid), status=TaskStatus.PREEMPTING, priority=priority)
+             for tid, priority in (("a", 1), ("b", 2))]
+    p.store_task(*tasks)
+    # 没有 store_task 就修改了优先级.
+    p.get_task("b").priority = 0
+    assert p.fallback().tid == "a"
+    a = p.get_task("a")
+    a.status = TaskStatus.FINISHED
+    p.store_task(a)
+    assert p.preempting == ["b"]
+    assert p.fallback().tid == "b"
+
+
+def test_process_index_follows_tasks_field():
+    p = Process.new_process("sid", "pid")
+    p.store_task(*[Task(tid=str(i), url=URL(think=str(i)), status=TaskStatus.WAITING) for i in range(3)])
+    assert "tasks" in p.__dict__
+    assert p.waiting == ["1", "2"]
+
+    # 拷贝不共享索引.
+    copied = p.model_copy()
+    copied.store_task(Task(tid="new", url=URL(think="new"), status=TaskStatus.WAITING))
+    assert copied.waiting == ["new", "1", "2"]
+    assert p.waiting == ["1", "2"]
+    assert [t.tid for t in p.tasks] == ["0", "1", "2"]
+
+    # 整体替换 tasks 之后重建索引.
+    p.tasks = [Task(tid="x", url=URL(think="x"), status=TaskStatus.WAITING)] + p.tasks
+    assert p.waiting == ["x", "1", "2"]
+    assert p.get_task("x") is p.tasks[0]
+
+
+def test_process_new_round_copy_on_write():
+    p = Process.new_process("sid", "pid")
+    tasks = [Task(tid=str(i), url=URL(think=str(i), args={"i": i}), vars={"i": i}) for i in range(3)]
+    p.store_task(*tasks)
+    dumped = p.model_dump()
+
+    # 新一轮和快照共享 task, 不会拷贝.
+    n = p.new_round()
+    assert n.round == p.round + 1
+    assert n.tasks[1] is p.tasks[1]
+    assert n.is_shared("1")
+
+    # 取出时才拷贝, 修改不会影响快照.
+    task = n.get_task("1")
+    assert task is not p.get_task("1")
+    assert not n.is_shared("1")
+    assert n.get_task("1") is task
+    task.url.stage = "changed"
+    task.url.args["i"] = 100
+    task.vars["i"] = 100
+    task.forwards.append("next")
+    n.store_task(task)
+    assert [t.tid for t in n.tasks] == ["1", "0", "2"]
+    assert p.model_dump() == dumped
+    assert n.tasks[1] is p.tasks[0]
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from ghoshell.ghost import Attention, Intention, URL
+from ghoshell.ghost.tool import CtxTool, ReactionIntentionsCache, RuntimeTool
+
+
+class _Reaction:
+
+    def __init__(self):
+        self.called = 0
+
+    def intentions(self, ctx):
+        self.called += 1
+        return [Intention(kind="command", config={"name": "foo"})]
+
+
+def _fake_ctx(reaction: _Reaction):
+    stage = SimpleNamespace(reactions=lambda: {"foo": reaction})
+    think = SimpleNamespace(fetch_stage=lambda name: stage)
+    mindset = SimpleNamespace(fetch_meta_instance=lambda name: think)
+    return SimpleNamespace(clone=SimpleNamespace(mindset=mindset))
+
+
+def test_rehydrate_referred_attention():
+    ReactionIntentionsCache.clear()
+    reaction = _Reaction()
+    ctx = _fake_ctx(reaction)
+    attention = Attention(to=URL(think="think", stage="stage"), reaction="foo", referred=True)
+    assert "intentions" not in attention.model_dump(exclude_defaults=True)
+
+    first = CtxTool.rehydrate_attention(ctx, attention)
+    second = CtxTool.rehydrate_attention(ctx, attention)
+    assert first.intentions[0].config == {"name": "foo"}
+    # 编译结果被缓存, 但每次拿到的是拷贝.
+    assert reaction.called == 1
+    assert first.intentions[0] is not second.intentions[0]
+
+    # 非引用模式原样返回.
+    plain = Attention(to=URL(think="think"), reaction="foo", intentions=[])
+    assert CtxTool.rehydrate_attention(ctx, plain) is plain
+
+
+class _MemoCtx:
+
+    def __init__(self, think):
+        self.cache = {}
+        self.fetched = 0
+
+        def fetch(name):
+            self.fetched += 1
+            return think
+
+        mindset = SimpleNamespace(fetch_meta_instance=fetch, force_fetch=fetch)
+        self.clone = SimpleNamespace(mindset=mindset)
+
+    def get(self, key):
+        return self.cache.get(key, None)
+
+    def set(self, key, value):
+        self.cache[key] = value
+
+
+def test_ctx_memo():
+    generated = []
+
+    def new_task_id(ctx, args):
+        generated.append(args)
+        return f"tid_{len(generated)}"
+
+    think = SimpleNamespace(new_task_id=new_task_id, fetch_stage=lambda name: f"stage:{name}")
+    ctx = _MemoCtx(think)
+    url = URL(think="think", args={"b": 1, "a": 2})
+    for _ in range(10):
+        assert RuntimeTool.new_task_id(ctx, url) == "tid_1"
+        assert CtxTool.fetch_stage(ctx, "think", "start") == "stage:start"
+    assert RuntimeTool.new_task_id(ctx, URL(think="think", args={"a": 2, "b": 1})) == "tid_1"
+    assert RuntimeTool.new_task_id(ctx, URL(think="think", args={"a": 3})) == "tid_2"
+    assert ctx.fetched == 2
+
+    # ctx.finish 清空缓存之后重新计算.
+    ctx.cache = {}
+    assert RuntimeTool.new_task_id(ctx, url) == "tid_3"
@@ -1,6 +1,144 @@
-from ghoshell.utils import import_module_value
+import asyncio
+import json
+import threading
+import time
+
+from ghoshell.utils import import_module_value, create_pipeline, timed_pipe
+from ghoshell.utils import create_async_pipeline, adapt_sync_pipe, to_thread, set_thread_pool_size
+from ghoshell.utils import tracing
+from ghoshell.utils import pipeline
+from ghoshell.utils import StatsCounter
 
 
 def test_import_module_value():
     got = import_module_value("ghoshell.utils:import_module_value")
     assert got is import_module_value
+
+
+def test_async_pipeline_with_sync_pipe():
+    async def async_pipe(req, after):
+        return await after(req + ["async"]) + ["async_after"]
+
+    def sync_pipe(req, after):
+        # 同步的 pipe 运行在线程里.
+        assert threading.current_thread() is not threading.main_thread()
+        return after(req + ["sync"]) + ["sync_after"]
+
+    async def destination(req):
+        return req + ["destination"]
+
+    pipeline = create_async_pipeline([async_pipe, adapt_sync_pipe(sync_pipe)], destination)
+    got = asyncio.run(pipeline([]))
+    assert got == ["async", "sync", "destination", "sync_after", "async_after"]
+
+
+def test_to_thread_is_bounded():
+    set_thread_pool_size(2)
+    running = []
+    peak = []
+
+    def blocking():
+        running.append(1)
+        peak.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+
+    async def main():
+        await asyncio.gather(*[to_thread(blocking) for _ in range(6)])
+
+    try:
+        asyncio.run(main())
+        assert max(peak) <= 2
+    finally:
+        set_thread_pool_size(16)
+
+
+class _Clock:
+    """
+    手动推进的时钟, 代替 time.perf_counter.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+def test_timed_pipe_excludes_downstream(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(pipeline, "time", clock)
+    timings = {}
+
+    def slow_pipe(req, after):
+        clock.now += 2
+        return after(req)
+
+    def destination(req):
+        clock.now += 5
+        return req
+
+    pipes = [timed_pipe("slow", slow_pipe, lambda name, cost: timings.update({name: cost}))]
+    assert create_pipeline(pipes, destination)(1) == 1
+    assert timings["slow"] == 2
+
+
+def test_tracing_spans():
+    assert tracing.span("nothing") is tracing.NULL_SPAN
+
+    tracer = tracing.Tracer("trace")
+    token = tracing.activate(tracer)
+
+    @tracing.traced("storage")
+    def load():
+        time.sleep(0.01)
+
+    async def main():
+        with tracing.span("outer", "test"):
+            # 线程池里继承当前的 tracer.
+            await to_thread(load)
+
+    try:
+        asyncio.run(main())
+    finally:
+        tracing.deactivate(token)
+
+    assert tracing.current_tracer() is None
+    names = [e["name"] for e in tracer.events]
+    assert names == ["test_tracing_spans.<locals>.load", "outer"]
+    inner, outer = tracer.events
+    assert outer["ts"] <= inner["ts"] and inner["dur"] <= outer["dur"]
+    chrome = tracing.chrome_trace(tracer)
+    assert len(chrome["traceEvents"]) == 3
+
+
+def test_jsonl_trace_exporter(tmp_path):
+    filename = str(tmp_path / "traces" / "trace.jsonl")
+    exporter = tracing.JSONLTraceExporter(filename)
+    tracer = tracing.Tracer("trace")
+    with tracer.span("a"):
+        pass
+    exporter.export(tracer)
+    exporter.export(tracer)
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["spans"][0]["name"] == "a"
+
+
+def test_stats_counter_concurrent_incr():
+    counter = StatsCounter("hit")
+    barrier = threading.Barrier(8)
+
+    def incr():
+        barrier.wait()
+        for _ in range(10000):
+            counter.incr("hit")
+            counter.maximum("max", 3)
+
+    threads = [threading.Thread(target=incr) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.stats() == {"hit": 80000, "max": 3}